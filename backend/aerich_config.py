@@ -1,13 +1,3 @@
-import os
+from db import tortoise_config
 
-TORTOISE_ORM = {
-    "connections": {
-        "default": os.getenv("DATABASE_URL", "sqlite://db.sqlite3").replace("postgresql://", "postgres://")
-    },
-    "apps": {
-        "models": {
-            "models": ["models", "aerich.models"],
-            "default_connection": "default",
-        },
-    },
-}
\ No newline at end of file
+TORTOISE_ORM = tortoise_config(["models", "aerich.models"])
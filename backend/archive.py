@@ -0,0 +1,285 @@
+"""Moves closed claims out of the hot tables, and the one place to look claims up.
+
+    python archive.py run [--older-than-days 180] [--batch-size 500]
+    python archive.py restore CLAIM_ID
+
+Settled and rejected claims untouched for ARCHIVE_AFTER_DAYS move, with their
+notes and document metadata, from claim/claimnote/claimdocument into
+archivedclaim/archivedclaimnote/archivedclaimdocument, keeping their ids. Each
+batch is its own transaction (copy, then delete), so a run can be stopped at
+any point and the next one carries on where it left off. On Postgres the
+batch's claims are locked with SKIP LOCKED, so runs in several workers never
+pick the same rows. Counters are unaffected: an archived claim is still counted.
+
+Hot queries (GET /claims, role lists, the workflow endpoints) only ever see
+active claims and the indexes on claim stay small. Lookups by id go through
+find_claim / find_document, which fall back to the archive; search and export
+read both tables for the roles that can see closed claims. Adding a note or
+document to an archived claim moves it back first (writable_claim).
+
+Set ARCHIVE_INTERVAL to run the job in the background of the API as well.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import List, Optional, Sequence, Tuple, Type, Union
+
+from tortoise import Tortoise, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from change_feed import record_events
+from db import tortoise_config
+from duplicates import fingerprint_fields, index_fingerprints
+from live_updates import ClaimUpdate
+from metrics import ARCHIVE_MOVES
+from models import (
+    User, Claim, ClaimNote, ClaimDocument, ArchivedClaim, ArchivedClaimNote, ArchivedClaimDocument, ClaimStatus,
+)
+from search import index_claims, unindex_claims
+from visibility import can_view_claim
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 0))  # seconds between background runs, 0 = CLI only
+
+CLOSED_STATUSES = [ClaimStatus.SETTLED, ClaimStatus.REJECTED]
+# (hot, archived) pairs, parents first: rows are copied in this order and deleted in reverse
+TABLES: Sequence[Tuple[Type[Model], Type[Model]]] = (
+    (Claim, ArchivedClaim),
+    (ClaimNote, ArchivedClaimNote),
+    (ClaimDocument, ArchivedClaimDocument),
+)
+
+# What the change feed's claim_archived / claim_restored events carry
+EVENT_COLUMNS = ("id", "status", "customer_id", "assigned_adjuster_id")
+# What duplicates.fingerprint_fields is computed from
+FINGERPRINT_SOURCE_COLUMNS = ("policy_id", "incident_date", "incident_description", "incident_location")
+
+AnyClaim = Union[Claim, ArchivedClaim]
+AnyDocument = Union[ClaimDocument, ArchivedClaimDocument]
+
+
+def _moved(claims: Sequence[AnyClaim], archiving: bool) -> List[ClaimUpdate]:
+    return [
+        ClaimUpdate(
+            type="claim_archived" if archiving else "claim_restored",
+            claim_id=claim.id,
+            status=claim.status,
+            customer_id=claim.customer_id,
+            assigned_adjuster_id=claim.assigned_adjuster_id,
+        )
+        for claim in claims
+    ]
+
+
+def _placeholders(conn: BaseDBAsyncClient, start: int, count: int) -> str:
+    if conn.capabilities.dialect == "postgres":
+        return ", ".join(f"${i}" for i in range(start, start + count))
+    return ", ".join("?" * count)
+
+
+async def _move(conn: BaseDBAsyncClient, claim_ids: List[int], archiving: bool):
+    """Copy claims and their children to the other side, then delete the originals"""
+    pairs = TABLES if archiving else [(target, source) for source, target in TABLES]
+    now = timezone.now()
+    for source, target in pairs:
+        key = "id" if source in (Claim, ArchivedClaim) else "claim_id"
+        values = []
+        overrides = {}
+        if target is ArchivedClaim:
+            overrides["archived_at"] = now
+        elif target is Claim:
+            # A restored claim is in use again; keep the archiver off it for another ARCHIVE_AFTER_DAYS
+            overrides["updated_at"] = now
+        source_columns = set(source._meta.fields_db_projection.values())
+        columns, selected = [], []
+        for field, column in target._meta.fields_db_projection.items():
+            if field in overrides:
+                values.append(target._meta.fields_map[field].to_db_value(overrides[field], target))
+                selected.append(_placeholders(conn, len(values), 1))
+            elif column in source_columns:
+                selected.append(f'"{column}"')
+            else:
+                continue
+            columns.append(f'"{column}"')
+        # Parameters in statement order: overridden values in the select list, then the ids
+        await conn.execute_query(
+            f'INSERT INTO "{target._meta.db_table}" ({", ".join(columns)}) '
+            f'SELECT {", ".join(selected)} FROM "{source._meta.db_table}" '
+            f'WHERE "{key}" IN ({_placeholders(conn, len(values) + 1, len(claim_ids))})',
+            values + list(claim_ids),
+        )
+    for source, _ in reversed(pairs):
+        key = "id" if source in (Claim, ArchivedClaim) else "claim_id"
+        await conn.execute_query(
+            f'DELETE FROM "{source._meta.db_table}" WHERE "{key}" IN ({_placeholders(conn, 1, len(claim_ids))})',
+            list(claim_ids),
+        )
+
+
+async def archive_batch(cutoff, batch_size: int = ARCHIVE_BATCH_SIZE) -> List[int]:
+    """Archive up to batch_size closed claims last updated before cutoff; returns their ids"""
+    async with in_transaction() as conn:
+        claims = await Claim.filter(status__in=CLOSED_STATUSES, updated_at__lt=cutoff).order_by("id").limit(
+            batch_size
+        ).select_for_update(skip_locked=True).only(*EVENT_COLUMNS).using_db(conn)
+        claim_ids = [claim.id for claim in claims]
+        if claim_ids:
+            await _move(conn, claim_ids, archiving=True)
+            # claim's delete trigger dropped their FTS rows; point them at the archive
+            await index_claims(conn, claim_ids, ArchivedClaim._meta.db_table)
+            await record_events(_moved(claims, archiving=True), using_db=conn)
+    ARCHIVE_MOVES.inc("archived", amount=len(claim_ids))
+    return claim_ids
+
+
+async def archive_claims(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Archive every eligible claim, one committed batch at a time"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archived = batches = 0
+    while True:
+        claim_ids = await archive_batch(cutoff, batch_size)
+        if not claim_ids:
+            return {"archived": archived, "batches": batches, "cutoff": cutoff.isoformat()}
+        archived += len(claim_ids)
+        batches += 1
+
+
+async def restore_claim(claim_id: int) -> bool:
+    """Move an archived claim and its notes and documents back; False if it is not archived.
+
+    The claim's updated_at becomes now, so the next archive run does not take it straight back.
+    The archive does not keep duplicate-detection fingerprints (archiving drops its bands), so
+    they are computed again here and the claim is matched as before.
+    """
+    async with in_transaction() as conn:
+        claims = await ArchivedClaim.filter(id=claim_id).select_for_update().only(
+            *EVENT_COLUMNS, *FINGERPRINT_SOURCE_COLUMNS
+        ).using_db(conn)
+        if not claims:
+            return False
+        # claim's insert trigger indexes it again
+        await unindex_claims(conn, [claim_id])
+        await _move(conn, [claim_id], archiving=False)
+        for claim in claims:
+            fingerprints = fingerprint_fields(
+                claim.policy_id, claim.incident_date, claim.incident_description, claim.incident_location
+            )
+            await Claim.filter(id=claim.id).using_db(conn).update(**fingerprints)
+            for name, value in fingerprints.items():
+                setattr(claim, name, value)
+        await index_fingerprints(claims, using_db=conn)
+        await record_events(_moved(claims, archiving=False), using_db=conn)
+    ARCHIVE_MOVES.inc("restored")
+    return True
+
+
+# Lookups
+
+async def find_claim(claim_id: int, using_db: Optional[BaseDBAsyncClient] = None) -> Optional[AnyClaim]:
+    """Active or archived claim by id; archived claims have the same attributes plus archived_at"""
+    claim = await Claim.get_or_none(id=claim_id, using_db=using_db)
+    if claim is None:
+        claim = await ArchivedClaim.get_or_none(id=claim_id, using_db=using_db)
+    return claim
+
+
+async def find_document(document_id: int, using_db: Optional[BaseDBAsyncClient] = None) -> Optional[AnyDocument]:
+    """Document by id with its claim loaded, from either side"""
+    document = await ClaimDocument.get_or_none(id=document_id, using_db=using_db).select_related("claim")
+    if document is None:
+        document = await ArchivedClaimDocument.get_or_none(id=document_id, using_db=using_db).select_related("claim")
+    return document
+
+
+async def writable_claim(claim_id: int, user: User) -> Optional[Claim]:
+    """Active claim by id, moved back out of the archive first if that is where it is.
+
+    Restoring on write is deliberate: a note or document on an archived claim reopens it.
+    Only users who can view the archived claim may restore it; for anyone else it is not found.
+    """
+    claim = await Claim.get_or_none(id=claim_id)
+    if claim is not None:
+        return claim
+    archived = await ArchivedClaim.get_or_none(id=claim_id)
+    if archived is None or not can_view_claim(user, archived):
+        return None
+    if await restore_claim(claim_id):
+        claim = await Claim.get_or_none(id=claim_id)
+    return claim
+
+
+def related_models(claim: AnyClaim) -> Tuple[Type[Model], Type[Model]]:
+    """(note model, document model) holding this claim's notes and documents"""
+    if isinstance(claim, ArchivedClaim):
+        return ArchivedClaimNote, ArchivedClaimDocument
+    return ClaimNote, ClaimDocument
+
+
+async def claim_values(claim_ids: List[int], *fields: str, **joined: str) -> List[dict]:
+    """.values() rows for claim_ids, reading the archive only for ids not found active"""
+    rows = await Claim.filter(id__in=claim_ids).values(*fields, **joined)
+    missing = set(claim_ids) - {row["id"] for row in rows}
+    if missing:
+        rows += await ArchivedClaim.filter(id__in=list(missing)).values(*fields, **joined)
+    return rows
+
+
+# Background runs
+
+async def _run_periodically():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+        try:
+            report = await archive_claims()
+            if report["archived"]:
+                logger.info("Archived %d closed claims", report["archived"])
+        except Exception:
+            logger.exception("Claim archiving failed")
+
+
+_archive_task: Optional[asyncio.Task] = None
+
+
+async def start_archiver():
+    global _archive_task
+    if ARCHIVE_INTERVAL > 0 and _archive_task is None:
+        _archive_task = asyncio.create_task(_run_periodically())
+
+
+async def stop_archiver():
+    global _archive_task
+    if _archive_task is not None:
+        _archive_task.cancel()
+        _archive_task = None
+
+
+async def main(args):
+    await Tortoise.init(config=tortoise_config())
+    try:
+        if args.command == "run":
+            print(json.dumps(await archive_claims(args.older_than_days, args.batch_size), indent=2))
+        else:
+            restored = await restore_claim(args.claim_id)
+            print(json.dumps({"claim_id": args.claim_id, "restored": restored}, indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive closed claims or restore one")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="archive closed claims older than the cutoff")
+    run.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    run.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    restore = commands.add_parser("restore", help="move one archived claim back")
+    restore.add_argument("claim_id", type=int)
+    asyncio.run(main(parser.parse_args()))
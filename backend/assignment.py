@@ -0,0 +1,152 @@
+"""Workload-aware assignment of UNDER_REVIEW claims to adjusters.
+
+Open-claim counts (ASSIGNED + INVESTIGATING) for every active adjuster come from
+one GROUP BY over claim, served by the (assigned_adjuster_id, status, ...) index.
+The counts go into a min-heap keyed by (open claims, adjuster id), so each claim
+is placed on the least-loaded adjuster in O(log n); adjusters at the optional cap
+drop out of the heap. All assignments are written with one bulk UPDATE.
+
+There is no region (or any other location) data on users, policies or claims,
+so placement is by workload alone.
+"""
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+
+from models import User, Claim, UserRole, ClaimStatus
+from claim_summary import ClaimSnapshot, record_claim_changes
+from change_feed import record_events, status_changed
+
+OPEN_STATUSES = [ClaimStatus.ASSIGNED, ClaimStatus.INVESTIGATING]
+MAX_OPEN_CLAIMS_PER_ADJUSTER = int(os.getenv("MAX_OPEN_CLAIMS_PER_ADJUSTER", 0))  # 0 = no cap
+AUTO_ASSIGN_BATCH_SIZE = int(os.getenv("AUTO_ASSIGN_BATCH_SIZE", 500))
+# Serialises auto-assign runs on Postgres so caps hold across concurrent callers
+AUTO_ASSIGN_LOCK_KEY = 0x41535347
+
+
+@dataclass
+class AdjusterLoad:
+    id: int
+    name: str
+    open_claims: int
+
+
+@dataclass
+class AssignmentRun:
+    assignments: Dict[int, int] = field(default_factory=dict)  # claim id -> adjuster id
+    unassigned_claim_ids: List[int] = field(default_factory=list)
+    adjusters: List[AdjusterLoad] = field(default_factory=list)
+    # (claim id, before, after) for publishing once the transaction has committed
+    transitions: List[Tuple[int, ClaimSnapshot, ClaimSnapshot]] = field(default_factory=list)
+
+
+async def adjuster_workloads(using_db: Optional[BaseDBAsyncClient] = None) -> List[AdjusterLoad]:
+    adjusters = await User.filter(role=UserRole.ADJUSTER, is_active=True).using_db(using_db).order_by("id").values(
+        "id", "first_name", "last_name"
+    )
+    open_claims = dict(
+        await Claim.filter(status__in=OPEN_STATUSES, assigned_adjuster_id__isnull=False).using_db(using_db)
+        .group_by("assigned_adjuster_id").annotate(open_claims=Count("id"))
+        .values_list("assigned_adjuster_id", "open_claims")
+    )
+    return [
+        AdjusterLoad(id=a["id"], name=f"{a['first_name']} {a['last_name']}", open_claims=open_claims.get(a["id"], 0))
+        for a in adjusters
+    ]
+
+
+def plan_assignments(
+    claim_ids: Sequence[int], workloads: Sequence[AdjusterLoad], max_open_claims: int = 0
+) -> Tuple[Dict[int, int], List[int]]:
+    """Place claims in order on the least-loaded adjuster; returns (plan, claims left over at the cap)"""
+    heap = [(load.open_claims, load.id) for load in workloads if not max_open_claims or load.open_claims < max_open_claims]
+    heapq.heapify(heap)
+    plan: Dict[int, int] = {}
+    for i, claim_id in enumerate(claim_ids):
+        if not heap:
+            return plan, list(claim_ids[i:])
+        open_claims, adjuster_id = heap[0]
+        plan[claim_id] = adjuster_id
+        if max_open_claims and open_claims + 1 >= max_open_claims:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (open_claims + 1, adjuster_id))
+    return plan, []
+
+
+async def _write_assignments(conn: BaseDBAsyncClient, plan: Dict[int, int], updated_at):
+    """One UPDATE ... SET assigned_adjuster_id = CASE id WHEN ... END for the whole plan.
+
+    Raw SQL because Tortoise's bulk_update leaves enum values unquoted and update()
+    does not accept a CASE expression for a foreign key.
+    """
+    table = Claim._meta.db_table
+    values = [ClaimStatus.ASSIGNED.value, Claim._meta.fields_map["updated_at"].to_db_value(updated_at, Claim)]
+    for claim_id, adjuster_id in plan.items():
+        values += [claim_id, adjuster_id]
+    values += list(plan)
+    if conn.capabilities.dialect == "postgres":
+        params = iter(f"${i}" for i in range(1, len(values) + 1))
+        cast = "::int"
+    else:
+        params = iter("?" * len(values))
+        cast = ""
+    status_param, updated_param = next(params), next(params)
+    cases = " ".join(f"WHEN {next(params)}{cast} THEN {next(params)}{cast}" for _ in plan)
+    ids = ", ".join(next(params) for _ in plan)
+    await conn.execute_query(
+        f'UPDATE "{table}" SET "status" = {status_param}, "updated_at" = {updated_param}, '
+        f'"assigned_adjuster_id" = CASE "id" {cases} END WHERE "id" IN ({ids})',
+        values,
+    )
+
+
+async def auto_assign(
+    claim_ids: Optional[Sequence[int]] = None,
+    limit: int = AUTO_ASSIGN_BATCH_SIZE,
+    max_open_claims: int = MAX_OPEN_CLAIMS_PER_ADJUSTER,
+) -> AssignmentRun:
+    """Assign the oldest UNDER_REVIEW claims (optionally only claim_ids), up to limit"""
+    run = AssignmentRun()
+    async with in_transaction() as conn:
+        if conn.capabilities.dialect == "postgres":
+            await conn.execute_query("SELECT pg_advisory_xact_lock($1)", [AUTO_ASSIGN_LOCK_KEY])
+        query = Claim.filter(status=ClaimStatus.UNDER_REVIEW)
+        if claim_ids is not None:
+            query = query.filter(id__in=list(claim_ids))
+        # Rows someone is editing by hand are skipped rather than waited on
+        claims = await query.order_by("created_at", "id").limit(limit).select_for_update(skip_locked=True).using_db(conn)
+        workloads = await adjuster_workloads(conn)
+        plan, run.unassigned_claim_ids = plan_assignments([c.id for c in claims], workloads, max_open_claims)
+
+        assigned = []
+        updated_at = timezone.now()
+        for claim in claims:
+            if claim.id not in plan:
+                continue
+            before = ClaimSnapshot.of(claim)
+            claim.status = ClaimStatus.ASSIGNED
+            claim.assigned_adjuster_id = plan[claim.id]
+            claim.updated_at = updated_at
+            assigned.append(claim)
+            run.transitions.append((claim.id, before, ClaimSnapshot.of(claim)))
+        if assigned:
+            await _write_assignments(conn, plan, updated_at)
+            await record_claim_changes([(before, after) for _, before, after in run.transitions], using_db=conn)
+            await record_events([status_changed(*transition) for transition in run.transitions], using_db=conn)
+
+    run.assignments = plan
+    added: Dict[int, int] = {}
+    for adjuster_id in plan.values():
+        added[adjuster_id] = added.get(adjuster_id, 0) + 1
+    run.adjusters = [
+        AdjusterLoad(id=load.id, name=load.name, open_claims=load.open_claims + added.get(load.id, 0))
+        for load in workloads
+    ]
+    return run
@@ -1,25 +1,131 @@
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from tortoise.signals import post_save, post_delete
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
 from models import User, UserRole
+from cache import TTLCache
+from metrics import PASSWORD_HASH_SECONDS, set_request_role
+from db import note_request_user
+import asyncio
 import os
+import time
 
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 100))
+
 security = HTTPBearer()
 
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "false").lower() == "true"
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+token_cache = TTLCache(maxsize=USER_CACHE_SIZE if TOKEN_CACHE_ENABLED else 0, ttl=USER_CACHE_TTL)
+
+@dataclass
+class AuthenticatedUser:
+    """Identity snapshot cached per user id in place of a full User row"""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: UserRole
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+def invalidate_user(user_id: int):
+    """Drop a cached identity, e.g. after a role or is_active change made with a bulk update"""
+    user_cache.invalidate(int(user_id))
+
+@post_save(User)
+async def _user_saved(sender, instance, created, using_db, update_fields):
+    invalidate_user(instance.id)
+
+@post_delete(User)
+async def _user_deleted(sender, instance, using_db):
+    invalidate_user(instance.id)
+
+def auth_cache_stats() -> dict:
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+# passlib and jose (with its cryptography backend) are imported on first use rather
+# than with the app; warm_up loads them in the background once a worker is serving
+
+@lru_cache(maxsize=None)
+def password_context():
+    """Hashes made with a different cost than BCRYPT_ROUNDS report needs_update and are
+    replaced on the next successful login"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def warm_up():
+    """Load the password hasher and JWT libraries ahead of the first login or token (blocking)"""
+    from jose import jwt
+    password_context().handler("bcrypt").get_backend()
+    jwt.decode(jwt.encode({"sub": "0"}, SECRET_KEY, algorithm=ALGORITHM), SECRET_KEY, algorithms=[ALGORITHM])
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism without blocking the loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="bcrypt")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_CONCURRENCY)
+_hash_waiting = 0
+
+async def _run_password_hasher(operation: str, fn, *args):
+    """Run a bcrypt call on the hash pool, queueing up to PASSWORD_HASH_QUEUE_LIMIT callers"""
+    global _hash_waiting
+    if _hash_slots.locked() and _hash_waiting >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent authentication requests",
+            headers={"Retry-After": "1"},
+        )
+    start = time.perf_counter()
+    _hash_waiting += 1
+    try:
+        await _hash_slots.acquire()
+    finally:
+        _hash_waiting -= 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+        PASSWORD_HASH_SECONDS.observe(time.perf_counter() - start, operation)
+
+async def hash_password(password: str) -> str:
+    return await _run_password_hasher("hash", password_context().hash, password)
+
+async def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a replacement hash when the stored cost is stale"""
+    return await _run_password_hasher("verify", password_context().verify_and_update, password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -29,23 +135,39 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def token_user_id(token: str) -> Optional[int]:
+    """User id a valid, unexpired token was issued to, or None"""
+    user_id = token_cache.get(token)
+    if user_id is None:
+        from jose import JWTError, jwt
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = int(payload["sub"])
+        except (JWTError, KeyError, TypeError, ValueError):
+            return None
+        # Never keep a token around past its own expiry
+        token_cache.set(token, user_id, ttl=payload.get("exp", 0) - time.time())
+    return user_id
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> AuthenticatedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = token_user_id(credentials.credentials)
+    if user_id is None:
         raise credentials_exception
     
-    user = await User.get_or_none(id=user_id)
+    user = user_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        db_user = await User.get_or_none(id=user_id)
+        if db_user is None:
+            raise credentials_exception
+        user = AuthenticatedUser.from_user(db_user)
+        user_cache.set(user_id, user)
+    set_request_role(user.role)
+    note_request_user(user.id)
     return user
 
 def require_role(allowed_roles: list):
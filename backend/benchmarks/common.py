@@ -0,0 +1,66 @@
+"""Shared helpers for the in-process benchmarks.
+
+Run benchmarks from the backend directory, e.g. ``python -m benchmarks.login_latency``.
+"""
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+from tortoise import Tortoise
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float], elapsed: float = None) -> Dict[str, float]:
+    """Latency summary in milliseconds, plus throughput when the wall time is known"""
+    result = {
+        "count": len(samples),
+        "mean_ms": (sum(samples) / len(samples) * 1000) if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples, default=0.0) * 1000,
+    }
+    if elapsed:
+        result["throughput_rps"] = len(samples) / elapsed
+    return result
+
+
+@asynccontextmanager
+async def benchmark_app(db_url: str = None):
+    """Initialise the ORM and yield an ASGI client for main.app inside a scratch directory"""
+    workdir = tempfile.mkdtemp(prefix="claims-bench-")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    db_url = db_url or f"sqlite://{os.path.join(workdir, 'bench.sqlite3')}"
+    # Every benchmark request comes from one client; measure the endpoints, not the rate limits
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    import main
+    from db import tortoise_config
+    from search import ensure_search_index
+
+    await Tortoise.init(config=tortoise_config(url=db_url))
+    await Tortoise.generate_schemas(safe=True)
+    await ensure_search_index()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+    finally:
+        await Tortoise.close_connections()
+        os.chdir(previous)
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    return time.perf_counter() - start, response
@@ -0,0 +1,150 @@
+"""Endpoint benchmark suite driven in-process over ASGI.
+
+    python -m benchmarks.endpoints --claims 50000 --requests 200 --concurrency 20 \
+        --output benchmarks/results/$(date +%Y%m%d-%H%M%S).json
+
+Seeds a scratch SQLite database with generate_data (or uses --db-url, e.g. a
+local Postgres), then measures throughput and p50/p95/p99 for each scenario.
+Results are written as JSON so runs can be compared over time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import benchmark_app, summarize, timed
+from generate_data import GeneratorConfig, generate
+
+UPLOAD_BYTES = os.urandom(256 * 1024)
+SEARCH_TERMS = ["hail damage", "parking", "deer", "highway 101", "CLM-"]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+async def run_scenario(name, make_request, requests, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    samples, statuses = [], {}
+
+    async def one(i):
+        async with gate:
+            request = make_request(i)
+            if request is None:
+                return
+            elapsed, response = await timed(request)
+            samples.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    result = {"scenario": name, "statuses": statuses, **summarize(samples, wall)}
+    print(f"{name:<28} p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+          f"p99={result['p99_ms']:8.2f}ms rps={result.get('throughput_rps', 0):8.1f} {statuses}")
+    return result
+
+
+async def run(args):
+    async with benchmark_app(args.db_url) as client:
+        from auth import create_access_token
+        from models import User, Claim, UserRole, ClaimStatus
+
+        config = GeneratorConfig(
+            users_per_role=args.users_per_role,
+            customers=args.customers,
+            policies=args.policies,
+            claims=args.claims,
+            notes_per_claim=1,
+            documents_per_claim=1,
+        )
+        seeded = await generate(config)
+        tag = config.prefix.lower()
+
+        users = {}
+        for role in UserRole:
+            users[role] = await User.get(email=f"{role.value}0.{tag}@gen.test")
+        headers = {
+            role: {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+            for role, user in users.items()
+        }
+        claim_ids = await Claim.filter(claim_number__startswith=f"CLM-{config.prefix}").limit(args.requests).values_list("id", flat=True)
+        assigned_ids = await Claim.filter(
+            claim_number__startswith=f"CLM-{config.prefix}", status=ClaimStatus.ASSIGNED
+        ).limit(args.requests).values_list("id", flat=True)
+
+        scenarios = [
+            ("login", lambda i: client.post(
+                "/auth/login", data={"email": f"customer0.{tag}@gen.test", "password": "password"})),
+        ]
+        for role in UserRole:
+            scenarios.append((f"claims_list[{role.value}]", lambda i, role=role: client.get(
+                "/claims", headers=headers[role])))
+        scenarios += [
+            ("claim_detail[admin]", lambda i: client.get(
+                f"/claims/{claim_ids[i % len(claim_ids)]}", headers=headers[UserRole.ADMIN])),
+            ("claim_search[agent]", lambda i: client.get(
+                "/claims/search", params={"q": SEARCH_TERMS[i % len(SEARCH_TERMS)]}, headers=headers[UserRole.AGENT])),
+            ("claim_full[admin]", lambda i: client.get(
+                f"/claims/{claim_ids[i % len(claim_ids)]}/full", headers=headers[UserRole.ADMIN])),
+            ("status_update[manager]", lambda i: client.put(
+                f"/claims/{assigned_ids[i]}/status", params={"new_status": ClaimStatus.INVESTIGATING.value},
+                headers=headers[UserRole.MANAGER]) if i < len(assigned_ids) else None),
+            ("upload[admin]", lambda i: client.post(
+                f"/claims/{claim_ids[i % len(claim_ids)]}/documents",
+                files={"file": (f"photo{i}.jpg", UPLOAD_BYTES[:-1] + bytes([i % 256]), "image/jpeg")},
+                headers=headers[UserRole.ADMIN])),
+        ]
+        only = set(args.scenario or [])
+        results = []
+        for name, make_request in scenarios:
+            if only and not any(name.startswith(s) for s in only):
+                continue
+            results.append(await run_scenario(name, make_request, args.requests, args.concurrency))
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "database": "postgres" if args.db_url and args.db_url.startswith("postgres") else "sqlite",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "dataset": seeded,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="benchmark against this database instead of a scratch SQLite file")
+    parser.add_argument("--users-per-role", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--policies", type=int, default=2000)
+    parser.add_argument("--claims", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenario", action="append", help="only run scenarios starting with this name")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
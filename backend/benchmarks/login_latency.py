@@ -0,0 +1,88 @@
+"""Login latency under a concurrent burst, with bcrypt inline vs. on the hash pool.
+
+    python -m benchmarks.login_latency --concurrency 50 --requests 200
+    python -m benchmarks.login_latency --inline   # previous behaviour, for comparison
+
+While the burst runs, a probe measures event-loop lag (how late a 5 ms sleep
+wakes up) and the latency of GET /auth/me, i.e. how much unrelated requests
+are delayed.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import benchmark_app, summarize, timed
+
+
+async def run(args):
+    async with benchmark_app() as client:
+        import main
+        from auth import create_access_token, password_context
+        from models import User, UserRole
+
+        if args.inline:
+            async def inline_verify(password, hashed_password):
+                return password_context().verify_and_update(password, hashed_password)
+            main.verify_and_update_password = inline_verify
+
+        user = await User.create(
+            email="bench@test.com",
+            password_hash=password_context().hash("password"),
+            first_name="Bench",
+            last_name="User",
+            role=UserRole.CUSTOMER,
+        )
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+        await client.get("/auth/me", headers=headers)
+
+        gate = asyncio.Semaphore(args.concurrency)
+        login_samples, probe_samples, lag_samples = [], [], []
+        statuses = {}
+        done = asyncio.Event()
+
+        async def login():
+            async with gate:
+                elapsed, response = await timed(
+                    client.post("/auth/login", data={"email": "bench@test.com", "password": "password"})
+                )
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                login_samples.append(elapsed)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag_samples.append(time.perf_counter() - start - 0.005)
+                elapsed, _ = await timed(client.get("/auth/me", headers=headers))
+                probe_samples.append(elapsed)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.requests)))
+        wall = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+        return {
+            "mode": "inline" if args.inline else "hash_pool",
+            "bcrypt_rounds": password_context().handler("bcrypt").default_rounds,
+            "concurrency": args.concurrency,
+            "statuses": statuses,
+            "login": summarize(login_samples, wall),
+            "probe_auth_me": summarize(probe_samples),
+            "event_loop_lag": summarize(lag_samples),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--inline", action="store_true", help="verify on the event loop (pre-pool behaviour)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
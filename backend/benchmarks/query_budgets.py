@@ -0,0 +1,26 @@
+"""Query budget check: fail when an endpoint issues more SQL than it is allowed.
+
+    python -m benchmarks.query_budgets            # exit status 1 on any overrun
+    python -m benchmarks.query_budgets --report   # print every endpoint's statements
+
+The budgets live in tests/test_query_budgets.py and run with the rest of the
+test suite; this runs just that module.
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+BUDGETS_MODULE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "test_query_budgets.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--report", action="store_true", help="print the statements of endpoints within budget too")
+    args = parser.parse_args()
+    sys.exit(pytest.main(["-v", "-p", "no:warnings", BUDGETS_MODULE] + (["-s"] if args.report else [])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Claim list serialization benchmark: model instances vs .values() rows.
+
+    python -m benchmarks.serialization --rows 10000 --rows 100000
+
+Seeds a scratch database with generate_data, then fetches and encodes the same
+rows both ways. "models" is the previous GET /claims path (Claim instances,
+ClaimResponse.model_validate, response_model validation, json.dumps); "values"
+is the current one (.values() dicts encoded by serialization.dumps). Time is the
+best of --repeat runs; peak memory is measured separately under tracemalloc.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmarks.common import benchmark_app
+from generate_data import GeneratorConfig, generate
+
+
+async def models_path(limit: int) -> bytes:
+    from models import Claim
+    from schemas import ClaimResponse
+
+    claims = await Claim.all().order_by("-created_at", "-id").limit(limit)
+    content = [ClaimResponse.model_validate(claim.__dict__) for claim in claims]
+    # What FastAPI does with the handler result for response_model=List[ClaimResponse]
+    adapter = TypeAdapter(List[ClaimResponse])
+    content = adapter.dump_python(adapter.validate_python(content), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def values_path(limit: int) -> bytes:
+    from models import Claim
+    from serialization import CLAIM_RESPONSE_FIELDS, dumps
+
+    rows = await Claim.all().order_by("-created_at", "-id").limit(limit).values(*CLAIM_RESPONSE_FIELDS)
+    return dumps(rows)
+
+
+async def measure(path, limit: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await path(limit)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    await path(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mib": peak / 2 ** 20, "bytes": len(body)}
+
+
+async def run(args) -> list:
+    async with benchmark_app(args.db_url):
+        await generate(GeneratorConfig(
+            users_per_role=2,
+            customers=max(1, max(args.rows) // 20),
+            policies=max(1, max(args.rows) // 10),
+            claims=max(args.rows),
+            notes_per_claim=0,
+            documents_per_claim=0,
+        ))
+        results = []
+        for limit in args.rows:
+            for name, path in (("models", models_path), ("values", values_path)):
+                result = {"rows": limit, "path": name, **await measure(path, limit, args.repeat)}
+                print(f"{limit:>8} rows {name:<7} {result['seconds'] * 1000:9.1f}ms "
+                      f"peak={result['peak_mib']:8.1f}MiB body={result['bytes'] / 2 ** 20:6.1f}MiB")
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="benchmark against this database instead of a scratch SQLite file")
+    parser.add_argument("--rows", type=int, action="append", help="list sizes to compare (default: 10000 and 100000)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+    args.rows = sorted(args.rows or [10000, 100000])
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
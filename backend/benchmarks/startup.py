@@ -0,0 +1,119 @@
+"""Cold start: import time and time to first request, per STARTUP_MODE.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --mode production --database-url postgres://...
+
+Every sample is a fresh interpreter. Import time is ``import main`` timed
+inside it; time to first request runs from spawning ``uvicorn main:app`` until
+an authenticated GET /auth/me (token check plus user lookup) is answered 200,
+polled every 10 ms. By default both modes run against a scratch SQLite database
+built with generate_schemas and stamped as migrated to the head, so production
+mode's schema check passes; --database-url measures a real migrated database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import httpx
+from tortoise import Tortoise
+
+from benchmarks.common import summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_PROBE = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+READY_TIMEOUT = 60
+
+
+async def prepare_database(db_url: str, scratch: bool) -> str:
+    """Bearer token for a user in the database, creating schema and user on a scratch database"""
+    from aerich.models import Aerich
+    from auth import create_access_token
+    from db import tortoise_config
+    from models import User, UserRole
+    from search import ensure_search_index
+    from startup import MIGRATION_APP, migration_head
+
+    await Tortoise.init(config=tortoise_config(["models", "aerich.models"], url=db_url))
+    try:
+        if scratch:
+            await Tortoise.generate_schemas()
+            await ensure_search_index()
+            await Aerich.create(version=migration_head(), app=MIGRATION_APP, content={})
+        user, _ = await User.get_or_create(
+            email="startup-bench@test.com",
+            defaults={"password_hash": "-", "first_name": "Startup", "last_name": "Bench", "role": UserRole.ADMIN},
+        )
+        return create_access_token({"sub": str(user.id)}, timedelta(hours=1))
+    finally:
+        await Tortoise.close_connections()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_seconds(env: dict, workdir: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, cwd=workdir, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def first_request_seconds(env: dict, workdir: str, token: str) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=workdir,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - start < READY_TIMEOUT:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with status {server.returncode} before answering")
+                try:
+                    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+                if response.status_code != 200:
+                    raise RuntimeError(f"First request answered {response.status_code}: {response.text}")
+                return time.perf_counter() - start
+        raise RuntimeError(f"No answer within {READY_TIMEOUT}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=("development", "production"), action="append")
+    parser.add_argument("--database-url", help="migrated database to start against (default: scratch SQLite)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="claims-startup-")
+    db_url = args.database_url or f"sqlite://{os.path.join(workdir, 'startup.sqlite3')}"
+    token = asyncio.run(prepare_database(db_url, scratch=not args.database_url))
+    base_env = dict(os.environ, DATABASE_URL=db_url, PYTHONPATH=BACKEND_DIR)
+
+    results = {}
+    for mode in args.mode or ["development", "production"]:
+        env = dict(base_env, STARTUP_MODE=mode)
+        imports = [import_seconds(env, workdir) for _ in range(args.runs)]
+        first_requests = [first_request_seconds(env, workdir, token) for _ in range(args.runs)]
+        results[mode] = {"import_main": summarize(imports), "time_to_first_request": summarize(first_requests)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
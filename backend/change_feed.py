@@ -0,0 +1,198 @@
+"""Claim change feed behind GET /claims/changes, for integrations that sync incrementally.
+
+    python change_feed.py compact [--older-than-days 30]
+
+Every claim write appends ClaimEvent rows (the same ClaimUpdate payload the live
+stream publishes) in its own transaction, so an event exists exactly when its
+change committed: claim_created, status_changed, note_added,
+document_uploaded, and claim_archived / claim_restored when archive.py moves a
+claim out of or back into the active tables.
+
+An event's id is its sequence number. On Postgres, record_events takes a
+transaction-level advisory lock just before inserting, so ids are handed out
+and committed in the same order, and a reader that has seen event N will never
+later find a new event below N. Writers only queue on the lock for their final
+insert and commit. (SQLite has a single writer anyway.)
+
+Consumers poll with since=<next_cursor of the previous page>, starting at 0.
+Each page is filtered by role like the live stream. The cursor moves past
+events the caller cannot see, so polling stays cheap. Compaction deletes events
+older than CHANGE_FEED_RETENTION_DAYS, always keeping the newest one. A cursor
+that points into the deleted range gets 410 Gone: the consumer has missed
+events and must resync from the list endpoints.
+
+Whether a cursor is stale is decided by the compaction watermark
+(claimeventwatermark), the highest id compaction has deleted through, not by
+the oldest remaining id: ids have gaps where transactions rolled back, so the
+oldest event left can be well above a cursor that missed nothing.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from tortoise import Tortoise, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Subquery
+from tortoise.functions import Max
+
+from claim_summary import ClaimSnapshot
+from db import tortoise_config
+from live_updates import ClaimUpdate
+from models import User, ClaimEvent, ClaimEventWatermark
+from visibility import visible_events
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_RETENTION_DAYS = int(os.getenv("CHANGE_FEED_RETENTION_DAYS", 30))
+CHANGE_FEED_COMPACT_INTERVAL = float(os.getenv("CHANGE_FEED_COMPACT_INTERVAL", 3600))  # seconds, 0 = CLI only
+CHANGE_FEED_COMPACT_BATCH = int(os.getenv("CHANGE_FEED_COMPACT_BATCH", 10000))
+CHANGE_FEED_LOCK_KEY = 0x43464545
+WATERMARK_ID = 1
+
+EVENT_FIELDS = (
+    "type", "claim_id", "status", "previous_status", "customer_id", "assigned_adjuster_id", "data", "created_at",
+)
+
+
+def status_changed(claim_id: int, before: ClaimSnapshot, after: ClaimSnapshot) -> ClaimUpdate:
+    return ClaimUpdate(
+        type="status_changed",
+        claim_id=claim_id,
+        status=after.status,
+        previous_status=before.status,
+        customer_id=after.customer_id,
+        assigned_adjuster_id=after.assigned_adjuster_id,
+    )
+
+
+async def record_events(updates: Sequence[ClaimUpdate], using_db: BaseDBAsyncClient):
+    """Append updates to the feed; call last in the transaction that made the changes"""
+    if not updates:
+        return
+    if using_db.capabilities.dialect == "postgres":
+        # Held until commit: the next writer draws its sequence numbers after ours are visible
+        await using_db.execute_query("SELECT pg_advisory_xact_lock($1)", [CHANGE_FEED_LOCK_KEY])
+    await ClaimEvent.bulk_create(
+        [
+            ClaimEvent(
+                type=update.type,
+                claim_id=update.claim_id,
+                status=update.status,
+                previous_status=update.previous_status,
+                customer_id=update.customer_id,
+                assigned_adjuster_id=update.assigned_adjuster_id,
+                data=update.data,
+            )
+            for update in updates
+        ],
+        using_db=using_db,
+    )
+
+
+async def changes_since(user: User, since: int, limit: int, using_db: Optional[BaseDBAsyncClient] = None) -> dict:
+    """Events after the since cursor that user may see, up to limit, and the cursor to continue from"""
+    # One statement for both: the newest event and how far compaction has deleted
+    bounds = await ClaimEvent.all().using_db(using_db).annotate(
+        head=Max("id"),
+        compacted_through=Subquery(ClaimEventWatermark.filter(id=WATERMARK_ID).values("compacted_through")),
+    ).first().values("head", "compacted_through")
+    head, compacted_through = bounds["head"], bounds["compacted_through"]
+    if since and compacted_through and since < compacted_through:
+        # Events after the cursor may have been compacted away before the consumer read them
+        raise HTTPException(status_code=410, detail="Cursor is older than the retained change history; resync")
+    if head is None or head <= since:
+        return {"events": [], "next_cursor": since, "has_more": False}
+
+    # Capped at head: everything up to it had committed when it was read
+    events = await visible_events(user).using_db(using_db).filter(id__gt=since, id__lte=head).order_by("id").limit(
+        limit + 1
+    ).values("id", *EVENT_FIELDS)
+    has_more = len(events) > limit
+    events = events[:limit]
+    for event in events:
+        event["sequence"] = event.pop("id")
+    return {
+        "events": events,
+        # Past invisible events too, so the next poll does not scan them again
+        "next_cursor": events[-1]["sequence"] if has_more else head,
+        "has_more": has_more,
+    }
+
+
+async def compact_events(
+    older_than_days: int = CHANGE_FEED_RETENTION_DAYS, batch_size: int = CHANGE_FEED_COMPACT_BATCH
+) -> dict:
+    """Delete events older than the retention window, oldest first, one batch per statement"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    newest = await ClaimEvent.all().order_by("-id").first().values_list("id", flat=True)
+    last_old = await ClaimEvent.filter(created_at__lt=cutoff).order_by("-created_at").first().values_list(
+        "id", flat=True
+    )
+    if newest is None or last_old is None:
+        return {"deleted": 0, "through": None}
+    # The newest event always stays, so ids keep counting up from it even if nothing else is written
+    through = min(last_old, newest - 1)
+    if through < 1:
+        return {"deleted": 0, "through": None}
+    # Raised before anything is deleted, so a reader never misses events without getting 410
+    await ClaimEventWatermark.get_or_create(id=WATERMARK_ID)
+    await ClaimEventWatermark.filter(id=WATERMARK_ID, compacted_through__lt=through).update(
+        compacted_through=through, compacted_at=timezone.now()
+    )
+    deleted = 0
+    start = await ClaimEvent.all().order_by("id").first().values_list("id", flat=True)
+    while start is not None and start <= through:
+        end = min(start + batch_size - 1, through)
+        deleted += await ClaimEvent.filter(id__gte=start, id__lte=end).delete()
+        start = end + 1
+    return {"deleted": deleted, "through": through}
+
+
+async def _compact_periodically():
+    while True:
+        await asyncio.sleep(CHANGE_FEED_COMPACT_INTERVAL)
+        try:
+            report = await compact_events()
+            if report["deleted"]:
+                logger.info("Compacted %d claim events through %s", report["deleted"], report["through"])
+        except Exception:
+            logger.exception("Claim event compaction failed")
+
+
+_compact_task: Optional[asyncio.Task] = None
+
+
+async def start_compactor():
+    global _compact_task
+    if CHANGE_FEED_COMPACT_INTERVAL > 0 and _compact_task is None:
+        _compact_task = asyncio.create_task(_compact_periodically())
+
+
+async def stop_compactor():
+    global _compact_task
+    if _compact_task is not None:
+        _compact_task.cancel()
+        _compact_task = None
+
+
+async def main(older_than_days: int):
+    await Tortoise.init(config=tortoise_config())
+    try:
+        print(json.dumps(await compact_events(older_than_days), indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trim the claim change feed")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="delete events older than the retention window")
+    compact.add_argument("--older-than-days", type=int, default=CHANGE_FEED_RETENTION_DAYS)
+    args = parser.parse_args()
+    asyncio.run(main(args.older_than_days))
@@ -0,0 +1,70 @@
+"""Aggregated claim view behind GET /claims/{id}/full.
+
+The claim is loaded with its policy and adjuster joined in, then one page of
+notes and one page of documents with their authors joined in, plus a count for
+each list: five queries however many notes or documents the claim has.
+Archived claims are read the same way from the archive tables (one more query).
+"""
+import asyncio
+
+from archive import AnyClaim, related_models
+from models import Claim, ArchivedClaim
+from downloads import DocumentVariant, document_url
+
+
+def full_name(user) -> str:
+    return f"{user.first_name} {user.last_name}"
+
+
+async def get_claim_with_relations(claim_id: int):
+    claim = await Claim.get_or_none(id=claim_id).select_related("policy", "assigned_adjuster")
+    if claim is None:
+        claim = await ArchivedClaim.get_or_none(id=claim_id).select_related("policy", "assigned_adjuster")
+    return claim
+
+
+async def claim_full(claim: AnyClaim, notes_limit: int, notes_offset: int, documents_limit: int, documents_offset: int) -> dict:
+    """Response body for a claim loaded by get_claim_with_relations"""
+    note_model, document_model = related_models(claim)
+    notes, notes_total, documents, documents_total = await asyncio.gather(
+        note_model.filter(claim_id=claim.id).select_related("author")
+        .order_by("-created_at", "-id").offset(notes_offset).limit(notes_limit),
+        note_model.filter(claim_id=claim.id).count(),
+        document_model.filter(claim_id=claim.id).select_related("uploaded_by")
+        .order_by("-uploaded_at", "-id").offset(documents_offset).limit(documents_limit),
+        document_model.filter(claim_id=claim.id).count(),
+    )
+    adjuster = claim.assigned_adjuster
+    return {
+        "claim": claim.__dict__,
+        "policy": claim.policy.__dict__,
+        "assigned_adjuster": {"id": adjuster.id, "name": full_name(adjuster)} if adjuster else None,
+        "notes": {
+            "items": [
+                {"id": n.id, "content": n.content, "author_name": full_name(n.author), "created_at": n.created_at}
+                for n in notes
+            ],
+            "total": notes_total,
+            "limit": notes_limit,
+            "offset": notes_offset,
+        },
+        "documents": {
+            "items": [
+                {
+                    "id": d.id, "file_name": d.file_name, "file_type": d.file_type, "file_size": d.file_size,
+                    "sha256": d.sha256, "uploaded_by_name": full_name(d.uploaded_by), "uploaded_at": d.uploaded_at,
+                    "derivatives_status": d.derivatives_status,
+                    "image_width": d.image_width, "image_height": d.image_height,
+                    "url": document_url(d.id),
+                    "thumbnail_url": document_url(d.id, DocumentVariant.THUMBNAIL) if d.thumbnail_path else None,
+                    "thumbnail_width": d.thumbnail_width, "thumbnail_height": d.thumbnail_height,
+                    "web_url": document_url(d.id, DocumentVariant.WEB) if d.web_path else None,
+                    "web_width": d.web_width, "web_height": d.web_height,
+                }
+                for d in documents
+            ],
+            "total": documents_total,
+            "limit": documents_limit,
+            "offset": documents_offset,
+        },
+    }
@@ -0,0 +1,200 @@
+"""Streaming claim export for reporting, behind GET /claims/export.
+
+    python claim_export.py --format csv --gzip --created-from 2025-01-01 --created-to 2025-02-01 -o claims.csv.gz
+
+Claims are read in keyset batches over (created_at, id), each batch one query
+with the policy and adjuster columns joined in, and encoded (and optionally
+gzipped) batch by batch as the response streams, so memory stays at one batch
+whatever the export size. Each batch holds a pooled connection only for its own
+query, not for the whole download, so a slow client never pins a connection.
+
+Without created_to the export stops at claims created when it started, so
+claims filed mid-export do not keep extending it. Batches are separate reads:
+a claim updated during a long export appears as it was when its batch was read.
+
+Archived claims (archive.py) are exported after the active ones, from their own
+table. Active claims go first so that one archived mid-export is still included;
+at worst it appears twice.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import sys
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, List, Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from tortoise import Tortoise, timezone
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from db import tortoise_config
+from models import Claim, ArchivedClaim, ClaimStatus
+from serialization import dumps
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", 6))
+EXPORT_FORMATS = ("csv", "ndjson")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}  # Starlette adds the charset to text/*
+
+# Export column -> values() lookup; policy and adjuster columns come from joins in the same query
+EXPORT_FIELDS = {
+    "id": "id",
+    "claim_number": "claim_number",
+    "status": "status",
+    "incident_date": "incident_date",
+    "incident_location": "incident_location",
+    "incident_description": "incident_description",
+    "estimated_damage": "estimated_damage",
+    "approved_amount": "approved_amount",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "customer_id": "customer_id",
+    "policy_id": "policy_id",
+    "policy_number": "policy__policy_number",
+    "vehicle_make": "policy__vehicle_make",
+    "vehicle_model": "policy__vehicle_model",
+    "vehicle_year": "policy__vehicle_year",
+    "license_plate": "policy__license_plate",
+    "coverage_amount": "policy__coverage_amount",
+    "assigned_adjuster_id": "assigned_adjuster_id",
+    "adjuster_first_name": "assigned_adjuster__first_name",
+    "adjuster_last_name": "assigned_adjuster__last_name",
+    "adjuster_email": "assigned_adjuster__email",
+}
+# Leading characters spreadsheets treat as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def filter_claims(
+    query: QuerySet,
+    status: Optional[List[ClaimStatus]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> QuerySet:
+    if status:
+        query = query.filter(status__in=status)
+    if created_from:
+        query = query.filter(created_at__gte=created_from)
+    # Pin the end of an open range so the export is a fixed set of claims
+    return query.filter(created_at__lt=created_to or timezone.now())
+
+
+async def iter_claim_batches(query: QuerySet, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """Export rows in (created_at, id) order, one keyset batch per query"""
+    last = None
+    while True:
+        batch = query
+        if last is not None:
+            batch = batch.filter(
+                Q(created_at__gt=last["created_at"]) | Q(created_at=last["created_at"], id__gt=last["id"])
+            )
+        rows = await batch.order_by("created_at", "id").limit(batch_size).values(**EXPORT_FIELDS)
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    if isinstance(value, Decimal):
+        return format(value, "f")  # never exponent notation
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Free text from customers must not run as a formula when finance opens the file
+        return "'" + value
+    return value
+
+
+class ExportEncoder:
+    """Turns row batches into CSV or NDJSON bytes, gzipped when asked"""
+
+    def __init__(self, fmt: str, compress: bool = False):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}")
+        self.fmt = fmt
+        # wbits 31: a gzip member rather than a raw zlib stream
+        self.compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def _compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) if self.compressor else data
+
+    def header(self) -> bytes:
+        if self.fmt != "csv":
+            return b""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_FIELDS)
+        return self._compress(buffer.getvalue().encode())
+
+    def encode(self, rows: List[dict]) -> bytes:
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([_csv_cell(value) for value in row.values()])
+            data = buffer.getvalue().encode()
+        else:
+            data = b"".join(dumps(row) + b"\n" for row in rows)
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush() if self.compressor else b""
+
+
+async def export_claims(queries: Sequence[QuerySet], fmt: str, compress: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Encoded export of each query in turn, one chunk per batch"""
+    encoder = ExportEncoder(fmt, compress)
+    yield encoder.header()
+    for query in queries:
+        async for rows in iter_claim_batches(query, batch_size):
+            # Encoding and compressing a batch is CPU work; keep it off the event loop
+            yield await run_in_threadpool(encoder.encode, rows)
+    yield encoder.finish()
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%SZ")
+    return f"claims-{stamp}.{fmt}" + (".gz" if compress else "")
+
+
+async def export_file(args) -> int:
+    await Tortoise.init(config=tortoise_config())
+    queries = [
+        filter_claims(model.all(), args.status, args.created_from, args.created_to) for model in (Claim, ArchivedClaim)
+    ]
+    size = 0
+    try:
+        with (open(args.output, "wb") if args.output != "-" else sys.stdout.buffer) as out:
+            async for chunk in export_claims(queries, args.format, args.gzip, args.batch_size):
+                out.write(chunk)
+                size += len(chunk)
+    finally:
+        await Tortoise.close_connections()
+    return size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export claims as CSV or NDJSON")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--status", type=ClaimStatus, action="append")
+    parser.add_argument("--created-from", type=datetime.fromisoformat)
+    parser.add_argument("--created-to", type=datetime.fromisoformat)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", default="-", help="file to write, - for stdout")
+    args = parser.parse_args()
+
+    size = asyncio.run(export_file(args))
+    if args.output != "-":
+        print(f"Wrote {size} bytes to {args.output}", file=sys.stderr)
@@ -0,0 +1,223 @@
+"""Bulk first-notice-of-loss import from CSV or NDJSON feeds.
+
+    python claim_import.py feed.csv --batch-size 1000 --rejects rejects.ndjson
+
+Rows are validated against ClaimCreate, policies are resolved with one query per
+batch and claims are written with bulk_create. Rows that fail validation or
+reference an unknown policy are reported: the first IMPORT_MAX_REJECTS in the
+report itself (what POST /admin/claims/import returns), and all of them in the
+reject file as NDJSON when one is given (the CLI). File reads and writes run on
+worker threads.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, asdict, field
+from itertools import islice
+from typing import IO, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from tortoise import Tortoise
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from db import tortoise_config
+from models import Policy, Claim
+from schemas import ClaimCreate
+from workflow import new_claim_number
+from claim_summary import ClaimSnapshot, record_claim_changes
+from change_feed import record_events
+from duplicates import fingerprint_fields, index_fingerprints
+from live_updates import ClaimUpdate, hub
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_MAX_REJECTS = int(os.getenv("IMPORT_MAX_REJECTS", 1000))  # rejects listed in the report
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    imported: int = 0
+    rejected: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    # The first max_rejects rejected rows; rejects_truncated when there were more
+    rejects: List[dict] = field(default_factory=list)
+    rejects_truncated: bool = False
+    reject_file: Optional[str] = None
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl", "json"):
+        return "ndjson"
+    raise ValueError(f"Cannot detect import format from {filename!r}; pass csv or ndjson")
+
+
+def iter_rows(stream: IO[str], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, raw row) without reading the whole feed into memory"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+    else:
+        raise ValueError(f"Unknown import format {fmt!r}")
+
+
+def _next_batch(rows: Iterator[Tuple[int, object]], batch_size: int):
+    """Parse and validate the next batch; runs on a worker thread"""
+    valid: List[Tuple[int, ClaimCreate]] = []
+    rejects: List[dict] = []
+    count = 0
+    for line_no, raw in islice(rows, batch_size):
+        count += 1
+        if isinstance(raw, Exception):
+            rejects.append({"line": line_no, "row": None, "errors": [str(raw)]})
+            continue
+        try:
+            valid.append((line_no, ClaimCreate.model_validate(raw)))
+        except ValidationError as e:
+            errors = [f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()]
+            rejects.append({"line": line_no, "row": raw, "errors": errors})
+    return count, valid, rejects
+
+
+def _claims_for(valid: List[Tuple[int, ClaimCreate]], customers: dict) -> List[Claim]:
+    return [
+        Claim(
+            claim_number=new_claim_number(),
+            policy_id=row.policy_id,
+            customer_id=customers[row.policy_id],
+            incident_date=row.incident_date,
+            incident_description=row.incident_description,
+            incident_location=row.incident_location,
+            **fingerprint_fields(row.policy_id, row.incident_date, row.incident_description, row.incident_location),
+        )
+        for _, row in valid
+    ]
+
+
+async def _insert_batch(claims: List[Claim], batch_size: int) -> List[ClaimUpdate]:
+    """Write a batch in one transaction; returns its claim_created updates to publish after commit"""
+    async with in_transaction() as conn:
+        await Claim.bulk_create(claims, batch_size=batch_size, using_db=conn)
+        await record_claim_changes([(None, ClaimSnapshot.of(claim)) for claim in claims], using_db=conn)
+        # bulk_create does not hand back ids; the fingerprint bands and the feed need them
+        ids = dict(await Claim.filter(claim_number__in=[claim.claim_number for claim in claims]).using_db(conn)
+                   .values_list("claim_number", "id"))
+        for claim in claims:
+            claim.id = ids[claim.claim_number]
+        await index_fingerprints(claims, using_db=conn)
+        created = [
+            ClaimUpdate(
+                type="claim_created",
+                claim_id=claim.id,
+                status=claim.status,
+                customer_id=claim.customer_id,
+                data={"claim_number": claim.claim_number},
+            )
+            for claim in claims
+        ]
+        await record_events(created, using_db=conn)
+    return created
+
+
+def _write_rejects(reject_stream: IO[str], rejects: List[dict]):
+    reject_stream.write("".join(json.dumps(reject, default=str) + "\n" for reject in rejects))
+
+
+async def import_claims(
+    stream: IO[str],
+    fmt: str,
+    reject_stream: Optional[IO[str]] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    max_rejects: int = IMPORT_MAX_REJECTS,
+) -> ImportReport:
+    report = ImportReport()
+    start = time.perf_counter()
+    rows = iter_rows(stream, fmt)
+
+    while True:
+        count, valid, rejects = await run_in_threadpool(_next_batch, rows, batch_size)
+        if not count:
+            break
+        report.total += count
+        report.batches += 1
+
+        policy_ids = {row.policy_id for _, row in valid}
+        customers = dict(await Policy.filter(id__in=policy_ids).values_list("id", "customer_id"))
+        for line_no, row in valid:
+            if row.policy_id not in customers:
+                rejects.append({"line": line_no, "row": row.model_dump(mode="json"), "errors": ["policy_id: Policy not found"]})
+        valid = [(line_no, row) for line_no, row in valid if row.policy_id in customers]
+
+        if valid:
+            try:
+                created = await _insert_batch(_claims_for(valid, customers), batch_size)
+            except IntegrityError:
+                # A generated claim number collided; a fresh set is all but certain to succeed
+                created = await _insert_batch(_claims_for(valid, customers), batch_size)
+            report.imported += len(valid)
+            for update in created:
+                await hub.publish(update)
+
+        rejects.sort(key=lambda r: r["line"])
+        report.rejects.extend(rejects[:max(0, max_rejects - len(report.rejects))])
+        if reject_stream is not None and rejects:
+            await run_in_threadpool(_write_rejects, reject_stream, rejects)
+        report.rejected += len(rejects)
+
+    report.rejects_truncated = report.rejected > len(report.rejects)
+    report.elapsed_seconds = time.perf_counter() - start
+    if report.elapsed_seconds:
+        report.rows_per_second = report.total / report.elapsed_seconds
+    return report
+
+
+async def import_file(path: str, fmt: Optional[str], reject_path: str, batch_size: int) -> ImportReport:
+    await Tortoise.init(config=tortoise_config())
+    # With the Postgres broker, API workers' live streams see the imported claims too
+    await hub.start()
+    try:
+        with open(path, newline="", encoding="utf-8") as stream, \
+                open(reject_path, "w", encoding="utf-8") as reject_stream:
+            # Every reject is in the file; the printed report only counts them
+            report = await import_claims(stream, fmt or detect_format(path), reject_stream, batch_size, max_rejects=0)
+        report.reject_file = reject_path
+        return report
+    finally:
+        await hub.stop()
+        await Tortoise.close_connections()
+
+
+def open_text(binary: IO[bytes]) -> IO[str]:
+    return io.TextIOWrapper(binary, encoding="utf-8", newline="")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import claims from a CSV or NDJSON feed")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--rejects", default="rejects.ndjson")
+    args = parser.parse_args()
+
+    report = asyncio.run(import_file(args.path, args.format, args.rejects, args.batch_size))
+    print(json.dumps(asdict(report), indent=2))
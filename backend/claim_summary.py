@@ -0,0 +1,197 @@
+"""Incrementally maintained claim counters behind GET /claims/summary.
+
+    python claim_summary.py rebuild
+
+Writers call record_claim_changes inside the same transaction as the claim
+write. The rebuild command recomputes every counter from a GROUP BY over the
+claim table and reports how many had drifted.
+"""
+import asyncio
+import json
+import os
+import random
+from dataclasses import dataclass, replace
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.functions import Count, Sum
+from tortoise.transactions import in_transaction
+
+from db import tortoise_config
+from models import User, Claim, ArchivedClaim, ClaimCounter, ClaimStatus, CounterScope
+from visibility import visible_counters
+
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", 8))
+
+CounterKey = Tuple[CounterScope, int, ClaimStatus]
+
+
+@dataclass(frozen=True)
+class ClaimSnapshot:
+    """The claim columns the counters depend on"""
+    status: ClaimStatus
+    customer_id: int
+    assigned_adjuster_id: Optional[int] = None
+    estimated_damage: Optional[Decimal] = None
+    approved_amount: Optional[Decimal] = None
+
+    @classmethod
+    def of(cls, claim) -> "ClaimSnapshot":
+        get = claim.get if isinstance(claim, dict) else lambda name: getattr(claim, name)
+        return cls(
+            status=ClaimStatus(get("status")),
+            customer_id=get("customer_id"),
+            assigned_adjuster_id=get("assigned_adjuster_id"),
+            estimated_damage=get("estimated_damage"),
+            approved_amount=get("approved_amount"),
+        )
+
+    def changed(self, status: ClaimStatus, changes: dict) -> "ClaimSnapshot":
+        fields = {k: v for k, v in changes.items() if k in self.__dataclass_fields__}
+        return replace(self, status=status, **fields)
+
+
+CENTS = Decimal("0.01")
+
+
+def _amount(value) -> Decimal:
+    return Decimal(str(value)).quantize(CENTS) if value is not None else Decimal(0)
+
+
+def counter_deltas(changes: Iterable[Tuple[Optional[ClaimSnapshot], Optional[ClaimSnapshot]]]) -> Dict[CounterKey, list]:
+    """Net (count, estimated, approved) change per counter for a set of before/after pairs"""
+    deltas: Dict[CounterKey, list] = {}
+    for before, after in changes:
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            for key in (
+                (CounterScope.CUSTOMER, snapshot.customer_id, snapshot.status),
+                (CounterScope.ADJUSTER, snapshot.assigned_adjuster_id or 0, snapshot.status),
+            ):
+                delta = deltas.setdefault(key, [0, Decimal(0), Decimal(0)])
+                delta[0] += sign
+                delta[1] += sign * _amount(snapshot.estimated_damage)
+                delta[2] += sign * _amount(snapshot.approved_amount)
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+async def _upsert(conn: BaseDBAsyncClient, key: CounterKey, delta: list, shard: int):
+    table = ClaimCounter._meta.db_table
+    scope, scope_id, status = key
+    count, estimated, approved = delta
+    if conn.capabilities.dialect == "postgres":
+        params = ", ".join(f"${i}" for i in range(1, 8))
+        values = [scope.value, scope_id, status.value, shard, count, estimated, approved]
+    else:
+        params = ", ".join("?" * 7)
+        values = [scope.value, scope_id, status.value, shard, count, str(estimated), str(approved)]
+    await conn.execute_query(
+        f'INSERT INTO "{table}" ("scope", "scope_id", "status", "shard", "claim_count", '
+        f'"estimated_damage_total", "approved_amount_total") VALUES ({params}) '
+        f'ON CONFLICT ("scope", "scope_id", "status", "shard") DO UPDATE SET '
+        f'"claim_count" = "{table}"."claim_count" + excluded."claim_count", '
+        f'"estimated_damage_total" = "{table}"."estimated_damage_total" + excluded."estimated_damage_total", '
+        f'"approved_amount_total" = "{table}"."approved_amount_total" + excluded."approved_amount_total"',
+        values,
+    )
+
+
+async def record_claim_changes(
+    changes: Iterable[Tuple[Optional[ClaimSnapshot], Optional[ClaimSnapshot]]],
+    using_db: BaseDBAsyncClient,
+):
+    """Apply claim before/after pairs to the counters; call inside the claim write's transaction"""
+    shard = random.randrange(COUNTER_SHARDS) if COUNTER_SHARDS > 1 else 0
+    # Fixed key order keeps concurrent writers from deadlocking on each other's rows
+    for key, delta in sorted(counter_deltas(changes).items(), key=lambda item: (item[0][0].value, item[0][1], item[0][2].value)):
+        await _upsert(using_db, key, delta, shard)
+
+
+async def claim_summary(user: User) -> dict:
+    rows = await visible_counters(user).group_by("status").annotate(
+        claims=Sum("claim_count"),
+        estimated=Sum("estimated_damage_total"),
+        approved=Sum("approved_amount_total"),
+    ).values("status", "claims", "estimated", "approved")
+    by_status = {
+        ClaimStatus(row["status"]): {
+            "status": ClaimStatus(row["status"]),
+            "count": int(row["claims"] or 0),
+            "estimated_damage_total": float(row["estimated"] or 0),
+            "approved_amount_total": float(row["approved"] or 0),
+        }
+        for row in rows
+    }
+    summary = [
+        by_status.get(status, {"status": status, "count": 0, "estimated_damage_total": 0.0, "approved_amount_total": 0.0})
+        for status in ClaimStatus
+    ]
+    return {
+        "total": sum(s["count"] for s in summary),
+        "estimated_damage_total": sum(s["estimated_damage_total"] for s in summary),
+        "approved_amount_total": sum(s["approved_amount_total"] for s in summary),
+        "by_status": summary,
+    }
+
+
+async def rebuild_counters() -> dict:
+    """Recompute all counters from the claim tables and replace them atomically"""
+    async with in_transaction() as conn:
+        if conn.capabilities.dialect == "postgres":
+            # Hold off counter upserts until the rebuilt rows are committed
+            await conn.execute_script(f'LOCK TABLE "{ClaimCounter._meta.db_table}" IN EXCLUSIVE MODE')
+
+        expected: Dict[CounterKey, list] = {}
+        # Archived claims are still counted
+        for model in (Claim, ArchivedClaim):
+            for scope, column in ((CounterScope.CUSTOMER, "customer_id"), (CounterScope.ADJUSTER, "assigned_adjuster_id")):
+                rows = await model.all().using_db(conn).group_by(column, "status").annotate(
+                    claims=Count("id"),
+                    estimated=Sum("estimated_damage"),
+                    approved=Sum("approved_amount"),
+                ).values(column, "status", "claims", "estimated", "approved")
+                for row in rows:
+                    totals = expected.setdefault((scope, row[column] or 0, ClaimStatus(row["status"])), [0, Decimal(0), Decimal(0)])
+                    totals[0] += row["claims"]
+                    totals[1] += _amount(row["estimated"])
+                    totals[2] += _amount(row["approved"])
+
+        current: Dict[CounterKey, list] = {}
+        for counter in await ClaimCounter.all().using_db(conn):
+            totals = current.setdefault((counter.scope, counter.scope_id, counter.status), [0, Decimal(0), Decimal(0)])
+            totals[0] += counter.claim_count
+            totals[1] += _amount(counter.estimated_damage_total)
+            totals[2] += _amount(counter.approved_amount_total)
+        current = {key: totals for key, totals in current.items() if any(totals)}
+
+        drifted = [key for key in expected.keys() | current.keys() if expected.get(key) != current.get(key)]
+
+        await ClaimCounter.all().using_db(conn).delete()
+        await ClaimCounter.bulk_create([
+            ClaimCounter(
+                scope=scope, scope_id=scope_id, status=status, shard=0,
+                claim_count=count, estimated_damage_total=estimated, approved_amount_total=approved,
+            )
+            for (scope, scope_id, status), (count, estimated, approved) in expected.items()
+        ], batch_size=1000, using_db=conn)
+
+    return {"counters": len(expected), "drifted": len(drifted)}
+
+
+async def main():
+    await Tortoise.init(config=tortoise_config())
+    try:
+        print(json.dumps(await rebuild_counters(), indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python claim_summary.py rebuild")
+    asyncio.run(main())
@@ -1,15 +1,12 @@
 import asyncio
 from tortoise import Tortoise
+from db import tortoise_config
 from models import User, Policy, Claim, UserRole, ClaimStatus
 from datetime import datetime, timedelta
-import os
 import uuid
 
 async def create_test_data():
-    await Tortoise.init(
-        db_url=os.getenv("DATABASE_URL", "sqlite://db.sqlite3").replace("postgresql://", "postgres://"),
-        modules={"models": ["models"]}
-    )
+    await Tortoise.init(config=tortoise_config())
     
     # Get test users
     customer = await User.get(email="customer@test.com")
@@ -1,14 +1,11 @@
 import asyncio
 from tortoise import Tortoise
+from db import tortoise_config
 from models import User, UserRole
 from auth import get_password_hash
-import os
 
 async def create_test_users():
-    await Tortoise.init(
-        db_url=os.getenv("DATABASE_URL", "sqlite://db.sqlite3").replace("postgresql://", "postgres://"),
-        modules={"models": ["models"]}
-    )
+    await Tortoise.init(config=tortoise_config())
     
     test_users = [
         {"email": "customer@test.com", "password": "password", "first_name": "Bob", "last_name": "Customer", "role": UserRole.CUSTOMER},
@@ -0,0 +1,271 @@
+"""Database settings shared by the API, aerich and the maintenance scripts.
+
+DATABASE_URL is the primary; on Postgres its asyncpg pool is sized and tuned
+from the DB_* settings below. DATABASE_REPLICA_URL optionally names a read
+replica. The replica is deliberately not a Tortoise connection: with a second
+connection in the config, a bare in_transaction() is ambiguous, and
+generate_schemas would try to create tables on a read-only server. Read-only
+endpoints ask read_connection() for a client instead and pass it to using_db.
+
+The replica is used only while it is healthy and within REPLICA_MAX_LAG_SECONDS
+(checked every REPLICA_CHECK_INTERVAL), and never for a user who made a write
+in the last READ_YOUR_WRITES_SECONDS, so people see their own changes at once.
+A replica statement that fails to connect is retried on the primary.
+"""
+import asyncio
+import importlib
+import logging
+import os
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import DBConnectionError
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalise_url(url: str) -> str:
+    """Tortoise only knows the postgres:// scheme"""
+    return url.replace("postgresql://", "postgres://", 1)
+
+
+DATABASE_URL = normalise_url(os.getenv("DATABASE_URL", "sqlite://db.sqlite3"))
+DATABASE_REPLICA_URL = normalise_url(os.getenv("DATABASE_REPLICA_URL", ""))
+
+# Per worker process: size DB_POOL_MAX_SIZE x workers below the server's max_connections
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", 300))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))  # 0 behind pgbouncer in transaction mode
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 10))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", 10))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 0)) or None  # 0 = no limit
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class PoolExhausted(DBConnectionError):
+    """No pooled connection became free within DB_ACQUIRE_TIMEOUT"""
+
+
+try:
+    import asyncpg
+    from tortoise.backends.asyncpg.client import AsyncpgDBClient
+except ImportError:  # SQLite-only installs
+    asyncpg = None
+else:
+    class PooledAsyncpgClient(AsyncpgDBClient):
+        """asyncpg client whose pool acquire gives up after acquire_timeout seconds"""
+
+        def __init__(self, acquire_timeout: Optional[float] = None, **kwargs):
+            super().__init__(**kwargs)
+            self.acquire_timeout = acquire_timeout
+
+        async def create_pool(self, **kwargs) -> "asyncpg.Pool":
+            pool = await super().create_pool(**kwargs)
+            acquire = pool.acquire
+
+            async def acquire_with_timeout():
+                try:
+                    return await acquire(timeout=self.acquire_timeout)
+                except asyncio.TimeoutError:
+                    raise PoolExhausted(
+                        f"no {self.connection_name} connection free after {self.acquire_timeout}s "
+                        f"(pool max {self.pool_maxsize})"
+                    )
+
+            # PoolConnectionWrapper calls pool.acquire() with no timeout
+            pool.acquire = acquire_with_timeout
+            return pool
+
+    # Tortoise loads a config entry's "engine" module and builds its client_class
+    client_class = PooledAsyncpgClient
+
+
+def connection_config(url: str) -> dict:
+    """Tortoise connection entry for url, with the pool settings applied on Postgres"""
+    info = expand_db_url(url)
+    if info["engine"] != "tortoise.backends.asyncpg":
+        return info
+    info["engine"] = __name__
+    info["credentials"].update(
+        minsize=DB_POOL_MIN_SIZE,
+        maxsize=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        acquire_timeout=DB_ACQUIRE_TIMEOUT,
+        timeout=DB_CONNECT_TIMEOUT,
+        command_timeout=DB_COMMAND_TIMEOUT,
+    )
+    return info
+
+
+def tortoise_config(modules=("models",), url: str = DATABASE_URL) -> dict:
+    return {
+        "connections": {"default": connection_config(normalise_url(url))},
+        "apps": {
+            "models": {
+                "models": list(modules),
+                "default_connection": "default",
+            },
+        },
+    }
+
+
+# Replica routing
+
+_CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, DBConnectionError) + (
+    (asyncpg.PostgresConnectionError, asyncpg.CannotConnectNowError) if asyncpg else ()
+)
+
+
+class ReplicaFallbackMixin:
+    """Retries a statement on the primary when the replica cannot be reached"""
+
+    async def _with_fallback(self, method: str, *args):
+        try:
+            return await getattr(super(), method)(*args)
+        except _CONNECTION_ERRORS as exc:
+            replica.mark_unhealthy(exc)
+            return await getattr(connections.get("default"), method)(*args)
+
+    async def execute_query(self, query, values=None):
+        return await self._with_fallback("execute_query", query, values)
+
+    async def execute_query_dict(self, query, values=None):
+        return await self._with_fallback("execute_query_dict", query, values)
+
+    async def probe(self, query: str) -> list:
+        """Run query on the replica only, for health checks"""
+        _, rows = await super().execute_query(query)
+        return rows
+
+
+@dataclass
+class ReplicaState:
+    client: Optional[BaseDBAsyncClient] = None
+    healthy: bool = False
+    lag_seconds: float = 0.0
+
+    def mark_unhealthy(self, exc):
+        if self.healthy:
+            logger.warning("Read replica unavailable, reading from the primary: %s", exc)
+        self.healthy = False
+
+
+replica = ReplicaState()
+# user id -> True while that user's reads must see the primary
+recent_writers = TTLCache(maxsize=100_000, ttl=READ_YOUR_WRITES_SECONDS)
+_request_writer: ContextVar[Optional[list]] = ContextVar("request_writer", default=None)
+
+
+def _create_replica_client() -> BaseDBAsyncClient:
+    info = connection_config(DATABASE_REPLICA_URL)
+    base = importlib.import_module(info["engine"]).client_class
+    client_class = type(f"Replica{base.__name__}", (ReplicaFallbackMixin, base), {})
+    return client_class(connection_name="replica", **info["credentials"])
+
+
+async def _replica_lag(client: BaseDBAsyncClient) -> float:
+    if client.capabilities.dialect != "postgres":
+        await client.probe("SELECT 1")
+        return 0.0
+    # Nothing left to replay means caught up, however long ago the last commit was
+    rows = await client.probe(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+    return float(rows[0][0])
+
+
+async def check_replica():
+    """Probe the replica; it takes reads only while reachable and within REPLICA_MAX_LAG_SECONDS"""
+    try:
+        lag = await _replica_lag(replica.client)
+    except Exception as exc:
+        replica.mark_unhealthy(exc)
+        return
+    replica.lag_seconds = lag
+    healthy = lag <= REPLICA_MAX_LAG_SECONDS
+    if healthy != replica.healthy:
+        logger.warning("Read replica %s (lag %.1fs)", "in use" if healthy else "lagging, reading from the primary", lag)
+    replica.healthy = healthy
+
+
+async def _watch_replica():
+    while True:
+        await check_replica()
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+
+_replica_task: Optional[asyncio.Task] = None
+
+
+async def start_replica():
+    global _replica_task
+    if not DATABASE_REPLICA_URL or replica.client is not None:
+        return
+    replica.client = _create_replica_client()
+    await check_replica()
+    if not replica.healthy:
+        logger.warning("Read replica not usable at startup, reading from the primary until it is")
+    _replica_task = asyncio.create_task(_watch_replica())
+
+
+async def stop_replica():
+    global _replica_task
+    if _replica_task is not None:
+        _replica_task.cancel()
+        _replica_task = None
+    if replica.client is not None:
+        await replica.client.close()
+        replica.client = None
+        replica.healthy = False
+
+
+def note_request_user(user_id: int):
+    """Called once the caller is authenticated; a write request pins them to the primary"""
+    writer = _request_writer.get()
+    if writer is not None:
+        writer.append(user_id)
+        # Also covers reads the same user makes while this write is still running
+        recent_writers.set(user_id, True)
+
+
+def read_connection(user) -> Optional[BaseDBAsyncClient]:
+    """Client for a read-only query on behalf of user, or None for the primary"""
+    if replica.client is None or not replica.healthy or recent_writers.get(user.id):
+        return None
+    return replica.client
+
+
+class ReadYourWritesMiddleware:
+    """Keeps the author of a write request reading from the primary for READ_YOUR_WRITES_SECONDS after it"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        writer = []
+        token = _request_writer.set(writer)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_writer.reset(token)
+            # The window starts once the write has committed, not when it arrived
+            for user_id in writer:
+                recent_writers.set(user_id, True)
@@ -0,0 +1,238 @@
+"""Thumbnails and web-sized copies of image documents, rendered off the event loop.
+
+upload_document stores the original and schedules image uploads here. Decoding,
+EXIF orientation, downscaling and JPEG re-encoding run in a process pool, so a
+burst of 12-megapixel phone photos costs CPU in worker processes rather than
+event-loop time. The result is recorded on the ClaimDocument row and its
+derivatives_status moves from PENDING to READY (or FAILED); until then clients
+use the original.
+
+Derivatives are content-addressed like the originals
+(``<UPLOAD_DIR>/derived/<sha[:2]>/<sha[2:4]>/<sha256>-web.jpg``), so a photo
+uploaded twice is rendered once. Re-encoding drops EXIF, GPS position included.
+
+Pillow is optional: without it image uploads stay at status NONE. Only the pool
+processes import it; the API process just checks that it is installed. Documents left
+PENDING by a restart are picked up at startup, or with
+
+    python derivatives.py backfill
+"""
+import asyncio
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Set
+
+from tortoise import Tortoise, timezone
+from tortoise.functions import Lower
+
+from db import tortoise_config
+from metrics import DERIVATIVE_SECONDS, DERIVATIVES_IN_PROGRESS
+from models import ClaimDocument, DerivativeStatus
+from storage import UPLOAD_DIR, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Optional; without it image uploads are kept as originals only
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", min(2, os.cpu_count() or 1)))
+THUMBNAIL_MAX_SIDE = int(os.getenv("THUMBNAIL_MAX_SIDE", 320))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 75))
+WEB_MAX_SIDE = int(os.getenv("WEB_MAX_SIDE", 1600))
+WEB_QUALITY = int(os.getenv("WEB_QUALITY", 82))
+# Refuse decompression bombs; larger images are marked FAILED
+DERIVATIVE_MAX_PIXELS = int(os.getenv("DERIVATIVE_MAX_PIXELS", 100_000_000))
+DERIVATIVE_BACKLOG_ON_STARTUP = os.getenv("DERIVATIVE_BACKLOG_ON_STARTUP", "true").lower() == "true"
+
+IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/pjpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+# Largest first: each variant is downscaled from the previous one
+VARIANTS = (("web", WEB_MAX_SIDE, WEB_QUALITY), ("thumbnail", THUMBNAIL_MAX_SIDE, THUMBNAIL_QUALITY))
+# EXIF orientations that rotate by 90 degrees, swapping width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def wants_derivatives(content_type: Optional[str]) -> bool:
+    return PILLOW_AVAILABLE and (content_type or "").lower() in IMAGE_TYPES
+
+
+def derivative_path(sha256: str, variant: str) -> str:
+    return os.path.join(UPLOAD_DIR, "derived", sha256[:2], sha256[2:4], f"{sha256}-{variant}.jpg")
+
+
+def _flatten(image):
+    """RGB for JPEG, with transparency composited onto white"""
+    from PIL import Image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, "white")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def _save_jpeg(image, path: str, quality: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_derivatives(source_path: str, sha256: str) -> dict:
+    """Runs in a pool process: ClaimDocument field values for the rendered variants"""
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = DERIVATIVE_MAX_PIXELS
+    with Image.open(source_path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        fields = {"image_width": width, "image_height": height}
+
+        paths = {variant: derivative_path(sha256, variant) for variant, _, _ in VARIANTS}
+        if all(os.path.exists(path) for path in paths.values()):
+            # Same bytes rendered before
+            for variant, path in paths.items():
+                with Image.open(path) as existing:
+                    fields[f"{variant}_path"] = path
+                    fields[f"{variant}_width"], fields[f"{variant}_height"] = existing.size
+            return fields
+
+        # Let the JPEG decoder downscale by up to 8x while decoding; no-op for other formats
+        image.draft("RGB", (WEB_MAX_SIDE, WEB_MAX_SIDE))
+        source = _flatten(ImageOps.exif_transpose(image))
+        for variant, max_side, quality in VARIANTS:
+            resized = source.copy()
+            resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)  # never upscales
+            _save_jpeg(resized, paths[variant], quality)
+            fields[f"{variant}_path"] = paths[variant]
+            fields[f"{variant}_width"], fields[f"{variant}_height"] = resized.size
+            source = resized
+    return fields
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_tasks: Set[asyncio.Task] = set()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the API process has a running event loop and thread pools
+        _executor = ProcessPoolExecutor(
+            max_workers=DERIVATIVE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def generate_derivatives(document_id: int, source_path: str, sha256: Optional[str]) -> DerivativeStatus:
+    global _executor
+    DERIVATIVES_IN_PROGRESS.inc()
+    start = time.perf_counter()
+    try:
+        digest = {}
+        if sha256 is None:
+            # Uploaded before digests were recorded; derivatives are named by it, so record it first
+            sha256 = await asyncio.to_thread(file_sha256, source_path)
+            digest = {"sha256": sha256}
+        fields = await asyncio.get_running_loop().run_in_executor(
+            _get_executor(), render_derivatives, source_path, sha256
+        )
+        fields.update(digest, derivatives_status=DerivativeStatus.READY)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next job
+        logger.exception("Derivative worker died on document %s", document_id)
+        _executor = None
+        fields = {"derivatives_status": DerivativeStatus.FAILED}
+    except Exception as exc:
+        # Typically not decodable as an image despite its content type
+        logger.warning("Could not render derivatives for document %s: %r", document_id, exc)
+        fields = {"derivatives_status": DerivativeStatus.FAILED}
+    finally:
+        DERIVATIVES_IN_PROGRESS.dec()
+    status = fields["derivatives_status"]
+    DERIVATIVE_SECONDS.observe(time.perf_counter() - start, status.value)
+    await ClaimDocument.filter(id=document_id).update(**fields)
+    return status
+
+
+def schedule_derivatives(document: ClaimDocument):
+    """Render in the background; the caller does not wait"""
+    task = asyncio.create_task(generate_derivatives(document.id, document.file_path, document.sha256))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def process_backlog(before=None, batch_size: int = None) -> dict:
+    """Render every PENDING document (uploaded before `before`), a batch at a time"""
+    batch_size = batch_size or DERIVATIVE_WORKERS * 4
+    counts = {status.value: 0 for status in (DerivativeStatus.READY, DerivativeStatus.FAILED)}
+    last_id = 0
+    while True:
+        query = ClaimDocument.filter(derivatives_status=DerivativeStatus.PENDING, id__gt=last_id)
+        if before is not None:
+            query = query.filter(uploaded_at__lt=before)
+        batch = await query.order_by("id").limit(batch_size).values("id", "file_path", "sha256")
+        if not batch:
+            return counts
+        statuses = await asyncio.gather(*(generate_derivatives(d["id"], d["file_path"], d["sha256"]) for d in batch))
+        for status in statuses:
+            counts[status.value] += 1
+        last_id = batch[-1]["id"]
+
+
+_backlog_task: Optional[asyncio.Task] = None
+
+
+async def start_derivatives():
+    global _backlog_task
+    if not PILLOW_AVAILABLE or not DERIVATIVE_BACKLOG_ON_STARTUP or _backlog_task is not None:
+        return
+    # Documents uploaded from now on are scheduled by upload_document itself
+    _backlog_task = asyncio.create_task(process_backlog(before=timezone.now()))
+
+
+async def stop_derivatives():
+    global _executor, _backlog_task
+    for task in list(_tasks) + ([_backlog_task] if _backlog_task else []):
+        task.cancel()
+    _backlog_task = None
+    if _executor is not None:
+        # Interrupted documents stay PENDING and are picked up on the next start
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def main():
+    await Tortoise.init(config=tortoise_config())
+    try:
+        # Content types compared as wants_derivatives does for new uploads
+        image_ids = await ClaimDocument.filter(derivatives_status=DerivativeStatus.NONE).annotate(
+            content_type=Lower("file_type")
+        ).filter(content_type__in=sorted(IMAGE_TYPES)).values_list("id", flat=True)
+        for i in range(0, len(image_ids), 1000):
+            await ClaimDocument.filter(id__in=image_ids[i:i + 1000]).update(derivatives_status=DerivativeStatus.PENDING)
+        print(json.dumps(await process_backlog(), indent=2))
+    finally:
+        await stop_derivatives()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python derivatives.py backfill")
+    if not PILLOW_AVAILABLE:
+        sys.exit("Pillow is not installed")
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+"""Document downloads behind GET /documents/{id}, replacing the public /uploads mount.
+
+The endpoint checks claim visibility first, then serves the original upload or
+one of its image derivatives (``?variant=web|thumbnail``). Blobs are
+content-addressed and never rewritten, so responses carry a strong ETag taken
+from the SHA-256 digest and a long-lived ``private, immutable`` Cache-Control;
+If-None-Match / If-Modified-Since revalidations are answered with 304 without
+touching the file. Single byte ranges (``Range: bytes=...``, honouring If-Range)
+get a 206, so video can be seeked and large downloads resumed.
+
+Bytes are sent with the ASGI zero-copy sendfile extension when the server
+offers it, and otherwise read in DOCUMENT_CHUNK_SIZE chunks off the event loop.
+With DOCUMENT_ACCEL_REDIRECT_PREFIX set, the app only authorizes and answers
+with an X-Accel-Redirect to that internal location, and the front proxy (e.g.
+nginx with sendfile) serves the bytes, ranges included.
+"""
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from enum import Enum
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from metrics import DOCUMENT_DOWNLOADS
+from models import ClaimDocument, DerivativeStatus
+from storage import UPLOAD_DIR
+
+DOCUMENT_CACHE_MAX_AGE = int(os.getenv("DOCUMENT_CACHE_MAX_AGE", 365 * 24 * 3600))
+DOCUMENT_CHUNK_SIZE = int(os.getenv("DOCUMENT_CHUNK_SIZE", 256 * 1024))
+# Internal proxy location mapped onto UPLOAD_DIR, e.g. /protected-uploads/; empty = serve from the app
+DOCUMENT_ACCEL_REDIRECT_PREFIX = os.getenv("DOCUMENT_ACCEL_REDIRECT_PREFIX", "")
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+# Shown in the browser; anything else (HTML, SVG, ...) is a download so uploads cannot script the API origin
+INLINE_TYPE_PATTERN = re.compile(r"^(image/(jpeg|jpg|pjpeg|png|gif|webp|bmp|tiff)|video/[\w.+-]+|audio/[\w.+-]+|application/pdf)$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class DocumentVariant(str, Enum):
+    ORIGINAL = "original"
+    WEB = "web"
+    THUMBNAIL = "thumbnail"
+
+
+def document_url(document_id: int, variant: DocumentVariant = DocumentVariant.ORIGINAL) -> str:
+    if variant == DocumentVariant.ORIGINAL:
+        return f"/documents/{document_id}"
+    return f"/documents/{document_id}?variant={variant.value}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == bare for candidate in header.split(","))
+
+
+def _not_modified(request: Request, etag: str, mtime: int) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Takes precedence; If-Modified-Since is then ignored
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _requested_range(request: Request, etag: str, last_modified: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) of a single satisfiable range, None to send everything.
+
+    Raises 416 for a well-formed range that lies past the end of the file.
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_PATTERN.match(request.headers.get("range", "").replace(" ", ""))
+    if match is None or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.groups()
+    if first and last and int(first) > int(last):
+        return None  # invalid, so ignored
+    if_range = request.headers.get("if-range", "").strip()
+    # If-Range needs an exact, strong validator; otherwise the client's partial copy is stale
+    validators = (last_modified,) if etag.startswith("W/") else (etag, last_modified)
+    if if_range and if_range not in validators:
+        return None
+
+    if not first:
+        # Suffix range: the final `last` bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        DOCUMENT_DOWNLOADS.inc("unsatisfiable")
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _content_disposition(filename: str, media_type: str) -> str:
+    kind = "inline" if INLINE_TYPE_PATTERN.match(media_type) else "attachment"
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{kind}; filename*=utf-8''{quoted}"
+    return f'{kind}; filename="{filename}"'
+
+
+def _variant_file(document: ClaimDocument, variant: DocumentVariant) -> Tuple[str, str, str, Optional[str]]:
+    """(path, file name, media type, digest-based ETag or None) for the requested variant"""
+    if variant == DocumentVariant.ORIGINAL:
+        etag = f'"{document.sha256}"' if document.sha256 else None
+        return document.file_path, document.file_name, document.file_type or "application/octet-stream", etag
+    path = getattr(document, f"{variant.value}_path")
+    if document.derivatives_status != DerivativeStatus.READY or not path:
+        raise HTTPException(status_code=404, detail=f"No {variant.value} copy of this document")
+    stem = os.path.splitext(document.file_name)[0]
+    # Derivatives are written once per digest and reused, so the digest still identifies the bytes
+    return path, f"{stem}-{variant.value}.jpg", "image/jpeg", f'"{document.sha256}-{variant.value}"'
+
+
+class DocumentFileResponse(FileResponse):
+    """FileResponse for a byte range, sent with zero-copy sendfile when the server offers it"""
+
+    chunk_size = DOCUMENT_CHUNK_SIZE
+
+    def __init__(self, path: str, offset: int, length: int, **kwargs):
+        self.offset = offset
+        self.length = length
+        super().__init__(path, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            file = await run_in_threadpool(open, self.path, "rb")
+            try:
+                await send({"type": ZERO_COPY_EXTENSION, "file": file, "offset": self.offset, "count": self.length})
+            finally:
+                file.close()
+            return
+
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                # A file truncated underneath us ends the body early rather than looping
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+
+async def document_response(request: Request, document: ClaimDocument, variant: DocumentVariant) -> Response:
+    """Response for an already authorized document download"""
+    path, filename, media_type, etag = _variant_file(document, variant)
+    try:
+        stat = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document file is missing")
+
+    mtime = int(stat.st_mtime)
+    last_modified = formatdate(mtime, usegmt=True)
+    if etag is None:
+        # Uploads stored before content addressing have no digest; fall back to a weak validator
+        etag = f'W/"{mtime:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": f"private, max-age={DOCUMENT_CACHE_MAX_AGE}, immutable",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if _not_modified(request, etag, mtime):
+        DOCUMENT_DOWNLOADS.inc("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = _content_disposition(filename, media_type)
+    if DOCUMENT_ACCEL_REDIRECT_PREFIX:
+        # The proxy answers Range and conditional requests against the file itself
+        relative = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = DOCUMENT_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative)
+        DOCUMENT_DOWNLOADS.inc("redirected")
+        return Response(media_type=media_type, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = _requested_range(request, etag, last_modified, stat.st_size)
+    if byte_range is None:
+        start, length, status_code = 0, stat.st_size, 200
+    else:
+        start, end = byte_range
+        length, status_code = end - start + 1, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(length)
+    DOCUMENT_DOWNLOADS.inc("partial" if status_code == 206 else "full")
+    return DocumentFileResponse(
+        path, start, length, status_code=status_code, headers=headers, media_type=media_type,
+        stat_result=stat, method=request.method,
+    )
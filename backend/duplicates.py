@@ -0,0 +1,223 @@
+"""Likely-duplicate claims, flagged when a claim is created.
+
+    python duplicates.py backfill [--batch-size 500] [--all]
+
+The same accident often comes in twice, from the customer and from an agent, with
+different wording. Each claim stores two precomputed fingerprints, so finding
+its duplicates needs only indexed lookups, however many claims the policy has:
+
+- incident_fingerprint: a hash of the policy, the incident day (UTC) and the
+  normalized location tokens. Claims with equal values describe the same place
+  on the same day.
+- description_minhash: a MinHash signature of the description's word shingles.
+  It is split into LSH bands, and each band hash is stored together with the
+  policy in claimfingerprintband. Descriptions whose similarity is above about
+  (1/LSH_BANDS) ** (1/rows per band), roughly 0.5, share a band with high
+  probability.
+
+find_duplicates reads the band table, then loads the candidates by id or
+fingerprint, scores them from their stored signatures and keeps those over the
+thresholds. That is two queries, and no text comparison against other claims.
+
+Claims created before this module existed have none until the backfill
+fingerprints them; until then they are not matched. Archived claims are not
+candidates (archiving drops their bands); archive.restore_claim fingerprints a
+claim again when it brings it back.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Sequence
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from db import tortoise_config
+from models import Claim, ClaimFingerprintBand
+
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", 0.5))
+DUPLICATE_DATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_DATE_WINDOW_DAYS", 3))
+DUPLICATE_MAX_WARNINGS = int(os.getenv("DUPLICATE_MAX_WARNINGS", 5))
+FINGERPRINT_BACKFILL_BATCH_SIZE = int(os.getenv("FINGERPRINT_BACKFILL_BATCH_SIZE", 500))
+
+# Changing any of these invalidates stored signatures: rerun the backfill with --all
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 1
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(0x44555053)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(MINHASH_PERMUTATIONS)
+]
+
+STOPWORDS = frozenset(
+    "a an and at by for from i in into is it my of on or our the then to was were with while".split()
+)
+# Spelled-out forms so "Main St" and "main street" fingerprint alike
+LOCATION_ABBREVIATIONS = {
+    "st": "street", "ave": "avenue", "av": "avenue", "rd": "road", "blvd": "boulevard", "dr": "drive",
+    "ln": "lane", "hwy": "highway", "pkwy": "parkway", "ct": "court", "pl": "place", "sq": "square",
+    "n": "north", "s": "south", "e": "east", "w": "west", "intl": "international",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def location_tokens(location: str) -> List[str]:
+    return sorted({LOCATION_ABBREVIATIONS.get(token, token) for token in _tokens(location)})
+
+
+def _utc(value: datetime) -> datetime:
+    # Naive datetimes are stored as UTC
+    return value.astimezone(dt_timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def _incident_day(incident_date: datetime) -> str:
+    return _utc(incident_date).date().isoformat()
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def incident_fingerprint(policy_id: int, incident_date: datetime, location: str) -> str:
+    key = f"{policy_id}|{_incident_day(incident_date)}|{' '.join(location_tokens(location))}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def description_minhash(description: str) -> Optional[List[int]]:
+    """MinHash signature of the description's word shingles; None if it has no words"""
+    tokens = _tokens(description)
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = set(tokens)
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    if not shingles:
+        return None
+    hashes = [_hash64(shingle) for shingle in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def fingerprint_fields(policy_id: int, incident_date: datetime, description: str, location: str) -> dict:
+    """Claim field values for a new claim; pass to Claim.create or Claim(...)"""
+    return {
+        "incident_fingerprint": incident_fingerprint(policy_id, incident_date, location),
+        "description_minhash": description_minhash(description),
+    }
+
+
+def lsh_bands(policy_id: int, minhash: Optional[List[int]]) -> List[int]:
+    """Signed 64-bit band keys; two claims on a policy are candidates if any key is equal"""
+    if not minhash:
+        return []
+    bands = []
+    for band in range(LSH_BANDS):
+        rows = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(f"{policy_id}:{band}:{rows}".encode(), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, "big", signed=True))
+    return bands
+
+
+def similarity(a: Optional[List[int]], b: Optional[List[int]]) -> float:
+    """Estimated Jaccard similarity of two descriptions' shingle sets"""
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_PERMUTATIONS
+
+
+async def index_fingerprints(claims: Sequence[Claim], using_db: BaseDBAsyncClient):
+    """Store the LSH bands of saved claims; call in the transaction that wrote their fingerprints"""
+    await ClaimFingerprintBand.bulk_create(
+        [
+            ClaimFingerprintBand(claim_id=claim.id, band=band)
+            for claim in claims
+            for band in lsh_bands(claim.policy_id, claim.description_minhash)
+        ],
+        batch_size=1000,
+        using_db=using_db,
+    )
+
+
+async def find_duplicates(claim: Claim, using_db: Optional[BaseDBAsyncClient] = None) -> List[dict]:
+    """Other claims likely to report the same incident, best match first"""
+    bands = lsh_bands(claim.policy_id, claim.description_minhash)
+    candidate_ids = set(
+        await ClaimFingerprintBand.filter(band__in=bands).using_db(using_db).values_list("claim_id", flat=True)
+    ) if bands else set()
+    candidate_ids.discard(claim.id)
+    match = Q(incident_fingerprint=claim.incident_fingerprint)
+    if candidate_ids:
+        match |= Q(id__in=list(candidate_ids))
+    candidates = await Claim.filter(match).exclude(id=claim.id).using_db(using_db).values(
+        "id", "claim_number", "status", "incident_date", "incident_fingerprint", "description_minhash",
+    )
+
+    duplicates = []
+    for candidate in candidates:
+        same_incident = candidate["incident_fingerprint"] == claim.incident_fingerprint
+        score = similarity(claim.description_minhash, candidate["description_minhash"])
+        days_apart = abs(_utc(candidate["incident_date"]) - _utc(claim.incident_date)).days
+        if same_incident or (score >= DUPLICATE_SIMILARITY_THRESHOLD and days_apart <= DUPLICATE_DATE_WINDOW_DAYS):
+            duplicates.append({
+                "claim_id": candidate["id"],
+                "claim_number": candidate["claim_number"],
+                "status": candidate["status"],
+                "incident_date": candidate["incident_date"],
+                "same_incident": same_incident,
+                "description_similarity": score,
+            })
+    duplicates.sort(key=lambda d: (d["same_incident"], d["description_similarity"]), reverse=True)
+    return duplicates[:DUPLICATE_MAX_WARNINGS]
+
+
+async def backfill_fingerprints(batch_size: int = FINGERPRINT_BACKFILL_BATCH_SIZE, everything: bool = False) -> dict:
+    """Fingerprint claims that have none (or all claims), one committed batch at a time"""
+    fingerprinted = batches = 0
+    last_id = 0
+    while True:
+        query = Claim.filter(id__gt=last_id)
+        if not everything:
+            query = query.filter(incident_fingerprint__isnull=True)
+        claims = await query.order_by("id").limit(batch_size)
+        if not claims:
+            return {"fingerprinted": fingerprinted, "batches": batches}
+        for claim in claims:
+            for name, value in fingerprint_fields(
+                claim.policy_id, claim.incident_date, claim.incident_description, claim.incident_location
+            ).items():
+                setattr(claim, name, value)
+        async with in_transaction() as conn:
+            await Claim.bulk_update(claims, ["incident_fingerprint", "description_minhash"], using_db=conn)
+            await ClaimFingerprintBand.filter(claim_id__in=[claim.id for claim in claims]).using_db(conn).delete()
+            await index_fingerprints(claims, conn)
+        fingerprinted += len(claims)
+        batches += 1
+        last_id = claims[-1].id
+
+
+async def main(args):
+    await Tortoise.init(config=tortoise_config())
+    try:
+        print(json.dumps(await backfill_fingerprints(args.batch_size, args.all), indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint claims for duplicate detection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="fingerprint claims that have no fingerprint yet")
+    backfill.add_argument("--batch-size", type=int, default=FINGERPRINT_BACKFILL_BATCH_SIZE)
+    backfill.add_argument("--all", action="store_true", help="recompute every claim's fingerprint")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,230 @@
+"""Synthetic data generator for production-scale local testing.
+
+    python generate_data.py --users-per-role 20 --customers 5000 --policies 10000 \
+        --claims 1000000 --notes-per-claim 2 --documents-per-claim 1
+
+Every generated user has the password "password". Rows are inserted with
+bulk_create in batches, so memory stays flat regardless of the row counts.
+Works against SQLite or Postgres via DATABASE_URL.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List
+
+from tortoise import Tortoise, timezone
+
+from db import tortoise_config
+from models import User, Policy, Claim, ClaimDocument, ClaimNote, UserRole, ClaimStatus
+from auth import get_password_hash
+from claim_summary import rebuild_counters
+from duplicates import backfill_fingerprints
+
+DEFAULT_STATUS_WEIGHTS = {
+    ClaimStatus.SUBMITTED: 8,
+    ClaimStatus.UNDER_REVIEW: 5,
+    ClaimStatus.ASSIGNED: 5,
+    ClaimStatus.INVESTIGATING: 7,
+    ClaimStatus.APPROVED: 5,
+    ClaimStatus.REJECTED: 15,
+    ClaimStatus.SETTLED: 55,
+}
+# Statuses before assignment never carry an adjuster
+UNASSIGNED_STATUSES = {ClaimStatus.SUBMITTED, ClaimStatus.UNDER_REVIEW}
+VEHICLES = [("Toyota", "Camry"), ("Honda", "Civic"), ("Ford", "F-150"), ("Tesla", "Model 3"), ("Chevrolet", "Malibu")]
+INCIDENTS = [
+    "Rear-ended at traffic light", "Side collision in parking lot", "Hit by falling tree branch",
+    "Vandalism - keyed car", "Hail damage to roof and hood", "Fender bender in drive-thru",
+    "Hit and run in mall parking", "Collision with deer", "Flood damage from storm", "Theft of vehicle parts",
+]
+LOCATIONS = ["Main St & 5th Ave", "Highway 101", "Oak Street", "Downtown area", "Rural Route 45", "Shopping Mall Lot B"]
+
+
+@dataclass
+class GeneratorConfig:
+    users_per_role: int = 5
+    customers: int = 100
+    policies: int = 200
+    claims: int = 1000
+    notes_per_claim: int = 1
+    documents_per_claim: int = 1
+    status_weights: Dict[ClaimStatus, float] = field(default_factory=lambda: dict(DEFAULT_STATUS_WEIGHTS))
+    # Share of post-review claims left without an adjuster
+    unassigned_ratio: float = 0.05
+    days: int = 365
+    batch_size: int = 5000
+    seed: int = 42
+    prefix: str = field(default_factory=lambda: uuid.uuid4().hex[:6].upper())
+
+
+def parse_status_weights(spec: str) -> Dict[ClaimStatus, float]:
+    """Parse "submitted=10,settled=60" into weights; unlisted statuses get zero"""
+    weights = {status: 0.0 for status in ClaimStatus}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        weights[ClaimStatus(name.strip())] = float(weight)
+    return weights
+
+
+async def _bulk(model, rows: List, batch_size: int):
+    if rows:
+        await model.bulk_create(rows, batch_size=batch_size)
+
+
+async def generate(config: GeneratorConfig, password_hash: str = None) -> dict:
+    rng = random.Random(config.seed)
+    password_hash = password_hash or get_password_hash("password")
+    now = timezone.now()
+    started = time.perf_counter()
+    tag = config.prefix.lower()
+
+    # Users: staff roles get users_per_role each, customers get their own count
+    counts = {role: config.users_per_role for role in UserRole}
+    counts[UserRole.CUSTOMER] = config.customers
+    for role, count in counts.items():
+        await _bulk(User, [
+            User(
+                email=f"{role.value}{i}.{tag}@gen.test",
+                password_hash=password_hash,
+                first_name=role.value.title(),
+                last_name=f"{config.prefix}{i}",
+                role=role,
+            )
+            for i in range(count)
+        ], config.batch_size)
+    customer_ids = await User.filter(role=UserRole.CUSTOMER, email__endswith=f".{tag}@gen.test").values_list("id", flat=True)
+    adjuster_ids = await User.filter(role=UserRole.ADJUSTER, email__endswith=f".{tag}@gen.test").values_list("id", flat=True)
+    author_ids = await User.filter(email__endswith=f".{tag}@gen.test").exclude(role=UserRole.CUSTOMER).values_list("id", flat=True)
+
+    policy_rows = []
+    for i in range(config.policies):
+        make, model = rng.choice(VEHICLES)
+        policy_rows.append(Policy(
+            policy_number=f"POL-{config.prefix}{i:08d}",
+            customer_id=rng.choice(customer_ids),
+            vehicle_make=make,
+            vehicle_model=model,
+            vehicle_year=rng.randint(2005, 2025),
+            license_plate=f"{config.prefix[:3]}{rng.randint(0, 9999):04d}",
+            coverage_amount=rng.choice([25000, 50000, 75000, 100000]),
+        ))
+        if len(policy_rows) >= config.batch_size:
+            await _bulk(Policy, policy_rows, config.batch_size)
+            policy_rows = []
+    await _bulk(Policy, policy_rows, config.batch_size)
+    policies = await Policy.filter(policy_number__startswith=f"POL-{config.prefix}").values_list("id", "customer_id")
+
+    statuses = list(config.status_weights)
+    weights = [config.status_weights[s] for s in statuses]
+    created = {"claims": 0, "notes": 0, "documents": 0}
+
+    for offset in range(0, config.claims, config.batch_size):
+        claim_rows = []
+        for i in range(offset, min(offset + config.batch_size, config.claims)):
+            policy_id, customer_id = rng.choice(policies)
+            status = rng.choices(statuses, weights)[0]
+            created_at = now - timedelta(seconds=rng.uniform(0, config.days * 86400))
+            adjuster_id = None
+            if status not in UNASSIGNED_STATUSES and adjuster_ids and rng.random() >= config.unassigned_ratio:
+                adjuster_id = rng.choice(adjuster_ids)
+            estimated = None
+            if status in (ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED, ClaimStatus.SETTLED):
+                estimated = round(rng.uniform(500, 20000), 2)
+            approved = None
+            if status in (ClaimStatus.APPROVED, ClaimStatus.SETTLED):
+                approved = round(estimated * rng.uniform(0.6, 1.0), 2)
+            claim_rows.append(Claim(
+                claim_number=f"CLM-{config.prefix}{i:09d}",
+                policy_id=policy_id,
+                customer_id=customer_id,
+                assigned_adjuster_id=adjuster_id,
+                status=status,
+                incident_date=created_at - timedelta(days=rng.randint(0, 14)),
+                incident_description=rng.choice(INCIDENTS),
+                incident_location=rng.choice(LOCATIONS),
+                estimated_damage=estimated,
+                approved_amount=approved,
+                created_at=created_at,
+            ))
+        await _bulk(Claim, claim_rows, config.batch_size)
+        created["claims"] += len(claim_rows)
+
+        if not (config.notes_per_claim or config.documents_per_claim):
+            continue
+        numbers = [c.claim_number for c in claim_rows]
+        claim_ids = await Claim.filter(claim_number__in=numbers).values_list("id", "customer_id")
+        notes, documents = [], []
+        for claim_id, customer_id in claim_ids:
+            for n in range(config.notes_per_claim):
+                notes.append(ClaimNote(
+                    claim_id=claim_id,
+                    author_id=rng.choice(author_ids),
+                    content=f"Follow-up {n + 1}: {rng.choice(INCIDENTS).lower()}",
+                ))
+            for d in range(config.documents_per_claim):
+                digest = uuid.uuid4().hex + uuid.uuid4().hex
+                documents.append(ClaimDocument(
+                    claim_id=claim_id,
+                    file_name=f"photo_{d + 1}.jpg",
+                    file_path=f"uploads/{digest[:2]}/{digest[2:4]}/{digest}",
+                    file_type="image/jpeg",
+                    sha256=digest,
+                    file_size=rng.randint(200_000, 5_000_000),
+                    uploaded_by_id=customer_id,
+                ))
+        await _bulk(ClaimNote, notes, config.batch_size)
+        await _bulk(ClaimDocument, documents, config.batch_size)
+        created["notes"] += len(notes)
+        created["documents"] += len(documents)
+
+    # Claims were bulk-inserted around the counter bookkeeping; reconcile once at the end
+    await rebuild_counters()
+    await backfill_fingerprints()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "prefix": config.prefix,
+        "users": sum(counts.values()),
+        "policies": len(policies),
+        **created,
+        "elapsed_seconds": elapsed,
+        "claims_per_second": created["claims"] / elapsed if elapsed else 0.0,
+    }
+
+
+async def main(config: GeneratorConfig):
+    await Tortoise.init(config=tortoise_config())
+    await Tortoise.generate_schemas(safe=True)
+    try:
+        summary = await generate(config)
+    finally:
+        await Tortoise.close_connections()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    defaults = GeneratorConfig()
+    parser = argparse.ArgumentParser(description="Generate synthetic users, policies, claims, notes and documents")
+    parser.add_argument("--users-per-role", type=int, default=defaults.users_per_role, help="agents, adjusters, managers and admins each")
+    parser.add_argument("--customers", type=int, default=defaults.customers)
+    parser.add_argument("--policies", type=int, default=defaults.policies)
+    parser.add_argument("--claims", type=int, default=defaults.claims)
+    parser.add_argument("--notes-per-claim", type=int, default=defaults.notes_per_claim)
+    parser.add_argument("--documents-per-claim", type=int, default=defaults.documents_per_claim)
+    parser.add_argument("--status-weights", type=parse_status_weights, help="e.g. submitted=10,assigned=5,settled=60")
+    parser.add_argument("--unassigned-ratio", type=float, default=defaults.unassigned_ratio)
+    parser.add_argument("--days", type=int, default=defaults.days, help="spread created_at over this many days")
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--prefix", help="tag for generated numbers and emails (default: random)")
+    args = parser.parse_args()
+
+    config = GeneratorConfig(**{
+        k: v for k, v in vars(args).items() if v is not None
+    })
+    asyncio.run(main(config))
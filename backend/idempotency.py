@@ -0,0 +1,414 @@
+"""Idempotency-Key support for the write endpoints mobile clients retry.
+
+A POST to one of IDEMPOTENT_ROUTES carrying ``Idempotency-Key: <key>`` runs once
+per (user, key). The first request claims the key and its response is stored for
+IDEMPOTENCY_TTL seconds; retries get that response back with
+``Idempotent-Replayed: true`` instead of creating another claim, file or note.
+A retry arriving while the first request is still running waits for it (up to
+IDEMPOTENCY_WAIT_TIMEOUT, then 409). Reusing a key for a different request is
+answered with 422. Server errors and transient refusals (401, 409, 429) are not
+stored, so the client can retry them with the same key.
+
+The request fingerprint covers the method, path, query and body. The body is
+read once before the endpoint runs: spooled (to disk past BODY_SPOOL_SIZE) and
+hashed as it arrives, then replayed to the endpoint. Spooling, hashing and
+replay reads run in the threadpool, as upload storage does. A multipart body is
+hashed with its boundary masked out, since a retry of the same upload gets a
+fresh one; nothing is parsed twice.
+
+Two stores: "memory" (per worker process; fine for a single worker) and
+"database" (the idempotencykey table, shared by every worker).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import timedelta
+from tempfile import SpooledTemporaryFile
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+
+from auth import token_user_id
+from cache import TTLCache
+from metrics import IDEMPOTENT_REQUESTS
+from models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")  # or database
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+# How long an unfinished first request holds its key before a retry may take over
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))  # memory store only
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", 1024 * 1024))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", 600))
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+BODY_SPOOL_SIZE = 1024 * 1024
+# Body bytes gathered per trip to the threadpool, and read back per replayed message
+BODY_CHUNK_SIZE = 256 * 1024
+MULTIPART_BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"^/claims/?$")),
+    ("POST", re.compile(r"^/claims/[^/]+/documents/?$")),
+    ("POST", re.compile(r"^/claims/[^/]+/notes/?$")),
+]
+# Outcomes worth retrying with the same key rather than replaying
+UNSTORED_STATUSES = {401, 409, 429}
+# Per-request or per-connection headers that must not be replayed
+UNSTORED_HEADERS = {b"date", b"server", b"set-cookie"}
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: Optional[int] = None  # None while the first request is still running
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    body: bytes = b""
+
+    @property
+    def completed(self) -> bool:
+        return self.status_code is not None
+
+
+class MemoryIdempotencyStore:
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_ENTRIES, ttl: float = IDEMPOTENCY_TTL):
+        self._responses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._running: Dict[Tuple[int, str], Tuple[str, asyncio.Event]] = {}
+
+    async def acquire(self, user_id: int, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """None if the caller now owns the key, otherwise what is stored under it"""
+        scope = (user_id, key)
+        running = self._running.get(scope)
+        if running is not None:
+            return StoredResponse(fingerprint=running[0])
+        stored = self._responses.get(scope)
+        if stored is not None:
+            return stored
+        self._running[scope] = (fingerprint, asyncio.Event())
+        return None
+
+    async def wait(self, user_id: int, key: str, timeout: float):
+        running = self._running.get((user_id, key))
+        if running is not None:
+            try:
+                await asyncio.wait_for(running[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def complete(self, user_id: int, key: str, response: StoredResponse):
+        self._responses.set((user_id, key), response)
+        self._finish(user_id, key)
+
+    async def release(self, user_id: int, key: str):
+        self._finish(user_id, key)
+
+    def _finish(self, user_id: int, key: str):
+        running = self._running.pop((user_id, key), None)
+        if running is not None:
+            running[1].set()
+
+    async def purge_expired(self) -> int:
+        return self._responses.purge_expired()
+
+
+class DatabaseIdempotencyStore:
+    async def acquire(self, user_id: int, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """None if the caller now owns the key, otherwise what is stored under it"""
+        while True:
+            now = timezone.now()
+            try:
+                await IdempotencyKey.create(
+                    user_id=user_id, key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                )
+                return None
+            except IntegrityError:
+                pass
+            record = await IdempotencyKey.get_or_none(user_id=user_id, key=key)
+            if record is None:
+                continue  # released or purged in between
+            if record.expires_at > now:
+                return StoredResponse(
+                    fingerprint=record.fingerprint,
+                    status_code=record.status_code,
+                    headers=[tuple(h) for h in record.headers or []],
+                    body=record.body or b"",
+                )
+            # An expired response or an abandoned first request: take the key over,
+            # unless another retry got there first
+            taken = await IdempotencyKey.filter(id=record.id, expires_at=record.expires_at).update(
+                fingerprint=fingerprint, status_code=None, headers=None, body=None,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+            )
+            if taken:
+                return None
+
+    async def wait(self, user_id: int, key: str, timeout: float):
+        # Other workers' progress is only visible in the table
+        await asyncio.sleep(min(timeout, POLL_INTERVAL))
+
+    async def complete(self, user_id: int, key: str, response: StoredResponse):
+        await IdempotencyKey.filter(user_id=user_id, key=key).update(
+            status_code=response.status_code,
+            headers=[list(h) for h in response.headers],
+            body=response.body,
+            expires_at=timezone.now() + timedelta(seconds=IDEMPOTENCY_TTL),
+        )
+
+    async def release(self, user_id: int, key: str):
+        await IdempotencyKey.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+
+    async def purge_expired(self) -> int:
+        return await IdempotencyKey.filter(expires_at__lte=timezone.now()).delete()
+
+
+def create_store():
+    if IDEMPOTENCY_STORE == "database":
+        return DatabaseIdempotencyStore()
+    return MemoryIdempotencyStore()
+
+
+store = create_store()
+
+
+def _error(status_code: int, detail: str, headers: dict = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail}, headers=headers)
+
+
+class BufferedBody:
+    """A request body spooled to memory or disk and hashed as it is written.
+
+    write, rewind, read and close do file I/O; call them via run_in_threadpool.
+    """
+
+    def __init__(self, boundary: Optional[bytes] = None):
+        self.file = SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._boundary = boundary
+        # Bytes held back from the digest in case a boundary straddles two writes
+        self._pending = b""
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.size += len(data)
+        if self._boundary:
+            data = (self._pending + data).replace(self._boundary, b"\0")
+            keep = min(len(data), len(self._boundary) - 1)
+            self._pending = data[len(data) - keep:]
+            data = data[:len(data) - keep]
+        self._digest.update(data)
+
+    def rewind(self) -> str:
+        """Hex digest of everything written; reads then start from the beginning"""
+        self._digest.update(self._pending)
+        self._pending = b""
+        self.file.seek(0)
+        return self._digest.hexdigest()
+
+    def read(self, size: int) -> bytes:
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+
+def _multipart_boundary(headers: dict) -> Optional[bytes]:
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    if not content_type.lower().startswith("multipart/"):
+        return None
+    match = MULTIPART_BOUNDARY.search(content_type)
+    return match.group(1).encode("latin-1") if match else None
+
+
+async def _read_body(receive, body: BufferedBody) -> str:
+    """Spool and hash the whole request body; returns the body's digest"""
+    chunks: List[bytes] = []
+    buffered = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        chunks.append(chunk)
+        buffered += len(chunk)
+        if buffered >= BODY_CHUNK_SIZE or not more_body:
+            await run_in_threadpool(body.write, b"".join(chunks))
+            chunks, buffered = [], 0
+    if chunks:
+        await run_in_threadpool(body.write, b"".join(chunks))
+    return await run_in_threadpool(body.rewind)
+
+
+def _replaying(body: BufferedBody, receive):
+    """A receive that yields the buffered body from its start, then defers to the client's"""
+    remaining = body.size
+    done = False
+
+    async def replay():
+        nonlocal remaining, done
+        if done:
+            return await receive()
+        chunk = await run_in_threadpool(body.read, BODY_CHUNK_SIZE) if remaining else b""
+        remaining -= len(chunk)
+        done = remaining <= 0
+        return {"type": "http.request", "body": chunk, "more_body": not done}
+
+    return replay
+
+
+def request_fingerprint(scope, body_digest: str) -> str:
+    """Fingerprint of a request: method, path, query and body"""
+    query = scope.get("query_string", b"").decode("latin-1")
+    return hashlib.sha256(f"{scope['method']} {scope['path']}?{query} {body_digest}".encode()).hexdigest()
+
+
+class IdempotencyMiddleware:
+    """Runs a keyed write once per user and key, replaying its response to retries"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            scope["method"] == method and pattern.match(scope["path"]) for method, pattern in IDEMPOTENT_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        raw_key = headers.get(IDEMPOTENCY_HEADER)
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        user_id = token_user_id(token) if scheme.lower() == "bearer" else None
+        if raw_key is None or user_id is None:
+            # Unauthenticated requests are left to the endpoint to reject
+            await self.app(scope, receive, send)
+            return
+
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _error(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")(scope, receive, send)
+            return
+        body = BufferedBody(_multipart_boundary(headers))
+        try:
+            try:
+                body_digest = await _read_body(receive, body)
+            except HTTPException as exc:
+                # e.g. the upload size limit, raised from its receive
+                await _error(exc.status_code, exc.detail)(scope, receive, send)
+                return
+            fingerprint = request_fingerprint(scope, body_digest)
+            await self._handle(scope, _replaying(body, receive), send, user_id, key, fingerprint)
+        finally:
+            await run_in_threadpool(body.close)
+
+    async def _handle(self, scope, receive, send, user_id: int, key: str, fingerprint: str):
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_TIMEOUT
+        waited = False
+        while True:
+            stored = await store.acquire(user_id, key, fingerprint)
+            if stored is None:
+                break
+            if stored.fingerprint != fingerprint:
+                IDEMPOTENT_REQUESTS.inc("mismatch")
+                await _error(422, "Idempotency-Key was already used for a different request")(scope, receive, send)
+                return
+            if stored.completed:
+                IDEMPOTENT_REQUESTS.inc("replayed_after_wait" if waited else "replayed")
+                await self._replay(stored, send)
+                return
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                IDEMPOTENT_REQUESTS.inc("in_progress")
+                await _error(
+                    409, "A request with this Idempotency-Key is still being processed", {"Retry-After": "1"}
+                )(scope, receive, send)
+                return
+            waited = True
+            await store.wait(user_id, key, remaining)
+
+        IDEMPOTENT_REQUESTS.inc("executed")
+        await self._run_and_store(scope, receive, send, user_id, key, fingerprint)
+
+    async def _replay(self, stored: StoredResponse, send):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+        headers.append((REPLAYED_HEADER, b"true"))
+        await send({"type": "http.response.start", "status": stored.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def _run_and_store(self, scope, receive, send, user_id: int, key: str, fingerprint: str):
+        response = StoredResponse(fingerprint=fingerprint)
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_and_capture(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                response.status_code = message["status"]
+                response.headers = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in UNSTORED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= IDEMPOTENCY_MAX_BODY:
+                    chunks.append(body)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_capture)
+        except BaseException:
+            await store.release(user_id, key)
+            raise
+
+        status_code = response.status_code
+        if status_code is None or status_code >= 500 or status_code in UNSTORED_STATUSES or size > IDEMPOTENCY_MAX_BODY:
+            await store.release(user_id, key)
+            return
+        response.body = b"".join(chunks)
+        await store.complete(user_id, key, response)
+
+
+async def _sweep():
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_SWEEP_INTERVAL)
+        try:
+            purged = await store.purge_expired()
+            if purged:
+                logger.info("Purged %d expired idempotency keys", purged)
+        except Exception:
+            logger.exception("Idempotency key sweep failed")
+
+
+_sweep_task: Optional[asyncio.Task] = None
+
+
+async def start_idempotency_sweeper():
+    global _sweep_task
+    if _sweep_task is None:
+        _sweep_task = asyncio.create_task(_sweep())
+
+
+async def stop_idempotency_sweeper():
+    global _sweep_task
+    if _sweep_task is not None:
+        _sweep_task.cancel()
+        _sweep_task = None
@@ -0,0 +1,206 @@
+"""Push-based claim updates for GET /claims/stream.
+
+Handlers publish a ClaimUpdate after their transaction commits. The hub hands it
+to a broker, which fans it out to every worker (in-process for the memory
+broker, Postgres LISTEN/NOTIFY across workers), and each worker offers it to its
+local subscribers whose role can see the claim. Subscriber queues are bounded:
+a client that falls behind gets a resync event and is disconnected rather than
+buffering without limit.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Optional, Set
+
+from fastapi import HTTPException
+
+from db import DATABASE_URL
+from models import User, ClaimStatus
+from visibility import claim_visible_to
+
+logger = logging.getLogger(__name__)
+
+CLAIM_UPDATES_BROKER = os.getenv("CLAIM_UPDATES_BROKER", "memory")
+CLAIM_UPDATES_CHANNEL = "claim_updates"
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", 100))
+MAX_SUBSCRIBERS = int(os.getenv("MAX_SUBSCRIBERS", 1000))
+KEEPALIVE_SECONDS = 15
+
+
+@dataclass
+class ClaimUpdate:
+    type: str  # claim_created | status_changed | note_added | document_uploaded | claim_archived | claim_restored
+    claim_id: int
+    status: ClaimStatus
+    customer_id: int
+    assigned_adjuster_id: Optional[int] = None
+    previous_status: Optional[ClaimStatus] = None
+    data: dict = field(default_factory=dict)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def from_json(cls, payload: str) -> "ClaimUpdate":
+        raw = json.loads(payload)
+        raw["status"] = ClaimStatus(raw["status"])
+        if raw.get("previous_status"):
+            raw["previous_status"] = ClaimStatus(raw["previous_status"])
+        return cls(**raw)
+
+
+RESYNC = object()
+
+
+class Subscriber:
+    def __init__(self, user: User, claim_id: Optional[int] = None):
+        self.user = user
+        self.claim_id = claim_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, update: ClaimUpdate) -> bool:
+        if self.claim_id is not None:
+            # Single-claim streams were authorised against the claim when opened
+            return update.claim_id == self.claim_id
+        # A status change is relevant if the claim was in the subscriber's list before or after it
+        return claim_visible_to(
+            self.user, update.status, update.customer_id, update.assigned_adjuster_id
+        ) or (
+            update.previous_status is not None
+            and claim_visible_to(self.user, update.previous_status, update.customer_id, update.assigned_adjuster_id)
+        )
+
+    def offer(self, update: ClaimUpdate):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Too slow to keep up; drop what is buffered and tell the client to refetch
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    """Carries updates between workers; deliver() is called once per update per worker"""
+
+    def __init__(self):
+        # Until start() connects the hub, published updates have nobody to go to
+        self.deliver: Callable[[ClaimUpdate], None] = lambda update: None
+
+    async def start(self, deliver: Callable[[ClaimUpdate], None]):
+        self.deliver = deliver
+
+    async def publish(self, update: ClaimUpdate):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBroker(Broker):
+    async def publish(self, update: ClaimUpdate):
+        self.deliver(update)
+
+
+class PostgresBroker(Broker):
+    """LISTEN/NOTIFY fan-out so every uvicorn worker sees every update"""
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self.connection = None
+        # asyncpg runs one operation at a time per connection; NOTIFYs queue here instead of failing
+        self.publish_lock = asyncio.Lock()
+
+    async def start(self, deliver: Callable[[ClaimUpdate], None]):
+        import asyncpg
+
+        await super().start(deliver)
+        self.connection = await asyncpg.connect(self.dsn)
+        await self.connection.add_listener(CLAIM_UPDATES_CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self.deliver(ClaimUpdate.from_json(payload))
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Ignoring malformed claim update: %r", payload)
+
+    async def publish(self, update: ClaimUpdate):
+        async with self.publish_lock:
+            await self.connection.execute("SELECT pg_notify($1, $2)", CLAIM_UPDATES_CHANNEL, update.to_json())
+
+    async def stop(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+
+class ClaimUpdateHub:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.subscribers: Set[Subscriber] = set()
+
+    async def start(self):
+        await self.broker.start(self.dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    def dispatch(self, update: ClaimUpdate):
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(update):
+                subscriber.offer(update)
+
+    async def publish(self, update: ClaimUpdate):
+        try:
+            await self.broker.publish(update)
+        except Exception:
+            # Live updates are best-effort; the write itself already committed
+            logger.exception("Failed to publish claim update for claim %s", update.claim_id)
+
+    def check_capacity(self):
+        """Refuse a new stream up front; once the response has started it can no longer get a 503"""
+        if len(self.subscribers) >= MAX_SUBSCRIBERS:
+            raise HTTPException(status_code=503, detail="Too many live update subscribers", headers={"Retry-After": "5"})
+
+    def subscribe(self, user: User, claim_id: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(user, claim_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def stream(self, user: User, claim_id: Optional[int] = None):
+        """Server-Sent Events body for one subscriber"""
+        # Subscribed on first iteration, so a client gone before the body starts leaves nothing behind
+        subscriber = self.subscribe(user, claim_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    update = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if update is RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                yield f"event: {update.type}\ndata: {update.to_json()}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def create_broker() -> Broker:
+    if CLAIM_UPDATES_BROKER == "postgres":
+        return PostgresBroker(DATABASE_URL)
+    return InMemoryBroker()
+
+
+hub = ClaimUpdateHub(create_broker())
@@ -1,28 +1,127 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from tortoise.contrib.fastapi import register_tortoise
-from datetime import timedelta
+from tortoise.transactions import in_transaction
+from datetime import datetime, timedelta
 import os
+import secrets
 import uuid
 from typing import List
 
-from models import User, Policy, Claim, ClaimDocument, ClaimNote, UserRole, ClaimStatus
+from models import User, Policy, Claim, ArchivedClaim, ClaimDocument, ClaimNote, UserRole, ClaimStatus, DerivativeStatus
 from schemas import *
 from auth import *
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, SortOrder, encode_cursor, keyset_page, merge_keyset_pages
+from serialization import CLAIM_RESPONSE_FIELDS, FastJSONResponse
+from db import DATABASE_REPLICA_URL, PoolExhausted, ReadYourWritesMiddleware, read_connection, start_replica, stop_replica, tortoise_config
+from metrics import CONTENT_TYPE, METRICS_ENABLED, METRICS_TOKEN, MetricsMiddleware, render_metrics, start_metrics, stop_metrics
+from query_capture import QUERY_DEBUG, QueryDebugMiddleware
+from idempotency import IdempotencyMiddleware, start_idempotency_sweeper, stop_idempotency_sweeper
+from rate_limit import RATE_LIMIT_ENABLED, RateLimitMiddleware, start_rate_limit_sweeper, stop_rate_limit_sweeper
+from search import ensure_search_index, search_claims
+from storage import UploadSizeLimitMiddleware, store_upload
+from derivatives import schedule_derivatives, start_derivatives, stop_derivatives, wants_derivatives
+from downloads import DocumentVariant, document_response
+from visibility import visible_claims, can_view_claim, sees_closed_claims
+from live_updates import ClaimUpdate as ClaimUpdateEvent, hub
+from workflow import can_transition_status, compare_and_set_status, new_claim_number
+from claim_summary import ClaimSnapshot, claim_summary, record_claim_changes
+from assignment import AUTO_ASSIGN_BATCH_SIZE, MAX_OPEN_CLAIMS_PER_ADJUSTER, adjuster_workloads, auto_assign
+from claim_detail import claim_full, full_name, get_claim_with_relations
+from claim_import import IMPORT_BATCH_SIZE, import_claims, detect_format, open_text
+from claim_export import EXPORT_BATCH_SIZE, MEDIA_TYPES, export_claims, export_filename, filter_claims
+from startup import PRODUCTION_STARTUP, check_schema, start_warm_up
+from archive import claim_values, find_claim, find_document, start_archiver, stop_archiver, writable_claim
+from change_feed import changes_since, record_events, start_compactor, status_changed, stop_compactor
+from duplicates import find_duplicates, fingerprint_fields, index_fingerprints
 
 app = FastAPI(title="Auto Insurance Claims API")
 
+BULK_STATUS_CHUNK_SIZE = int(os.getenv("BULK_STATUS_CHUNK_SIZE", 200))
+
+# Innermost, so replayed responses still get CORS headers for the retrying origin
+app.add_middleware(IdempotencyMiddleware)
+# Inside CORS too, so browsers can read a refusal's Retry-After
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "X-Query-Count", "X-Query-Time-Ms", "Idempotent-Replayed",
+                    "Content-Disposition", "Content-Range", "Retry-After"],
 )
 
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.add_middleware(UploadSizeLimitMiddleware)
+if QUERY_DEBUG:
+    app.add_middleware(QueryDebugMiddleware)
+if DATABASE_REPLICA_URL:
+    app.add_middleware(ReadYourWritesMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(request, exc: PoolExhausted):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+# First, so passlib and jose load in a thread while the database connects
+@app.on_event("startup")
+async def warm_up_libraries():
+    await start_warm_up()
+
+@app.on_event("startup")
+async def start_claim_updates():
+    await hub.start()
+
+@app.on_event("shutdown")
+async def stop_claim_updates():
+    await hub.stop()
+
+@app.on_event("shutdown")
+async def stop_metrics_collection():
+    await stop_metrics()
+
+@app.on_event("shutdown")
+async def stop_read_replica():
+    await stop_replica()
+
+@app.on_event("shutdown")
+async def stop_idempotency_key_sweeper():
+    await stop_idempotency_sweeper()
+
+@app.on_event("shutdown")
+async def stop_rate_limit_bucket_sweeper():
+    await stop_rate_limit_sweeper()
+
+@app.on_event("shutdown")
+async def stop_document_derivatives():
+    await stop_derivatives()
+
+@app.on_event("shutdown")
+async def stop_claim_archiver():
+    await stop_archiver()
+
+@app.on_event("shutdown")
+async def stop_change_feed_compactor():
+    await stop_compactor()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not METRICS_TOKEN and PRODUCTION_STARTUP:
+        # Route names, pool sizes and traffic are not for anonymous callers of a production API
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to serve metrics in production")
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
 
 @app.post("/auth/register", response_model=UserResponse)
 async def register(user: UserCreate):
@@ -30,7 +129,7 @@ async def register(user: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     new_user = await User.create(
         email=user.email,
         password_hash=hashed_password,
@@ -43,8 +142,13 @@ async def register(user: UserCreate):
 @app.post("/auth/login", response_model=Token)
 async def login(email: str = Form(), password: str = Form()):
     user = await User.get_or_none(email=email)
-    if not user or not verify_password(password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        await User.filter(id=user.id).update(password_hash=new_hash)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -56,6 +160,12 @@ async def login(email: str = Form(), password: str = Form()):
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return UserResponse.model_validate(current_user.__dict__)
 
+@app.get("/auth/cache-stats")
+async def get_auth_cache_stats(
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    return auth_cache_stats()
+
 @app.post("/policies")
 async def create_default_policy(
     current_user: User = Depends(require_role([UserRole.CUSTOMER, UserRole.AGENT]))
@@ -82,13 +192,14 @@ async def create_default_policy(
 @app.get("/policies")
 async def get_user_policies(current_user: User = Depends(get_current_user)):
     if current_user.role == UserRole.CUSTOMER:
-        policies = await Policy.filter(customer_id=current_user.id)
+        policies = Policy.filter(customer_id=current_user.id)
     else:
-        policies = await Policy.all()
+        policies = Policy.all()
     
-    return [{"id": p.id, "policy_number": p.policy_number, "vehicle_make": p.vehicle_make, "vehicle_model": p.vehicle_model} for p in policies]
+    policies = policies.using_db(read_connection(current_user))
+    return FastJSONResponse(await policies.values("id", "policy_number", "vehicle_make", "vehicle_model"))
 
-@app.post("/claims", response_model=ClaimResponse)
+@app.post("/claims", response_model=ClaimCreateResponse)
 async def create_claim(
     claim: ClaimCreate,
     current_user: User = Depends(require_role([UserRole.CUSTOMER, UserRole.AGENT]))
@@ -97,60 +208,204 @@ async def create_claim(
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
     
-    claim_number = f"CLM-{uuid.uuid4().hex[:8].upper()}"
-    new_claim = await Claim.create(
-        claim_number=claim_number,
-        policy_id=claim.policy_id,
-        customer_id=policy.customer_id,
-        incident_date=claim.incident_date,
-        incident_description=claim.incident_description,
-        incident_location=claim.incident_location
-    )
-    return ClaimResponse.model_validate(new_claim.__dict__)
-
-@app.get("/claims", response_model=List[ClaimResponse])
-async def get_claims(current_user: User = Depends(get_current_user)):
-    if current_user.role == UserRole.CUSTOMER:
-        # Customers see only their own claims
-        claims = await Claim.filter(customer_id=current_user.id)
-    elif current_user.role == UserRole.AGENT:
-        # Agents see submitted and under_review claims
-        claims = await Claim.filter(status__in=[ClaimStatus.SUBMITTED, ClaimStatus.UNDER_REVIEW])
-    elif current_user.role == UserRole.ADJUSTER:
-        # Adjusters see assigned and investigating claims assigned to them + all unassigned
-        claims = await Claim.filter(
-            status__in=[ClaimStatus.ASSIGNED, ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED]
-        ).filter(
-            assigned_adjuster_id__in=[current_user.id, None]
+    claim_number = new_claim_number()
+    async with in_transaction() as conn:
+        new_claim = await Claim.create(
+            claim_number=claim_number,
+            policy_id=claim.policy_id,
+            customer_id=policy.customer_id,
+            incident_date=claim.incident_date,
+            incident_description=claim.incident_description,
+            incident_location=claim.incident_location,
+            **fingerprint_fields(
+                claim.policy_id, claim.incident_date, claim.incident_description, claim.incident_location
+            ),
+            using_db=conn
         )
-    elif current_user.role == UserRole.MANAGER:
-        # Managers see claims that need assignment or are in progress
-        claims = await Claim.filter(
-            status__in=[ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED, ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED]
+        await record_claim_changes([(None, ClaimSnapshot.of(new_claim))], using_db=conn)
+        await index_fingerprints([new_claim], using_db=conn)
+        created = ClaimUpdateEvent(
+            type="claim_created",
+            claim_id=new_claim.id,
+            status=new_claim.status,
+            customer_id=new_claim.customer_id,
+            data={"claim_number": new_claim.claim_number}
         )
-    else:  # ADMIN
-        # Admins see all claims
-        claims = await Claim.all()
+        await record_events([created], using_db=conn)
+    await hub.publish(created)
+    
+    # Warnings only: the claim is filed either way, for an adjuster to merge or reject
+    possible_duplicates = await find_duplicates(new_claim)
+    return ClaimCreateResponse.model_validate({**new_claim.__dict__, "possible_duplicates": possible_duplicates})
+
+@app.post("/admin/claims/import")
+async def import_claims_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    if not format:
+        try:
+            format = detect_format(file.filename or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    await file.seek(0)
+    stream = open_text(file.file)
+    try:
+        # Rejected rows come back in the response (the first IMPORT_MAX_REJECTS of them)
+        return await import_claims(stream, format, batch_size=batch_size)
+    finally:
+        stream.detach()
+
+@app.get("/claims", response_model=List[ClaimResponse])
+async def get_claims(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[List[ClaimStatus]] = Query(None),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    adjuster_id: Optional[int] = None,
+    order: SortOrder = SortOrder.DESC,
+    include_archived: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    # Active claims only unless asked; archived ones are closed, so only roles that see closed claims get them
+    models = [Claim, ArchivedClaim] if include_archived and sees_closed_claims(current_user) else [Claim]
+    pages = []
+    for model in models:
+        query = visible_claims(current_user, model)
+        if status:
+            query = query.filter(status__in=status)
+        if created_from:
+            query = query.filter(created_at__gte=created_from)
+        if created_to:
+            query = query.filter(created_at__lt=created_to)
+        if adjuster_id is not None:
+            query = query.filter(assigned_adjuster_id=adjuster_id)
+        
+        # Plain rows straight to JSON: no model instances, no second validation pass
+        page = keyset_page(query, cursor, limit, order).using_db(read_connection(current_user))
+        pages.append(await page.values(*CLAIM_RESPONSE_FIELDS))
+    rows = merge_keyset_pages(pages, limit, order)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    
+    return FastJSONResponse(rows, headers=headers)
+
+@app.get("/claims/search", response_model=List[ClaimSearchResult])
+async def search_claims_endpoint(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    ranked = await search_claims(current_user, q, limit + 1, offset)
+    headers = {}
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        headers["X-Next-Offset"] = str(offset + limit)
     
-    return [ClaimResponse.model_validate(claim.__dict__) for claim in claims]
+    ranks = dict(ranked)
+    rows = await claim_values(
+        list(ranks), *CLAIM_RESPONSE_FIELDS, policy_number="policy__policy_number", license_plate="policy__license_plate"
+    )
+    for row in rows:
+        row["rank"] = ranks[row["id"]]
+    rows.sort(key=lambda row: (row["rank"], row["id"]), reverse=True)
+    return FastJSONResponse(rows, headers=headers)
+
+@app.get("/claims/summary", response_model=ClaimSummaryResponse)
+async def get_claims_summary(current_user: User = Depends(get_current_user)):
+    return await claim_summary(current_user)
+
+@app.get("/claims/export")
+async def export_claims_file(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    status: Optional[List[ClaimStatus]] = Query(None),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=100, le=10000),
+    current_user: User = Depends(get_current_user)
+):
+    # Streamed batch by batch; never holds more than one batch of rows
+    models = [Claim, ArchivedClaim] if sees_closed_claims(current_user) else [Claim]
+    queries = [
+        filter_claims(visible_claims(current_user, model), status, created_from, created_to).using_db(read_connection(current_user))
+        for model in models
+    ]
+    filename = export_filename(format, gzip)
+    return StreamingResponse(
+        export_claims(queries, format, gzip, batch_size),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/claims/changes", response_model=ClaimChangesResponse)
+async def get_claim_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    # Events after the since cursor, oldest first; poll again with next_cursor
+    return FastJSONResponse(await changes_since(current_user, since, limit, using_db=read_connection(current_user)))
+
+@app.get("/claims/stream")
+async def stream_claim_updates(
+    claim_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if claim_id is not None:
+        claim = await find_claim(claim_id)
+        if not claim:
+            raise HTTPException(status_code=404, detail="Claim not found")
+        if not can_view_claim(current_user, claim):
+            raise HTTPException(status_code=403, detail="Access denied")
+    
+    hub.check_capacity()
+    return StreamingResponse(
+        hub.stream(current_user, claim_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/claims/{claim_id}", response_model=ClaimResponse)
 async def get_claim_detail(
     claim_id: int,
     current_user: User = Depends(get_current_user)
 ):
-    claim = await Claim.get_or_none(id=claim_id)
+    claim = await find_claim(claim_id, using_db=read_connection(current_user))
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
     
     # Check access permissions
-    if current_user.role == UserRole.CUSTOMER and claim.customer_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == UserRole.ADJUSTER and claim.assigned_adjuster_id != current_user.id:
+    if not can_view_claim(current_user, claim):
         raise HTTPException(status_code=403, detail="Access denied")
     
     return ClaimResponse.model_validate(claim.__dict__)
 
+@app.get("/claims/{claim_id}/full", response_model=ClaimFullResponse)
+async def get_claim_full(
+    claim_id: int,
+    notes_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    notes_offset: int = Query(0, ge=0),
+    documents_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    documents_offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    claim = await get_claim_with_relations(claim_id)
+    if not claim:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    
+    if not can_view_claim(current_user, claim):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return await claim_full(claim, notes_limit, notes_offset, documents_limit, documents_offset)
+
 @app.put("/claims/{claim_id}/status")
 async def update_claim_status(
     claim_id: int,
@@ -160,7 +415,8 @@ async def update_claim_status(
     assigned_adjuster_id: Optional[int] = None,
     current_user: User = Depends(get_current_user)
 ):
-    claim = await Claim.get_or_none(id=claim_id)
+    # Archived claims are closed, so the workflow check below refuses them
+    claim = await find_claim(claim_id)
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
     
@@ -168,58 +424,109 @@ async def update_claim_status(
     if not can_transition_status(claim.status, new_status, current_user.role):
         raise HTTPException(status_code=403, detail=f"Cannot transition from {claim.status} to {new_status} with role {current_user.role}")
     
-    # Update claim
-    claim.status = new_status
+    # Update claim only if nobody moved it since we read it
+    changes = {}
     if estimated_damage is not None:
-        claim.estimated_damage = estimated_damage
+        changes["estimated_damage"] = estimated_damage
     if approved_amount is not None:
-        claim.approved_amount = approved_amount
+        changes["approved_amount"] = approved_amount
     if assigned_adjuster_id is not None:
-        claim.assigned_adjuster_id = assigned_adjuster_id
+        changes["assigned_adjuster_id"] = assigned_adjuster_id
     
-    await claim.save()
+    async with in_transaction() as conn:
+        if not await compare_and_set_status(claim_id, claim.status, new_status, changes, using_db=conn):
+            raise HTTPException(status_code=409, detail="Claim status was changed by another user")
+        before = ClaimSnapshot.of(claim)
+        after = before.changed(new_status, changes)
+        await record_claim_changes([(before, after)], using_db=conn)
+        changed = status_changed(claim_id, before, after)
+        await record_events([changed], using_db=conn)
+    await hub.publish(changed)
     return {"message": "Status updated successfully"}
 
-def can_transition_status(current_status: ClaimStatus, new_status: ClaimStatus, user_role: UserRole) -> bool:
-    """Validate workflow transitions based on user role"""
-    transitions = {
-        ClaimStatus.SUBMITTED: {
-            UserRole.AGENT: [ClaimStatus.UNDER_REVIEW, ClaimStatus.REJECTED],
-            UserRole.MANAGER: [ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED],
-            UserRole.ADMIN: [ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED, ClaimStatus.REJECTED]
-        },
-        ClaimStatus.UNDER_REVIEW: {
-            UserRole.AGENT: [ClaimStatus.REJECTED],
-            UserRole.MANAGER: [ClaimStatus.ASSIGNED, ClaimStatus.REJECTED],
-            UserRole.ADMIN: [ClaimStatus.ASSIGNED, ClaimStatus.REJECTED]
-        },
-        ClaimStatus.ASSIGNED: {
-            UserRole.ADJUSTER: [ClaimStatus.INVESTIGATING, ClaimStatus.REJECTED],
-            UserRole.MANAGER: [ClaimStatus.INVESTIGATING, ClaimStatus.REJECTED],
-            UserRole.ADMIN: [ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED, ClaimStatus.REJECTED]
-        },
-        ClaimStatus.INVESTIGATING: {
-            UserRole.ADJUSTER: [ClaimStatus.APPROVED, ClaimStatus.REJECTED],
-            UserRole.MANAGER: [ClaimStatus.APPROVED, ClaimStatus.REJECTED],
-            UserRole.ADMIN: [ClaimStatus.APPROVED, ClaimStatus.REJECTED, ClaimStatus.SETTLED]
-        },
-        ClaimStatus.APPROVED: {
-            UserRole.ADMIN: [ClaimStatus.SETTLED],
-            UserRole.MANAGER: [ClaimStatus.SETTLED]
-        },
-        ClaimStatus.REJECTED: {},
-        ClaimStatus.SETTLED: {}
-    }
+@app.put("/claims/status", response_model=BulkStatusUpdateResponse)
+async def bulk_update_claim_status(
+    update: BulkStatusUpdate,
+    current_user: User = Depends(require_role([UserRole.AGENT, UserRole.ADJUSTER, UserRole.MANAGER, UserRole.ADMIN]))
+):
+    if update.assigned_adjuster_id is not None:
+        if not await User.exists(id=update.assigned_adjuster_id, role=UserRole.ADJUSTER, is_active=True):
+            raise HTTPException(status_code=400, detail="Adjuster not found")
+    
+    changes = {}
+    if update.estimated_damage is not None:
+        changes["estimated_damage"] = update.estimated_damage
+    if update.approved_amount is not None:
+        changes["approved_amount"] = update.approved_amount
+    if update.assigned_adjuster_id is not None:
+        changes["assigned_adjuster_id"] = update.assigned_adjuster_id
     
-    allowed_transitions = transitions.get(current_status, {})
-    return new_status in allowed_transitions.get(user_role, [])
+    claim_ids = list(dict.fromkeys(update.claim_ids))
+    results = []
+    for offset in range(0, len(claim_ids), BULK_STATUS_CHUNK_SIZE):
+        chunk = claim_ids[offset:offset + BULK_STATUS_CHUNK_SIZE]
+        current = {
+            row["id"]: ClaimSnapshot.of(row)
+            for row in await claim_values(
+                chunk, "id", "status", "customer_id", "assigned_adjuster_id", "estimated_damage", "approved_amount"
+            )
+        }
+        async with in_transaction() as conn:
+            transitioned = []
+            for claim_id in chunk:
+                if claim_id not in current:
+                    results.append(BulkStatusResult(claim_id=claim_id, result="not_found"))
+                    continue
+                before = current[claim_id]
+                expected_status = update.expected_status or before.status
+                if before.status != expected_status:
+                    results.append(BulkStatusResult(claim_id=claim_id, result="conflict", status=before.status))
+                    continue
+                if not can_transition_status(expected_status, update.new_status, current_user.role):
+                    results.append(BulkStatusResult(claim_id=claim_id, result="forbidden", status=expected_status))
+                    continue
+                if await compare_and_set_status(claim_id, expected_status, update.new_status, changes, using_db=conn):
+                    results.append(BulkStatusResult(claim_id=claim_id, result="updated", status=update.new_status))
+                    transitioned.append((claim_id, before, before.changed(update.new_status, changes)))
+                else:
+                    results.append(BulkStatusResult(claim_id=claim_id, result="conflict"))
+            await record_claim_changes([(before, after) for _, before, after in transitioned], using_db=conn)
+            events = [status_changed(claim_id, before, after) for claim_id, before, after in transitioned]
+            await record_events(events, using_db=conn)
+        for event in events:
+            await hub.publish(event)
+    
+    return BulkStatusUpdateResponse(
+        updated=sum(1 for r in results if r.result == "updated"),
+        results=results
+    )
+
+@app.post("/claims/auto-assign", response_model=AutoAssignResponse)
+async def auto_assign_claims(
+    request: AutoAssignRequest,
+    current_user: User = Depends(require_role([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    run = await auto_assign(
+        claim_ids=request.claim_ids,
+        limit=request.limit or AUTO_ASSIGN_BATCH_SIZE,
+        max_open_claims=request.max_open_claims or MAX_OPEN_CLAIMS_PER_ADJUSTER
+    )
+    for claim_id, before, after in run.transitions:
+        await hub.publish(status_changed(claim_id, before, after))
+    
+    return AutoAssignResponse(
+        assigned=len(run.assignments),
+        assignments=[ClaimAssignment(claim_id=c, adjuster_id=a) for c, a in run.assignments.items()],
+        unassigned_claim_ids=run.unassigned_claim_ids,
+        adjusters=[AdjusterWorkload.model_validate(load.__dict__) for load in run.adjusters]
+    )
 
-@app.get("/users/adjusters")
+@app.get("/users/adjusters", response_model=List[AdjusterWorkload])
 async def get_adjusters(
     current_user: User = Depends(require_role([UserRole.MANAGER, UserRole.ADMIN]))
 ):
-    adjusters = await User.filter(role=UserRole.ADJUSTER, is_active=True)
-    return [{"id": u.id, "name": f"{u.first_name} {u.last_name}"} for u in adjusters]
+    workloads = await adjuster_workloads(read_connection(current_user))
+    return [AdjusterWorkload.model_validate(load.__dict__) for load in workloads]
 
 @app.post("/claims/{claim_id}/documents")
 async def upload_document(
@@ -227,26 +534,59 @@ async def upload_document(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
-    claim = await Claim.get_or_none(id=claim_id)
+    # A new document brings an archived claim back into the active tables
+    claim = await writable_claim(claim_id, current_user)
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
     
-    file_extension = file.filename.split('.')[-1]
-    file_name = f"{uuid.uuid4().hex}.{file_extension}"
-    file_path = f"uploads/{file_name}"
+    stored = await store_upload(file)
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    async with in_transaction() as conn:
+        document = await ClaimDocument.create(
+            claim_id=claim_id,
+            file_name=file.filename,
+            file_path=stored.path,
+            file_type=file.content_type,
+            sha256=stored.sha256,
+            file_size=stored.size,
+            uploaded_by_id=current_user.id,
+            derivatives_status=DerivativeStatus.PENDING if wants_derivatives(file.content_type) else DerivativeStatus.NONE,
+            using_db=conn
+        )
+        uploaded = ClaimUpdateEvent(
+            type="document_uploaded",
+            claim_id=claim.id,
+            status=claim.status,
+            customer_id=claim.customer_id,
+            assigned_adjuster_id=claim.assigned_adjuster_id,
+            data={"document_id": document.id, "file_name": document.file_name}
+        )
+        await record_events([uploaded], using_db=conn)
+    if document.derivatives_status == DerivativeStatus.PENDING:
+        schedule_derivatives(document)
+    await hub.publish(uploaded)
+    return {
+        "message": "Document uploaded successfully",
+        "document_id": document.id,
+        "derivatives_status": document.derivatives_status
+    }
+
+@app.api_route("/documents/{document_id}", methods=["GET", "HEAD"])
+async def download_document(
+    document_id: int,
+    request: Request,
+    variant: DocumentVariant = DocumentVariant.ORIGINAL,
+    current_user: User = Depends(get_current_user)
+):
+    document = await find_document(document_id, using_db=read_connection(current_user))
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
     
-    document = await ClaimDocument.create(
-        claim_id=claim_id,
-        file_name=file.filename,
-        file_path=file_path,
-        file_type=file.content_type,
-        uploaded_by_id=current_user.id
-    )
-    return {"message": "Document uploaded successfully", "document_id": document.id}
+    # Same rule as the claim's detail view
+    if not can_view_claim(current_user, document.claim):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return await document_response(request, document, variant)
 
 @app.post("/claims/{claim_id}/notes", response_model=ClaimNoteResponse)
 async def add_note(
@@ -254,26 +594,74 @@ async def add_note(
     note: ClaimNoteCreate,
     current_user: User = Depends(get_current_user)
 ):
-    claim = await Claim.get_or_none(id=claim_id)
+    claim = await writable_claim(claim_id, current_user)
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
     
-    new_note = await ClaimNote.create(
-        claim_id=claim_id,
-        author_id=current_user.id,
-        content=note.content
-    )
+    async with in_transaction() as conn:
+        new_note = await ClaimNote.create(
+            claim_id=claim_id,
+            author_id=current_user.id,
+            content=note.content,
+            using_db=conn
+        )
+        added = ClaimUpdateEvent(
+            type="note_added",
+            claim_id=claim.id,
+            status=claim.status,
+            customer_id=claim.customer_id,
+            assigned_adjuster_id=claim.assigned_adjuster_id,
+            data={"note_id": new_note.id}
+        )
+        await record_events([added], using_db=conn)
+    await hub.publish(added)
     return ClaimNoteResponse(
         id=new_note.id,
         content=new_note.content,
-        author_name=f"{current_user.first_name} {current_user.last_name}",
+        author_name=full_name(current_user),
         created_at=new_note.created_at
     )
 
 register_tortoise(
     app,
-    db_url=os.getenv("DATABASE_URL", "sqlite://db.sqlite3").replace("postgresql://", "postgres://"),
-    modules={"models": ["models"]},
-    generate_schemas=True,
+    config=tortoise_config(),
+    # Production databases are migrated with aerich; see startup.py
+    generate_schemas=not PRODUCTION_STARTUP,
     add_exception_handlers=True,
-)
\ No newline at end of file
+)
+
+# Registered after register_tortoise so the ORM is initialised by the time these run
+@app.on_event("startup")
+async def prepare_database():
+    if PRODUCTION_STARTUP:
+        await check_schema()
+    else:
+        await ensure_search_index()
+
+@app.on_event("startup")
+async def start_metrics_collection():
+    await start_metrics()
+
+@app.on_event("startup")
+async def start_read_replica():
+    await start_replica()
+
+@app.on_event("startup")
+async def start_idempotency_key_sweeper():
+    await start_idempotency_sweeper()
+
+@app.on_event("startup")
+async def start_rate_limit_bucket_sweeper():
+    await start_rate_limit_sweeper()
+
+@app.on_event("startup")
+async def start_document_derivatives():
+    await start_derivatives()
+
+@app.on_event("startup")
+async def start_claim_archiver():
+    await start_archiver()
+
+@app.on_event("startup")
+async def start_change_feed_compactor():
+    await start_compactor()
\ No newline at end of file
@@ -0,0 +1,293 @@
+"""Prometheus metrics for the API, served as text on GET /metrics.
+
+Per request: latency by route template and role, response size, and the number
+and wall time of SQL statements issued while handling it (via query_hooks). Per
+process: in-flight requests, all SQL statements by kind, connection-pool usage,
+read-replica lag, event-loop lag, and time spent in bcrypt and upload storage so
+slow requests can be attributed. Metrics are per worker process; Prometheus sums
+across workers.
+
+Everything is recorded on the event loop, so the collectors are plain dicts
+without locks.
+"""
+import asyncio
+import bisect
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import query_hooks
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # when set, scrapes must send it as a bearer token; required in production
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values: Dict[Tuple, object] = {}
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in self.values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        state = self.values.get(labels)
+        if state is None:
+            # per-bucket counts (last slot is +Inf), sum
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template, caller role and status",
+    ("method", "route", "role", "status"),
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), buckets=SIZE_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements issued per request", ("method", "route"), buckets=COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time per request spent waiting on SQL statements", ("method", "route"),
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed by kind", ("kind",))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency by kind", ("kind",), buckets=QUERY_BUCKETS)
+DB_POOL = Gauge("db_pool_connections", "Connection pool size, idle and in-use connections, and the maximum", ("connection", "state"))
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag seen by the last read-replica health check")
+DB_REPLICA_IN_USE = Gauge("db_replica_in_use", "1 while read-only endpoints are sent to the replica")
+LOOP_LAG = Histogram("event_loop_lag_seconds", "How late the event loop woke a sleeping timer", buckets=LAG_BUCKETS)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt time including the wait for a hash pool slot", ("operation",),
+)
+UPLOAD_STORE_SECONDS = Histogram("upload_store_duration_seconds", "Time to stream, hash and store an upload")
+DERIVATIVE_SECONDS = Histogram(
+    "document_derivative_duration_seconds",
+    "Time to render an image document's thumbnail and web copy, including the wait for a pool process",
+    ("outcome",),
+)
+DERIVATIVES_IN_PROGRESS = Gauge("document_derivatives_in_progress", "Derivative jobs queued or running")
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total", "Write requests sent with an Idempotency-Key, by outcome", ("outcome",),
+)
+DOCUMENT_DOWNLOADS = Counter(
+    "document_downloads_total", "GET /documents/{id} responses: full, partial, not_modified, redirected, unsatisfiable",
+    ("outcome",),
+)
+ARCHIVE_MOVES = Counter("claim_archive_moves_total", "Claims moved into or back out of the archive tables", ("direction",))
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests refused by admission control, by route and the limit hit (ip, user, concurrency)",
+    ("route", "limit"),
+)
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests running on a concurrency-limited route", ("route",))
+
+QUERY_KINDS = {"select", "insert", "update", "delete", "with", "begin", "commit", "rollback"}
+
+
+@dataclass
+class RequestMetrics:
+    role: str = "anonymous"
+    queries: int = 0
+    db_seconds: float = 0.0
+
+
+_current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request_metrics", default=None)
+
+
+def set_request_role(role):
+    """Called once the caller is authenticated, so latency can be broken down by role"""
+    state = _current_request.get()
+    if state is not None:
+        state.role = getattr(role, "value", role)
+
+
+def _observe_query(statement: str, seconds: float):
+    words = statement.split(None, 1)
+    kind = words[0].lower() if words else "other"
+    if kind not in QUERY_KINDS:
+        kind = "other"
+    DB_QUERIES.inc(kind)
+    DB_QUERY_SECONDS.observe(seconds, kind)
+    state = _current_request.get()
+    if state is not None:
+        state.queries += 1
+        state.db_seconds += seconds
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners cannot blow up the series count
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI so streaming responses are measured without being buffered"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = RequestMetrics()
+        token = _current_request.set(state)
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                size += message.get("count") or 0
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.dec()
+            _current_request.reset(token)
+            method, route = scope["method"], _route_template(scope)
+            REQUEST_SECONDS.observe(elapsed, method, route, state.role, str(status))
+            RESPONSE_BYTES.observe(size, method, route)
+            REQUEST_QUERIES.observe(state.queries, method, route)
+            REQUEST_DB_SECONDS.observe(state.db_seconds, method, route)
+
+
+def _collect_pools():
+    from tortoise import connections
+    from db import replica
+
+    if replica.client is not None:
+        DB_REPLICA_LAG.set(replica.lag_seconds)
+        DB_REPLICA_IN_USE.set(int(replica.healthy))
+    for conn in connections.all() + ([replica.client] if replica.client else []):
+        pool = getattr(conn, "_pool", None)
+        if pool is None:
+            continue
+        size, idle = pool.get_size(), pool.get_idle_size()
+        name = conn.connection_name
+        DB_POOL.set(size, name, "size")
+        DB_POOL.set(idle, name, "idle")
+        DB_POOL.set(size - idle, name, "in_use")
+        DB_POOL.set(getattr(conn, "pool_maxsize", size), name, "max")
+
+
+def render_metrics() -> str:
+    _collect_pools()
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+async def _watch_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - LOOP_LAG_INTERVAL))
+
+
+_lag_task: Optional[asyncio.Task] = None
+
+
+async def start_metrics():
+    global _lag_task
+    if not METRICS_ENABLED:
+        return
+    query_hooks.install()
+    query_hooks.add_observer(_observe_query)
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_watch_loop_lag())
+
+
+async def stop_metrics():
+    global _lag_task
+    query_hooks.remove_observer(_observe_query)
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "claim" ADD "incident_fingerprint" VARCHAR(40);
+        ALTER TABLE "claim" ADD "description_minhash" JSONB;
+        CREATE INDEX "idx_claim_inciden_40b3e6" ON "claim" ("incident_fingerprint");
+        CREATE TABLE IF NOT EXISTS "claimfingerprintband" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "band" BIGINT NOT NULL,
+    "claim_id" INT NOT NULL REFERENCES "claim" ("id") ON DELETE CASCADE
+);
+        CREATE INDEX IF NOT EXISTS "idx_claimfinger_band_4aded2" ON "claimfingerprintband" ("band", "claim_id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "claimfingerprintband";
+        DROP INDEX "idx_claim_inciden_40b3e6";
+        ALTER TABLE "claim" DROP COLUMN "incident_fingerprint";
+        ALTER TABLE "claim" DROP COLUMN "description_minhash";"""
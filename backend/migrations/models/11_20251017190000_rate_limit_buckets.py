@@ -0,0 +1,16 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "ratelimitbucket" (
+    "key" VARCHAR(255) NOT NULL  PRIMARY KEY,
+    "tokens" DOUBLE PRECISION NOT NULL,
+    "refilled_at" DOUBLE PRECISION NOT NULL
+);
+        CREATE INDEX IF NOT EXISTS "idx_ratelimitbu_refille_1ab569" ON "ratelimitbucket" ("refilled_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "ratelimitbucket";"""
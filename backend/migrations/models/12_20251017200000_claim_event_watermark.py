@@ -0,0 +1,16 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "claimeventwatermark" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "compacted_through" BIGINT NOT NULL  DEFAULT 0,
+    "compacted_at" TIMESTAMPTZ
+);
+        INSERT INTO "claimeventwatermark" ("id", "compacted_through") SELECT 1, COALESCE(MIN("id"), 1) - 1 FROM "claimevent";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "claimeventwatermark";"""
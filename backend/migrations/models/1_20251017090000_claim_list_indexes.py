@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX "idx_claim_custome_e0c202" ON "claim" ("customer_id", "created_at", "id");
+        CREATE INDEX "idx_claim_status_825e4c" ON "claim" ("status", "created_at", "id");
+        CREATE INDEX "idx_claim_assigne_f1708d" ON "claim" ("assigned_adjuster_id", "status", "created_at", "id");
+        CREATE INDEX "idx_claim_created_bacf9c" ON "claim" ("created_at", "id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_claim_custome_e0c202";
+        DROP INDEX "idx_claim_status_825e4c";
+        DROP INDEX "idx_claim_assigne_f1708d";
+        DROP INDEX "idx_claim_created_bacf9c";"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "claimdocument" ADD "sha256" VARCHAR(64);
+        ALTER TABLE "claimdocument" ADD "file_size" BIGINT;
+        CREATE INDEX "idx_claimdocume_sha256_40a951" ON "claimdocument" ("sha256");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_claimdocume_sha256_40a951";
+        ALTER TABLE "claimdocument" DROP COLUMN "sha256";
+        ALTER TABLE "claimdocument" DROP COLUMN "file_size";"""
@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "claimcounter" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "scope" VARCHAR(8) NOT NULL,
+    "scope_id" INT NOT NULL,
+    "status" VARCHAR(13) NOT NULL,
+    "shard" SMALLINT NOT NULL  DEFAULT 0,
+    "claim_count" INT NOT NULL  DEFAULT 0,
+    "estimated_damage_total" DECIMAL(14,2) NOT NULL  DEFAULT 0,
+    "approved_amount_total" DECIMAL(14,2) NOT NULL  DEFAULT 0,
+    CONSTRAINT "uid_claimcounte_scope_d883d8" UNIQUE ("scope", "scope_id", "status", "shard")
+);
+COMMENT ON COLUMN "claimcounter"."scope" IS 'CUSTOMER: customer\nADJUSTER: adjuster';
+COMMENT ON COLUMN "claimcounter"."status" IS 'SUBMITTED: submitted\nUNDER_REVIEW: under_review\nASSIGNED: assigned\nINVESTIGATING: investigating\nAPPROVED: approved\nREJECTED: rejected\nSETTLED: settled';
+        INSERT INTO "claimcounter" ("scope", "scope_id", "status", "shard", "claim_count", "estimated_damage_total", "approved_amount_total")
+    SELECT 'customer', "customer_id", "status", 0, COUNT(*), COALESCE(SUM("estimated_damage"), 0), COALESCE(SUM("approved_amount"), 0)
+    FROM "claim" GROUP BY "customer_id", "status";
+        INSERT INTO "claimcounter" ("scope", "scope_id", "status", "shard", "claim_count", "estimated_damage_total", "approved_amount_total")
+    SELECT 'adjuster', COALESCE("assigned_adjuster_id", 0), "status", 0, COUNT(*), COALESCE(SUM("estimated_damage"), 0), COALESCE(SUM("approved_amount"), 0)
+    FROM "claim" GROUP BY COALESCE("assigned_adjuster_id", 0), "status";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "claimcounter";"""
@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX "idx_claimdocume_claim_i_b532d3" ON "claimdocument" ("claim_id", "uploaded_at", "id");
+        CREATE INDEX "idx_claimnote_claim_i_d85fe6" ON "claimnote" ("claim_id", "created_at", "id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_claimnote_claim_i_d85fe6";
+        DROP INDEX "idx_claimdocume_claim_i_b532d3";"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        ALTER TABLE "claim" ADD COLUMN IF NOT EXISTS "search_vector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce("incident_description", '')), 'A') ||
+        setweight(to_tsvector('english', coalesce("incident_location", '')), 'B')
+    ) STORED;
+        CREATE INDEX IF NOT EXISTS "idx_claim_search_vector" ON "claim" USING GIN ("search_vector");
+        CREATE INDEX IF NOT EXISTS "idx_claim_claim_number_trgm" ON "claim" USING GIN ("claim_number" gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS "idx_policy_policy_number_trgm" ON "policy" USING GIN ("policy_number" gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS "idx_policy_license_plate_trgm" ON "policy" USING GIN ("license_plate" gin_trgm_ops);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_policy_license_plate_trgm";
+        DROP INDEX IF EXISTS "idx_policy_policy_number_trgm";
+        DROP INDEX IF EXISTS "idx_claim_claim_number_trgm";
+        DROP INDEX IF EXISTS "idx_claim_search_vector";
+        ALTER TABLE "claim" DROP COLUMN IF EXISTS "search_vector";"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "idempotencykey" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "user_id" INT NOT NULL,
+    "key" VARCHAR(255) NOT NULL,
+    "fingerprint" VARCHAR(64) NOT NULL,
+    "status_code" SMALLINT,
+    "headers" JSONB,
+    "body" BYTEA,
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "expires_at" TIMESTAMPTZ NOT NULL,
+    CONSTRAINT "uid_idempotency_user_id_8e4f79" UNIQUE ("user_id", "key")
+);
+        CREATE INDEX IF NOT EXISTS "idx_idempotency_expires_7a2be9" ON "idempotencykey" ("expires_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "idempotencykey";"""
@@ -0,0 +1,31 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "claimdocument" ADD "derivatives_status" VARCHAR(7) NOT NULL  DEFAULT 'none';
+        ALTER TABLE "claimdocument" ADD "image_width" INT;
+        ALTER TABLE "claimdocument" ADD "image_height" INT;
+        ALTER TABLE "claimdocument" ADD "thumbnail_path" VARCHAR(500);
+        ALTER TABLE "claimdocument" ADD "thumbnail_width" INT;
+        ALTER TABLE "claimdocument" ADD "thumbnail_height" INT;
+        ALTER TABLE "claimdocument" ADD "web_path" VARCHAR(500);
+        ALTER TABLE "claimdocument" ADD "web_width" INT;
+        ALTER TABLE "claimdocument" ADD "web_height" INT;
+        COMMENT ON COLUMN "claimdocument"."derivatives_status" IS 'NONE: none\nPENDING: pending\nREADY: ready\nFAILED: failed';
+        CREATE INDEX "idx_claimdocume_derivat_8eac5a" ON "claimdocument" ("derivatives_status", "id");
+        UPDATE "claimdocument" SET "derivatives_status" = 'pending' WHERE LOWER("file_type") IN ('image/bmp', 'image/gif', 'image/jpeg', 'image/jpg', 'image/pjpeg', 'image/png', 'image/tiff', 'image/webp');"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_claimdocume_derivat_8eac5a";
+        ALTER TABLE "claimdocument" DROP COLUMN "derivatives_status";
+        ALTER TABLE "claimdocument" DROP COLUMN "image_width";
+        ALTER TABLE "claimdocument" DROP COLUMN "image_height";
+        ALTER TABLE "claimdocument" DROP COLUMN "thumbnail_path";
+        ALTER TABLE "claimdocument" DROP COLUMN "thumbnail_width";
+        ALTER TABLE "claimdocument" DROP COLUMN "thumbnail_height";
+        ALTER TABLE "claimdocument" DROP COLUMN "web_path";
+        ALTER TABLE "claimdocument" DROP COLUMN "web_width";
+        ALTER TABLE "claimdocument" DROP COLUMN "web_height";"""
@@ -0,0 +1,67 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "archivedclaim" (
+    "id" INT NOT NULL  PRIMARY KEY,
+    "claim_number" VARCHAR(50) NOT NULL UNIQUE,
+    "status" VARCHAR(13) NOT NULL,
+    "incident_date" TIMESTAMPTZ NOT NULL,
+    "incident_description" TEXT NOT NULL,
+    "incident_location" VARCHAR(255) NOT NULL,
+    "estimated_damage" DECIMAL(10,2),
+    "approved_amount" DECIMAL(10,2),
+    "created_at" TIMESTAMPTZ NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL,
+    "archived_at" TIMESTAMPTZ NOT NULL,
+    "assigned_adjuster_id" INT REFERENCES "user" ("id") ON DELETE CASCADE,
+    "customer_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE,
+    "policy_id" INT NOT NULL REFERENCES "policy" ("id") ON DELETE CASCADE
+);
+        CREATE INDEX IF NOT EXISTS "idx_archivedcla_custome_98b46d" ON "archivedclaim" ("customer_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_archivedcla_created_aab130" ON "archivedclaim" ("created_at", "id");
+        COMMENT ON COLUMN "archivedclaim"."status" IS 'SUBMITTED: submitted\nUNDER_REVIEW: under_review\nASSIGNED: assigned\nINVESTIGATING: investigating\nAPPROVED: approved\nREJECTED: rejected\nSETTLED: settled';
+        CREATE TABLE IF NOT EXISTS "archivedclaimdocument" (
+    "id" INT NOT NULL  PRIMARY KEY,
+    "file_name" VARCHAR(255) NOT NULL,
+    "file_path" VARCHAR(500) NOT NULL,
+    "file_type" VARCHAR(50) NOT NULL,
+    "sha256" VARCHAR(64),
+    "file_size" BIGINT,
+    "uploaded_at" TIMESTAMPTZ NOT NULL,
+    "derivatives_status" VARCHAR(7) NOT NULL  DEFAULT 'none',
+    "image_width" INT,
+    "image_height" INT,
+    "thumbnail_path" VARCHAR(500),
+    "thumbnail_width" INT,
+    "thumbnail_height" INT,
+    "web_path" VARCHAR(500),
+    "web_width" INT,
+    "web_height" INT,
+    "claim_id" INT NOT NULL REFERENCES "archivedclaim" ("id") ON DELETE CASCADE,
+    "uploaded_by_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE
+);
+        CREATE INDEX IF NOT EXISTS "idx_archivedcla_claim_i_6841d5" ON "archivedclaimdocument" ("claim_id", "uploaded_at", "id");
+        COMMENT ON COLUMN "archivedclaimdocument"."derivatives_status" IS 'NONE: none\nPENDING: pending\nREADY: ready\nFAILED: failed';
+        CREATE TABLE IF NOT EXISTS "archivedclaimnote" (
+    "id" INT NOT NULL  PRIMARY KEY,
+    "content" TEXT NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL,
+    "author_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE,
+    "claim_id" INT NOT NULL REFERENCES "archivedclaim" ("id") ON DELETE CASCADE
+);
+        CREATE INDEX IF NOT EXISTS "idx_archivedcla_claim_i_ba2e2e" ON "archivedclaimnote" ("claim_id", "created_at", "id");
+        ALTER TABLE "archivedclaim" ADD COLUMN IF NOT EXISTS "search_vector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce("incident_description", '')), 'A') ||
+        setweight(to_tsvector('english', coalesce("incident_location", '')), 'B')
+    ) STORED;
+        CREATE INDEX IF NOT EXISTS "idx_archivedclaim_search_vector" ON "archivedclaim" USING GIN ("search_vector");
+        CREATE INDEX IF NOT EXISTS "idx_archivedclaim_claim_number_trgm" ON "archivedclaim" USING GIN ("claim_number" gin_trgm_ops);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "archivedclaimnote";
+        DROP TABLE IF EXISTS "archivedclaimdocument";
+        DROP TABLE IF EXISTS "archivedclaim";"""
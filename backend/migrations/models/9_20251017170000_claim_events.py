@@ -0,0 +1,26 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "claimevent" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "type" VARCHAR(32) NOT NULL,
+    "claim_id" INT NOT NULL,
+    "status" VARCHAR(13) NOT NULL,
+    "previous_status" VARCHAR(13),
+    "customer_id" INT NOT NULL,
+    "assigned_adjuster_id" INT,
+    "data" JSONB NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+        CREATE INDEX IF NOT EXISTS "idx_claimevent_created_29e01e" ON "claimevent" ("created_at");
+        CREATE INDEX IF NOT EXISTS "idx_claimevent_custome_16dee0" ON "claimevent" ("customer_id", "id");
+        CREATE INDEX IF NOT EXISTS "idx_claimevent_assigne_1b0a83" ON "claimevent" ("assigned_adjuster_id", "id");
+        COMMENT ON COLUMN "claimevent"."status" IS 'SUBMITTED: submitted\nUNDER_REVIEW: under_review\nASSIGNED: assigned\nINVESTIGATING: investigating\nAPPROVED: approved\nREJECTED: rejected\nSETTLED: settled';
+        COMMENT ON COLUMN "claimevent"."previous_status" IS 'SUBMITTED: submitted\nUNDER_REVIEW: under_review\nASSIGNED: assigned\nINVESTIGATING: investigating\nAPPROVED: approved\nREJECTED: rejected\nSETTLED: settled';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "claimevent";"""
@@ -18,6 +18,16 @@ class ClaimStatus(str, Enum):
     REJECTED = "rejected"
     SETTLED = "settled"
 
+class DerivativeStatus(str, Enum):
+    NONE = "none"  # not an image, nothing to derive
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+class CounterScope(str, Enum):
+    CUSTOMER = "customer"
+    ADJUSTER = "adjuster"
+
 class User(Model):
     id = fields.IntField(pk=True)
     email = fields.CharField(max_length=100, unique=True)
@@ -54,6 +64,30 @@ class Claim(Model):
     approved_amount = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
+    # Duplicate detection (duplicates.py): policy + incident day + location tokens,
+    # and the MinHash signature of the description. Null until fingerprinted.
+    incident_fingerprint = fields.CharField(max_length=40, null=True, index=True)
+    description_minhash = fields.JSONField(null=True)
+
+    class Meta:
+        # Serve the per-role list predicates in visibility.visible_claims and the
+        # (created_at, id) keyset ordering used by GET /claims
+        indexes = (
+            ("customer_id", "created_at", "id"),
+            ("status", "created_at", "id"),
+            ("assigned_adjuster_id", "status", "created_at", "id"),
+            ("created_at", "id"),
+        )
+
+# LSH bands of Claim.description_minhash, scoped to the claim's policy: claims
+# sharing any band are the candidates duplicates.find_duplicates scores.
+class ClaimFingerprintBand(Model):
+    id = fields.BigIntField(pk=True)
+    claim = fields.ForeignKeyField("models.Claim", related_name="fingerprint_bands")
+    band = fields.BigIntField()
+
+    class Meta:
+        indexes = (("band", "claim_id"),)
 
 class ClaimDocument(Model):
     id = fields.IntField(pk=True)
@@ -61,12 +95,162 @@ class ClaimDocument(Model):
     file_name = fields.CharField(max_length=255)
     file_path = fields.CharField(max_length=500)
     file_type = fields.CharField(max_length=50)
+    sha256 = fields.CharField(max_length=64, null=True, index=True)
+    file_size = fields.BigIntField(null=True)
     uploaded_by = fields.ForeignKeyField("models.User", related_name="uploaded_documents")
     uploaded_at = fields.DatetimeField(auto_now_add=True)
+    # Thumbnail and web-sized copies of image uploads, rendered in the background
+    # (derivatives.py); clients use the original until the status is READY
+    derivatives_status = fields.CharEnumField(DerivativeStatus, default=DerivativeStatus.NONE)
+    image_width = fields.IntField(null=True)
+    image_height = fields.IntField(null=True)
+    thumbnail_path = fields.CharField(max_length=500, null=True)
+    thumbnail_width = fields.IntField(null=True)
+    thumbnail_height = fields.IntField(null=True)
+    web_path = fields.CharField(max_length=500, null=True)
+    web_width = fields.IntField(null=True)
+    web_height = fields.IntField(null=True)
+
+    class Meta:
+        # Newest-first page of a claim's documents for GET /claims/{id}/full, and
+        # the pending-derivatives backlog picked up at startup
+        indexes = (("claim_id", "uploaded_at", "id"), ("derivatives_status", "id"))
 
 class ClaimNote(Model):
     id = fields.IntField(pk=True)
     claim = fields.ForeignKeyField("models.Claim", related_name="notes")
     author = fields.ForeignKeyField("models.User", related_name="authored_notes")
     content = fields.TextField()
-    created_at = fields.DatetimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        # Newest-first page of a claim's notes for GET /claims/{id}/full
+        indexes = (("claim_id", "created_at", "id"),)
+
+# Closed (settled or rejected) claims moved out of the hot tables by archive.py,
+# with their notes and document metadata. Same columns and ids as the hot rows,
+# so an id is found in exactly one of the two tables; look claims up through
+# archive.find_claim rather than either model directly. Counters still include
+# archived claims.
+class ArchivedClaim(Model):
+    id = fields.IntField(pk=True, generated=False)
+    claim_number = fields.CharField(max_length=50, unique=True)
+    policy = fields.ForeignKeyField("models.Policy", related_name="archived_claims")
+    customer = fields.ForeignKeyField("models.User", related_name="archived_customer_claims")
+    assigned_adjuster = fields.ForeignKeyField("models.User", related_name="archived_adjuster_claims", null=True)
+    status = fields.CharEnumField(ClaimStatus)
+    incident_date = fields.DatetimeField()
+    incident_description = fields.TextField()
+    incident_location = fields.CharField(max_length=255)
+    estimated_damage = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
+    approved_amount = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
+    created_at = fields.DatetimeField()
+    updated_at = fields.DatetimeField()
+    archived_at = fields.DatetimeField()
+
+    class Meta:
+        # Only customers and admins can list closed claims (visibility.sees_closed_claims)
+        indexes = (("customer_id", "created_at", "id"), ("created_at", "id"))
+
+class ArchivedClaimDocument(Model):
+    id = fields.IntField(pk=True, generated=False)
+    claim = fields.ForeignKeyField("models.ArchivedClaim", related_name="documents")
+    file_name = fields.CharField(max_length=255)
+    file_path = fields.CharField(max_length=500)
+    file_type = fields.CharField(max_length=50)
+    sha256 = fields.CharField(max_length=64, null=True)
+    file_size = fields.BigIntField(null=True)
+    uploaded_by = fields.ForeignKeyField("models.User", related_name="archived_uploaded_documents")
+    uploaded_at = fields.DatetimeField()
+    derivatives_status = fields.CharEnumField(DerivativeStatus, default=DerivativeStatus.NONE)
+    image_width = fields.IntField(null=True)
+    image_height = fields.IntField(null=True)
+    thumbnail_path = fields.CharField(max_length=500, null=True)
+    thumbnail_width = fields.IntField(null=True)
+    thumbnail_height = fields.IntField(null=True)
+    web_path = fields.CharField(max_length=500, null=True)
+    web_width = fields.IntField(null=True)
+    web_height = fields.IntField(null=True)
+
+    class Meta:
+        indexes = (("claim_id", "uploaded_at", "id"),)
+
+class ArchivedClaimNote(Model):
+    id = fields.IntField(pk=True, generated=False)
+    claim = fields.ForeignKeyField("models.ArchivedClaim", related_name="notes")
+    author = fields.ForeignKeyField("models.User", related_name="archived_authored_notes")
+    content = fields.TextField()
+    created_at = fields.DatetimeField()
+
+    class Meta:
+        indexes = (("claim_id", "created_at", "id"),)
+
+# Append-only log of claim changes behind GET /claims/changes (change_feed.py).
+# id is the feed's sequence number: rows are written last in the transaction that
+# made the change, and handed out in commit order. claim_id is a plain column so
+# events outlive the claim's move to the archive tables.
+class ClaimEvent(Model):
+    id = fields.BigIntField(pk=True)
+    type = fields.CharField(max_length=32)
+    claim_id = fields.IntField()
+    status = fields.CharEnumField(ClaimStatus)
+    previous_status = fields.CharEnumField(ClaimStatus, null=True)
+    customer_id = fields.IntField()
+    assigned_adjuster_id = fields.IntField(null=True)
+    data = fields.JSONField(default=dict)
+    created_at = fields.DatetimeField(auto_now_add=True, index=True)
+
+    class Meta:
+        # Per-role reads of the feed (visibility.visible_events); created_at for compaction
+        indexes = (("customer_id", "id"), ("assigned_adjuster_id", "id"))
+
+# How far change_feed.compact_events has deleted the claim event log: every
+# event with id <= compacted_through is gone. A single row (id 1), written
+# before each compaction deletes anything.
+class ClaimEventWatermark(Model):
+    id = fields.IntField(pk=True)
+    compacted_through = fields.BigIntField(default=0)
+    compacted_at = fields.DatetimeField(null=True)
+
+# Per-status claim counts and amount totals, maintained alongside claim writes.
+# Every claim is counted once under its customer and once under its adjuster
+# (scope_id 0 for unassigned). Rows are spread over a few shards so concurrent
+# writers do not all queue on the same counter row.
+class ClaimCounter(Model):
+    id = fields.IntField(pk=True)
+    scope = fields.CharEnumField(CounterScope)
+    scope_id = fields.IntField()
+    status = fields.CharEnumField(ClaimStatus)
+    shard = fields.SmallIntField(default=0)
+    claim_count = fields.IntField(default=0)
+    estimated_damage_total = fields.DecimalField(max_digits=14, decimal_places=2, default=0)
+    approved_amount_total = fields.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = (("scope", "scope_id", "status", "shard"),)
+
+# Outcome of a write request sent with an Idempotency-Key, replayed to retries
+# of the same key by the same user (see idempotency.DatabaseIdempotencyStore).
+# status_code stays NULL while the first request is running; expires_at is then
+# how long it may hold the key before a retry takes over.
+class IdempotencyKey(Model):
+    id = fields.IntField(pk=True)
+    user_id = fields.IntField()
+    key = fields.CharField(max_length=255)
+    fingerprint = fields.CharField(max_length=64)
+    status_code = fields.SmallIntField(null=True)
+    headers = fields.JSONField(null=True)
+    body = fields.BinaryField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    expires_at = fields.DatetimeField(index=True)
+
+    class Meta:
+        unique_together = (("user_id", "key"),)
+
+# Token buckets shared by every worker when RATE_LIMIT_STORE=database (see
+# rate_limit.DatabaseRateLimitStore). refilled_at is Unix time in seconds; a
+# bucket idle long enough to be full again is swept.
+class RateLimitBucket(Model):
+    key = fields.CharField(max_length=255, pk=True)
+    tokens = fields.FloatField()
+    refilled_at = fields.FloatField(index=True)
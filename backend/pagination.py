@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query: QuerySet, cursor: Optional[str], limit: int, order: SortOrder) -> QuerySet:
+    """Apply a (created_at, id) keyset window to a queryset.
+
+    Fetches limit + 1 rows so callers can tell whether another page exists.
+    """
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        if order == SortOrder.DESC:
+            query = query.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+            )
+        else:
+            query = query.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id)
+            )
+    if order == SortOrder.DESC:
+        query = query.order_by("-created_at", "-id")
+    else:
+        query = query.order_by("created_at", "id")
+    return query.limit(limit + 1)
+
+
+def merge_keyset_pages(pages: List[List[dict]], limit: int, order: SortOrder) -> List[dict]:
+    """Combine keyset_page results from several tables into one page of limit + 1 rows.
+
+    Each input is already in (created_at, id) order from the same cursor, so the
+    first limit + 1 rows of the merge are exactly the next page across all of them.
+    """
+    if len(pages) == 1:
+        return pages[0]
+    rows = [row for page in pages for row in page]
+    rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=order == SortOrder.DESC)
+    return rows[:limit + 1]
@@ -0,0 +1,146 @@
+"""Record the SQL a block of code issues, and hold endpoints to a query budget.
+
+    with capture_queries() as captured:
+        await client.get("/claims", headers=manager)
+    print(captured.report())
+
+    with query_budget(3, "GET /claims as manager"):
+        await client.get("/claims", headers=manager)
+
+Each statement is recorded with its duration and the innermost application frame
+that issued it. QueryDebugMiddleware does the same per request when QUERY_DEBUG is
+on and the client sends ``X-Debug-Queries: 1``, answering with X-Query-Count and
+X-Query-Time-Ms headers and logging the statements.
+"""
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import query_hooks
+
+logger = logging.getLogger(__name__)
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() == "true"
+DEBUG_REQUEST_HEADER = b"x-debug-queries"
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.abspath(query_hooks.__file__), os.path.abspath(__file__)}
+# Below this frame is the event loop, not whoever created the task
+_TASK_BOUNDARY = os.path.join("asyncio", "events.py")
+
+
+@dataclass
+class CapturedQuery:
+    statement: str
+    seconds: float
+    location: str
+
+
+@dataclass
+class QueryCapture:
+    queries: List[CapturedQuery] = field(default_factory=list)
+    parent: Optional["QueryCapture"] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(q.seconds for q in self.queries)
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{i:3}. {q.seconds * 1000:7.2f}ms  {q.location}\n     {q.statement}"
+            for i, q in enumerate(self.queries, start=1)
+        )
+
+
+_current: ContextVar[Optional[QueryCapture]] = ContextVar("query_capture", default=None)
+
+
+def _issuing_location() -> str:
+    """file:line of the innermost frame in this application, outside the capture machinery"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.endswith(_TASK_BOUNDARY):
+            return "<spawned task, e.g. asyncio.gather>"
+        if filename.startswith(APP_DIR) and filename not in _SKIP_FILES and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, APP_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+def _record(statement: str, seconds: float):
+    capture = _current.get()
+    if capture is None:
+        return
+    query = CapturedQuery(statement, seconds, _issuing_location())
+    while capture is not None:
+        capture.queries.append(query)
+        capture = capture.parent
+
+
+@contextmanager
+def capture_queries():
+    """Collect every statement issued in this context (and tasks it spawns) until exit"""
+    query_hooks.install()
+    query_hooks.add_observer(_record)
+    capture = QueryCapture(parent=_current.get())
+    token = _current.set(capture)
+    try:
+        yield capture
+    finally:
+        _current.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block"):
+    """Raise QueryBudgetExceeded, listing the statements, if the block issues more than max_queries"""
+    with capture_queries() as capture:
+        yield capture
+    if capture.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label} issued {capture.count} queries, budget is {max_queries}:\n{capture.report()}"
+        )
+
+
+class QueryDebugMiddleware:
+    """Opt-in per-request query count headers; only installed when QUERY_DEBUG is on"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or dict(scope["headers"]).get(DEBUG_REQUEST_HEADER) != b"1":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        with capture_queries() as capture:
+            async def send_with_counts(message):
+                if message["type"] == "http.response.start":
+                    # Statements issued while a streaming body is produced are not included
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(capture.count).encode()),
+                        (b"x-query-time-ms", f"{capture.total_seconds * 1000:.2f}".encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_counts)
+
+        logger.info(
+            "%s %s: %d queries, %.2fms in SQL, %.2fms total\n%s",
+            scope["method"], scope["path"], capture.count, capture.total_seconds * 1000,
+            (time.perf_counter() - start) * 1000, capture.report(),
+        )
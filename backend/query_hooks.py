@@ -0,0 +1,65 @@
+"""Observe every SQL statement Tortoise sends, with its wall time.
+
+install() wraps the execute_* methods of the loaded Tortoise client classes
+(call it after Tortoise.init so the backend modules are imported). Observers are
+plain callables taking (statement, seconds) and run on the event loop after the
+statement completes; with no observers registered the wrapper adds one list check.
+"""
+import contextvars
+import functools
+import time
+from typing import Callable, List
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+QueryObserver = Callable[[str, float], None]
+
+EXECUTE_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+_observers: List[QueryObserver] = []
+# Set while a wrapped call is running so a client method delegating to another counts once
+_in_query = contextvars.ContextVar("in_query", default=False)
+
+
+def add_observer(observer: QueryObserver):
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_observer(observer: QueryObserver):
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+def _wrap(method):
+    @functools.wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        if not _observers or _in_query.get():
+            return await method(self, query, *args, **kwargs)
+        token = _in_query.set(True)
+        start = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _in_query.reset(token)
+            for observer in list(_observers):
+                observer(query, elapsed)
+
+    wrapper.__query_hook__ = True
+    return wrapper
+
+
+def _client_classes(cls=BaseDBAsyncClient):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _client_classes(subclass)
+
+
+def install():
+    """Idempotent; picks up client classes loaded since the last call"""
+    for cls in set(_client_classes()):
+        for name in EXECUTE_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "__query_hook__", False):
+                setattr(cls, name, _wrap(method))
@@ -0,0 +1,284 @@
+"""Admission control for the endpoints that can saturate a worker.
+
+POST /auth/login spends a bcrypt verification on every attempt, and
+POST /claims/{id}/documents streams, hashes and stores a file. For each, a
+middleware applies three checks before the endpoint runs:
+
+- concurrency: at most MAX_CONCURRENT requests for the route run at once in a
+  worker. Further ones get 503 immediately rather than queueing behind them.
+- per IP: a token bucket of N requests per minute per client address, so up
+  to N can arrive at once.
+- per user: the same per authenticated user for uploads. For login it applies
+  per attempted account (the email form field) and client address together, so
+  guessing against one account is held to this rate per address while the
+  owner, from another address, can still log in. An account-only bucket would
+  let anyone lock its owner out by spending it.
+
+Requests over a rate get 429. Every refusal carries Retry-After and is counted
+in rate_limit_rejections_total. The client address is the connection's peer.
+Behind a proxy, run uvicorn with --proxy-headers and --forwarded-allow-ips so
+that it is the real client.
+
+Buckets live in the worker ("memory", the default: each worker allows the full
+rate) or in the ratelimitbucket table ("database": one budget shared by every
+worker, one upsert per check). If the store cannot be reached, requests are let
+through. Concurrency is always per worker.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from tortoise import Tortoise
+
+from auth import token_user_id
+from cache import TTLCache
+from metrics import ADMISSION_IN_FLIGHT, RATE_LIMIT_REJECTIONS
+from models import RateLimitBucket
+from storage import UPLOAD_PATH_PATTERN
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # or database
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))  # memory store only
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", 600))
+# Requests per minute (also the burst size); 0 = no limit
+LOGIN_RATE_PER_IP = int(os.getenv("LOGIN_RATE_PER_IP", 20))
+LOGIN_RATE_PER_ACCOUNT = int(os.getenv("LOGIN_RATE_PER_ACCOUNT", 5))
+LOGIN_MAX_CONCURRENT = int(os.getenv("LOGIN_MAX_CONCURRENT", 32))
+UPLOAD_RATE_PER_IP = int(os.getenv("UPLOAD_RATE_PER_IP", 60))
+UPLOAD_RATE_PER_USER = int(os.getenv("UPLOAD_RATE_PER_USER", 30))
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", 16))
+
+RATE_PERIOD = 60.0
+BUSY_RETRY_AFTER = 1
+# Login forms are a few hundred bytes; larger bodies are passed on without an account check
+LOGIN_BODY_LIMIT = 64 * 1024
+
+
+@dataclass(frozen=True)
+class RouteLimits:
+    name: str  # metrics label and bucket key prefix
+    method: str
+    pattern: Pattern
+    per_ip: int
+    per_user: int
+    max_concurrent: int
+
+
+ROUTE_LIMITS = [
+    RouteLimits("login", "POST", re.compile(r"^/auth/login/?$"), LOGIN_RATE_PER_IP, LOGIN_RATE_PER_ACCOUNT, LOGIN_MAX_CONCURRENT),
+    RouteLimits("upload", "POST", UPLOAD_PATH_PATTERN, UPLOAD_RATE_PER_IP, UPLOAD_RATE_PER_USER, UPLOAD_MAX_CONCURRENT),
+]
+
+
+class MemoryRateLimitStore:
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        # An idle bucket refills completely within RATE_PERIOD, so dropping it then changes nothing
+        self._buckets = TTLCache(maxsize=maxsize, ttl=RATE_PERIOD)
+
+    async def take(self, key: str, capacity: int) -> float:
+        """Take a token from key's bucket; 0 if there was one, else seconds until there is"""
+        now = time.monotonic()
+        rate = capacity / RATE_PERIOD
+        tokens, refilled_at = self._buckets.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - refilled_at) * rate)
+        if tokens < 1:
+            # Not stored: the refill is recomputed from the same timestamp next time
+            return (1 - tokens) / rate
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+    async def purge_expired(self) -> int:
+        return self._buckets.purge_expired()
+
+
+class DatabaseRateLimitStore:
+    async def take(self, key: str, capacity: int) -> float:
+        """Take a token from key's bucket; 0 if there was one, else seconds until there is"""
+        conn = Tortoise.get_connection("default")
+        table = RateLimitBucket._meta.db_table
+        now = time.time()
+        rate = capacity / RATE_PERIOD
+        if conn.capabilities.dialect == "postgres":
+            refilled = f'LEAST($4, "{table}"."tokens" + (excluded."refilled_at" - "{table}"."refilled_at") * $5)'
+            params = ", ".join(f"${i}" for i in range(1, 4))
+            values = [key, capacity - 1, now, capacity, rate]
+        else:
+            refilled = f'MIN(?, "{table}"."tokens" + (excluded."refilled_at" - "{table}"."refilled_at") * ?)'
+            params = ", ".join("?" * 3)
+            values = [key, capacity - 1, now, capacity, rate, capacity, rate]
+        # One statement, so concurrent workers cannot both spend the last token.
+        # No row comes back when the bucket had less than a whole token.
+        _, rows = await conn.execute_query(
+            f'INSERT INTO "{table}" ("key", "tokens", "refilled_at") VALUES ({params}) '
+            f'ON CONFLICT ("key") DO UPDATE SET "tokens" = {refilled} - 1, "refilled_at" = excluded."refilled_at" '
+            f'WHERE {refilled} >= 1 RETURNING "tokens"',
+            values,
+        )
+        if rows:
+            return 0.0
+        bucket = await RateLimitBucket.get_or_none(key=key)
+        if bucket is None:
+            return 0.0  # swept in between
+        tokens = min(capacity, bucket.tokens + (now - bucket.refilled_at) * rate)
+        return max(0.0, (1 - tokens) / rate)
+
+    async def purge_expired(self) -> int:
+        return await RateLimitBucket.filter(refilled_at__lt=time.time() - RATE_PERIOD).delete()
+
+
+def create_store():
+    if RATE_LIMIT_STORE == "database":
+        return DatabaseRateLimitStore()
+    return MemoryRateLimitStore()
+
+
+store = create_store()
+
+
+def _refuse(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code, content={"detail": detail}, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+async def _buffer_body(receive, limit: int):
+    """Read the request body up to limit; returns (body or None if larger, receive that replays what was read)"""
+    messages: List[dict] = []
+    size = 0
+    complete = False
+    while not complete and size <= limit:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        complete = not message.get("more_body", False)
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+    return (body if complete and size <= limit else None), replay
+
+
+async def _login_account(scope, receive):
+    """The email a login attempt is for (lowercased), and a receive for the endpoint"""
+    body, replay = await _buffer_body(receive, LOGIN_BODY_LIMIT)
+    if body is None:
+        return None, replay
+
+    async def body_once():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    try:
+        form = await Request(scope, body_once).form()
+        email = form.get("email")
+        await form.close()
+    except Exception:
+        # Malformed forms are the endpoint's to reject
+        return None, replay
+    return (email.strip().lower()[:200] if isinstance(email, str) and email.strip() else None), replay
+
+
+class RateLimitMiddleware:
+    """Per-route concurrency caps and per-IP / per-user token buckets (see ROUTE_LIMITS)"""
+
+    def __init__(self, app, limits: List[RouteLimits] = ROUTE_LIMITS):
+        self.app = app
+        self.limits = limits
+        self.in_flight: Dict[str, int] = {route.name: 0 for route in limits}
+
+    async def __call__(self, scope, receive, send):
+        limits = None
+        if scope["type"] == "http":
+            limits = next(
+                (route for route in self.limits if scope["method"] == route.method and route.pattern.match(scope["path"])),
+                None,
+            )
+        if limits is None:
+            await self.app(scope, receive, send)
+            return
+
+        if limits.max_concurrent and self.in_flight[limits.name] >= limits.max_concurrent:
+            RATE_LIMIT_REJECTIONS.inc(limits.name, "concurrency")
+            await _refuse(503, "Server is busy, retry shortly", BUSY_RETRY_AFTER)(scope, receive, send)
+            return
+        self.in_flight[limits.name] += 1
+        ADMISSION_IN_FLIGHT.inc(limits.name)
+        try:
+            receive, refusal = await self._check_rates(limits, scope, receive)
+            if refusal is not None:
+                await refusal(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[limits.name] -= 1
+            ADMISSION_IN_FLIGHT.dec(limits.name)
+
+    async def _check_rates(self, limits: RouteLimits, scope, receive):
+        """(receive for the endpoint, a 429 response or None)"""
+        checks = []
+        if limits.per_ip and scope.get("client"):
+            checks.append(("ip", f"{limits.name}:ip:{scope['client'][0]}", limits.per_ip))
+        if limits.per_user:
+            if limits.name == "login":
+                user, receive = await _login_account(scope, receive)
+                if user is not None:
+                    # Keyed with the address: attempts from elsewhere must not use up the owner's logins
+                    user = f"{user}@{scope['client'][0] if scope.get('client') else '-'}"
+            else:
+                headers = dict(scope["headers"])
+                scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+                user = token_user_id(token) if scheme.lower() == "bearer" else None
+            if user is not None:
+                checks.append(("user", f"{limits.name}:user:{user}", limits.per_user))
+
+        for kind, key, capacity in checks:
+            try:
+                wait = await store.take(key, capacity)
+            except Exception:
+                # A store outage must not lock every client out
+                logger.warning("Rate limit store failed; letting %s through", key, exc_info=True)
+                continue
+            if wait > 0:
+                RATE_LIMIT_REJECTIONS.inc(limits.name, kind)
+                return receive, _refuse(429, "Too many requests, retry later", wait)
+        return receive, None
+
+
+async def _sweep():
+    while True:
+        await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+        try:
+            purged = await store.purge_expired()
+            if purged:
+                logger.debug("Purged %d idle rate limit buckets", purged)
+        except Exception:
+            logger.exception("Rate limit bucket sweep failed")
+
+
+_sweep_task: Optional[asyncio.Task] = None
+
+
+async def start_rate_limit_sweeper():
+    global _sweep_task
+    if RATE_LIMIT_ENABLED and _sweep_task is None:
+        _sweep_task = asyncio.create_task(_sweep())
+
+
+async def stop_rate_limit_sweeper():
+    global _sweep_task
+    if _sweep_task is not None:
+        _sweep_task.cancel()
+        _sweep_task = None
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
-from models import UserRole, ClaimStatus
+from models import UserRole, ClaimStatus, DerivativeStatus
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -35,6 +35,43 @@ class ClaimUpdate(BaseModel):
     estimated_damage: Optional[float] = None
     approved_amount: Optional[float] = None
 
+class BulkStatusUpdate(BaseModel):
+    claim_ids: List[int] = Field(min_length=1, max_length=5000)
+    new_status: ClaimStatus
+    expected_status: Optional[ClaimStatus] = None
+    assigned_adjuster_id: Optional[int] = None
+    estimated_damage: Optional[float] = None
+    approved_amount: Optional[float] = None
+
+class BulkStatusResult(BaseModel):
+    claim_id: int
+    result: str  # updated | not_found | forbidden | conflict
+    status: Optional[ClaimStatus] = None
+
+class BulkStatusUpdateResponse(BaseModel):
+    updated: int
+    results: List[BulkStatusResult]
+
+class AutoAssignRequest(BaseModel):
+    claim_ids: Optional[List[int]] = Field(None, max_length=5000)
+    limit: Optional[int] = Field(None, ge=1, le=5000)
+    max_open_claims: Optional[int] = Field(None, ge=1)
+
+class AdjusterWorkload(BaseModel):
+    id: int
+    name: str
+    open_claims: int
+
+class ClaimAssignment(BaseModel):
+    claim_id: int
+    adjuster_id: int
+
+class AutoAssignResponse(BaseModel):
+    assigned: int
+    assignments: List[ClaimAssignment]
+    unassigned_claim_ids: List[int]
+    adjusters: List[AdjusterWorkload]
+
 class ClaimResponse(BaseModel):
     id: int
     claim_number: str
@@ -47,6 +84,50 @@ class ClaimResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class DuplicateWarning(BaseModel):
+    claim_id: int
+    claim_number: str
+    status: ClaimStatus
+    incident_date: datetime
+    same_incident: bool  # same policy, day and location
+    description_similarity: float
+
+class ClaimCreateResponse(ClaimResponse):
+    possible_duplicates: List[DuplicateWarning] = []
+
+class ClaimSearchResult(ClaimResponse):
+    policy_number: str
+    license_plate: str
+    rank: float
+
+class ClaimEventResponse(BaseModel):
+    sequence: int
+    type: str  # claim_created | status_changed | note_added | document_uploaded | claim_archived | claim_restored
+    claim_id: int
+    status: ClaimStatus
+    previous_status: Optional[ClaimStatus]
+    customer_id: int
+    assigned_adjuster_id: Optional[int]
+    data: dict
+    created_at: datetime
+
+class ClaimChangesResponse(BaseModel):
+    events: List[ClaimEventResponse]
+    next_cursor: int  # pass back as since=
+    has_more: bool
+
+class ClaimStatusSummary(BaseModel):
+    status: ClaimStatus
+    count: int
+    estimated_damage_total: float
+    approved_amount_total: float
+
+class ClaimSummaryResponse(BaseModel):
+    total: int
+    estimated_damage_total: float
+    approved_amount_total: float
+    by_status: List[ClaimStatusSummary]
+
 class PolicyResponse(BaseModel):
     id: int
     policy_number: str
@@ -63,4 +144,47 @@ class ClaimNoteResponse(BaseModel):
     id: int
     content: str
     author_name: str
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class ClaimNotePage(BaseModel):
+    items: List[ClaimNoteResponse]
+    total: int
+    limit: int
+    offset: int
+
+class ClaimDocumentResponse(BaseModel):
+    id: int
+    file_name: str
+    file_type: str
+    file_size: Optional[int]
+    sha256: Optional[str]
+    uploaded_by_name: str
+    uploaded_at: datetime
+    url: str  # GET /documents/{id}, authorized like the claim itself
+    # Use thumbnail_url / web_url once derivatives_status is "ready", the original until then
+    derivatives_status: DerivativeStatus
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    thumbnail_width: Optional[int] = None
+    thumbnail_height: Optional[int] = None
+    web_url: Optional[str] = None
+    web_width: Optional[int] = None
+    web_height: Optional[int] = None
+
+class ClaimDocumentPage(BaseModel):
+    items: List[ClaimDocumentResponse]
+    total: int
+    limit: int
+    offset: int
+
+class UserSummary(BaseModel):
+    id: int
+    name: str
+
+class ClaimFullResponse(BaseModel):
+    claim: ClaimResponse
+    policy: PolicyResponse
+    assigned_adjuster: Optional[UserSummary]
+    notes: ClaimNotePage
+    documents: ClaimDocumentPage
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""Full-text claim search behind GET /claims/search.
+
+    python search.py rebuild
+
+Postgres: a generated ``search_vector`` tsvector column on claim (description
+and location) with a GIN index, plus pg_trgm GIN indexes on claim, policy and
+plate numbers so fragments like "7XK" match with ILIKE. SQLite (local/dev): an
+FTS5 table keyed by claim id, kept in sync by triggers on claim and policy,
+with LIKE for number fragments.
+
+Archived claims are indexed the same way (archivedclaim gets its own column
+and indexes; on SQLite archive.py moves their FTS rows along with them) and
+searched too for the roles that can see closed claims.
+
+ensure_search_index() creates whatever is missing and runs at startup, so
+databases built by generate_schemas get the index too; migration 5 carries the
+same Postgres DDL for aerich deployments (migration 8 for archivedclaim).
+"""
+import asyncio
+import json
+import os
+import re
+from typing import List, Tuple, Type
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+
+from db import tortoise_config
+from models import User, Claim, ArchivedClaim
+from visibility import visible_claims, sees_closed_claims
+
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "english")
+
+CLAIM_TABLES = ("claim", "archivedclaim")
+
+
+def _postgres_claim_ddl(table: str) -> List[str]:
+    return [
+        f"""ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "search_vector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce("incident_description", '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce("incident_location", '')), 'B')
+    ) STORED""",
+        f'CREATE INDEX IF NOT EXISTS "idx_{table}_search_vector" ON "{table}" USING GIN ("search_vector")',
+        f'CREATE INDEX IF NOT EXISTS "idx_{table}_claim_number_trgm" ON "{table}" USING GIN ("claim_number" gin_trgm_ops)',
+    ]
+
+
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *_postgres_claim_ddl("claim"),
+    'CREATE INDEX IF NOT EXISTS "idx_policy_policy_number_trgm" ON "policy" USING GIN ("policy_number" gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS "idx_policy_license_plate_trgm" ON "policy" USING GIN ("license_plate" gin_trgm_ops)',
+    *_postgres_claim_ddl("archivedclaim"),
+]
+
+
+def _sqlite_index_rows(table: str) -> str:
+    return f"""SELECT c."id", c."incident_description", c."incident_location", c."claim_number",
+        p."policy_number", p."license_plate" FROM "{table}" c JOIN "policy" p ON p."id" = c."policy_id\""""
+
+
+_SQLITE_INDEX_ROW = _sqlite_index_rows("claim")
+_SQLITE_INSERT = 'INSERT INTO "claim_search" (rowid, incident_description, incident_location, claim_number, policy_number, license_plate) '
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "claim_search" USING fts5(
+        incident_description, incident_location, claim_number, policy_number, license_plate,
+        tokenize = 'porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS "claim_search_ai" AFTER INSERT ON "claim" BEGIN
+        INSERT INTO "claim_search" (rowid, incident_description, incident_location, claim_number, policy_number, license_plate)
+        {_SQLITE_INDEX_ROW} WHERE c."id" = new."id";
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "claim_search_au"
+    AFTER UPDATE OF "incident_description", "incident_location", "claim_number", "policy_id" ON "claim" BEGIN
+        DELETE FROM "claim_search" WHERE rowid = old."id";
+        INSERT INTO "claim_search" (rowid, incident_description, incident_location, claim_number, policy_number, license_plate)
+        {_SQLITE_INDEX_ROW} WHERE c."id" = new."id";
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "claim_search_ad" AFTER DELETE ON "claim" BEGIN
+        DELETE FROM "claim_search" WHERE rowid = old."id";
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "claim_search_pu" AFTER UPDATE OF "policy_number", "license_plate" ON "policy" BEGIN
+        UPDATE "claim_search" SET policy_number = new."policy_number", license_plate = new."license_plate"
+        WHERE rowid IN (SELECT "id" FROM "claim" WHERE "policy_id" = new."id");
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "claim_search_pu_archived" AFTER UPDATE OF "policy_number", "license_plate" ON "policy" BEGIN
+        UPDATE "claim_search" SET policy_number = new."policy_number", license_plate = new."license_plate"
+        WHERE rowid IN (SELECT "id" FROM "archivedclaim" WHERE "policy_id" = new."id");
+    END""",
+]
+
+
+async def ensure_search_index(conn: BaseDBAsyncClient = None):
+    conn = conn or Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        for statement in POSTGRES_SEARCH_DDL:
+            await conn.execute_script(statement)
+        return
+    _, existing = await conn.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'claim_search'"
+    )
+    for statement in SQLITE_SEARCH_DDL:
+        await conn.execute_script(statement)
+    if not existing:
+        await rebuild_search_index(conn)
+
+
+async def rebuild_search_index(conn: BaseDBAsyncClient = None) -> dict:
+    """Refill the SQLite FTS table from claim and policy; Postgres keeps its column current by itself"""
+    conn = conn or Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        return {"indexed": await Claim.all().count() + await ArchivedClaim.all().count()}
+    await conn.execute_script('DELETE FROM "claim_search"')
+    for table in CLAIM_TABLES:
+        await conn.execute_script(_SQLITE_INSERT + _sqlite_index_rows(table))
+    _, rows = await conn.execute_query('SELECT COUNT(*) FROM "claim_search"')
+    return {"indexed": rows[0][0]}
+
+
+async def unindex_claims(conn: BaseDBAsyncClient, ids: List[int]):
+    """SQLite: drop claims' FTS rows, e.g. before moving them back into claim (whose insert trigger adds them)"""
+    if conn.capabilities.dialect == "postgres" or not ids:
+        return
+    placeholders = ", ".join("?" * len(ids))
+    await conn.execute_query(f'DELETE FROM "claim_search" WHERE rowid IN ({placeholders})', ids)
+
+
+async def index_claims(conn: BaseDBAsyncClient, ids: List[int], table: str):
+    """SQLite: (re)index claims from table, e.g. once they have been moved into archivedclaim"""
+    if conn.capabilities.dialect == "postgres" or not ids:
+        return
+    await unindex_claims(conn, ids)
+    placeholders = ", ".join("?" * len(ids))
+    await conn.execute_query(_SQLITE_INSERT + _sqlite_index_rows(table) + f' WHERE c."id" IN ({placeholders})', ids)
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fts5_query(text: str) -> str:
+    """Quote each word so user input is never parsed as FTS5 syntax; the last word matches as a prefix"""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words) + ("*" if words else "")
+
+
+async def search_claims(user: User, text: str, limit: int, offset: int) -> List[Tuple[int, float]]:
+    """(claim id, rank) pairs for the claims visible to user that match text, best first"""
+    if not sees_closed_claims(user):
+        return await _search_table(Claim, user, text, limit, offset)
+    # The top limit + offset of each table, merged on the same rank
+    ranked = await _search_table(Claim, user, text, limit + offset, 0)
+    ranked += await _search_table(ArchivedClaim, user, text, limit + offset, 0)
+    ranked.sort(key=lambda row: (row[1], row[0]), reverse=True)
+    return ranked[offset:offset + limit]
+
+
+async def _search_table(model: Type[Model], user: User, text: str, limit: int, offset: int) -> List[Tuple[int, float]]:
+    conn = model._meta.db
+    table = model._meta.db_table
+    # Only ints and status constants end up inlined in the visibility subquery
+    visible = visible_claims(user, model).only("id").sql()
+    pattern = _like_pattern(text.strip())
+
+    if conn.capabilities.dialect == "postgres":
+        sql = f"""
+            SELECT c."id", ts_rank(c."search_vector", q.query)
+                + greatest(similarity(c."claim_number", $1), similarity(p."policy_number", $1),
+                           similarity(p."license_plate", $1)) AS "rank"
+            FROM "{table}" c JOIN "policy" p ON p."id" = c."policy_id",
+                websearch_to_tsquery('{SEARCH_CONFIG}', $1) AS q(query)
+            WHERE c."id" IN ({visible}) AND (
+                c."search_vector" @@ q.query
+                OR c."claim_number" ILIKE $2 OR p."policy_number" ILIKE $2 OR p."license_plate" ILIKE $2
+            )
+            ORDER BY "rank" DESC, c."id" DESC LIMIT $3 OFFSET $4"""
+        values = [text, pattern, limit, offset]
+    else:
+        match = _fts5_query(text)
+        sql = f"""
+            SELECT c."id", coalesce(-f."score", 0)
+                + (c."claim_number" LIKE ? ESCAPE '\\' OR p."policy_number" LIKE ? ESCAPE '\\'
+                   OR p."license_plate" LIKE ? ESCAPE '\\') AS "rank"
+            FROM "{table}" c JOIN "policy" p ON p."id" = c."policy_id"
+            LEFT JOIN (
+                SELECT rowid, bm25("claim_search") AS "score" FROM "claim_search" WHERE "claim_search" MATCH ?
+            ) f ON f.rowid = c."id"
+            WHERE c."id" IN ({visible}) AND (
+                f.rowid IS NOT NULL
+                OR c."claim_number" LIKE ? ESCAPE '\\' OR p."policy_number" LIKE ? ESCAPE '\\'
+                OR p."license_plate" LIKE ? ESCAPE '\\'
+            )
+            ORDER BY "rank" DESC, c."id" DESC LIMIT ? OFFSET ?"""
+        # An empty MATCH is a syntax error; '""' matches nothing
+        values = [pattern] * 3 + [match or '""'] + [pattern] * 3 + [limit, offset]
+
+    _, rows = await conn.execute_query(sql, values)
+    return [(row[0], float(row[1])) for row in rows]
+
+
+async def main():
+    await Tortoise.init(config=tortoise_config())
+    try:
+        await ensure_search_index()
+        print(json.dumps(await rebuild_search_index(), indent=2))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python search.py rebuild")
+    asyncio.run(main())
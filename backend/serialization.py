@@ -0,0 +1,46 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder produces the same output
+    orjson = None
+
+from schemas import ClaimResponse
+
+# Columns fetched with .values() for list endpoints, in ClaimResponse field order
+CLAIM_RESPONSE_FIELDS = tuple(ClaimResponse.model_fields)
+
+
+def _default(obj: Any):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        # Match pydantic's rendering of UTC timestamps
+        return obj.isoformat().replace("+00:00", "Z")
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """Encodes plain rows straight to JSON, bypassing response_model validation.
+
+    Only for rows already shaped like the declared response model, e.g. from .values().
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,120 @@
+"""How a worker prepares its database on boot.
+
+STARTUP_MODE=development (the default) creates whatever is missing on every
+start: generate_schemas for the models and ensure_search_index for the search
+DDL. Fine for a laptop, but each new worker then runs a few dozen DDL
+statements, which take table locks on Postgres, before it can serve.
+
+STARTUP_MODE=production expects a database migrated with aerich and only checks
+it, in two queries: the newest file in migrations/models must be the version
+aerich recorded as applied, and every model table and column (plus the search
+column or FTS table) must exist. A worker started against an unmigrated
+database refuses to start rather than failing requests one by one.
+
+In both modes the libraries only some requests need (passlib/bcrypt, jose) are
+imported on first use and loaded by a background thread once the app is up.
+"""
+import asyncio
+import logging
+import os
+import re
+from typing import Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from auth import warm_up
+from search import CLAIM_TABLES
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "development")
+PRODUCTION_STARTUP = STARTUP_MODE == "production"
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "models")
+MIGRATION_APP = "models"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_\w+\.py$")
+
+
+def migration_head(directory: str = MIGRATIONS_DIR) -> str:
+    """File name of the newest migration, which is what aerich records as the applied version"""
+    versions = [name for name in os.listdir(directory) if MIGRATION_FILE_PATTERN.match(name)]
+    if not versions:
+        raise RuntimeError(f"No migrations found in {directory}")
+    return max(versions, key=lambda name: int(MIGRATION_FILE_PATTERN.match(name).group(1)))
+
+
+def expected_columns(dialect: str) -> Dict[str, Set[str]]:
+    """Table -> columns the app needs: the models' fields plus the search DDL's additions"""
+    tables = {
+        model._meta.db_table: set(model._meta.fields_db_projection.values())
+        for model in Tortoise.apps[MIGRATION_APP].values()
+    }
+    if dialect == "postgres":
+        for table in CLAIM_TABLES:
+            tables[table].add("search_vector")
+    else:
+        tables["claim_search"] = set()
+    return tables
+
+
+async def _existing_columns(conn: BaseDBAsyncClient) -> Dict[str, Set[str]]:
+    if conn.capabilities.dialect == "postgres":
+        _, rows = await conn.execute_query(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+        )
+    else:
+        _, rows = await conn.execute_query(
+            "SELECT m.name, p.name FROM sqlite_master m JOIN pragma_table_info(m.name) p WHERE m.type = 'table'"
+        )
+    columns: Dict[str, Set[str]] = {}
+    for table, column in rows:
+        columns.setdefault(table, set()).add(column)
+    return columns
+
+
+async def check_schema(conn: Optional[BaseDBAsyncClient] = None):
+    """Raise unless the database is migrated to the head in migrations/models"""
+    conn = conn or Tortoise.get_connection("default")
+    existing = await _existing_columns(conn)
+    problems = []
+    if "aerich" not in existing:
+        problems.append("no aerich table; the database was never migrated")
+    else:
+        _, rows = await conn.execute_query(
+            'SELECT "version" FROM "aerich" WHERE "app" = ' + ("$1" if conn.capabilities.dialect == "postgres" else "?")
+            + ' ORDER BY "id" DESC LIMIT 1',
+            [MIGRATION_APP],
+        )
+        applied = rows[0][0] if rows else None
+        head = migration_head()
+        if applied != head:
+            problems.append(f"applied migration is {applied or 'none'}, the code expects {head}")
+    for table, columns in sorted(expected_columns(conn.capabilities.dialect).items()):
+        if table not in existing:
+            problems.append(f"table {table} is missing")
+        elif columns - existing[table]:
+            problems.append(f"table {table} lacks {', '.join(sorted(columns - existing[table]))}")
+    if problems:
+        raise RuntimeError(
+            "Database schema does not match the models (run `aerich upgrade`, or start with "
+            "STARTUP_MODE=development to create it): " + "; ".join(problems)
+        )
+
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+def _warm_up_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        # Not fatal: the first request that needs them imports them instead
+        logger.warning("Warm-up failed: %r", task.exception())
+
+
+async def start_warm_up():
+    """Load the lazily imported libraries in a thread; serving does not wait for it"""
+    global _warm_up_task
+    if _warm_up_task is None:
+        _warm_up_task = asyncio.create_task(run_in_threadpool(warm_up))
+        _warm_up_task.add_done_callback(_warm_up_done)
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from metrics import UPLOAD_STORE_SECONDS
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+UPLOAD_PATH_PATTERN = re.compile(r"^/claims/[^/]+/documents/?$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredFile:
+    sha256: str
+    size: int
+    path: str
+
+
+def blob_path(sha256: str) -> str:
+    """Content-addressed location of a blob, fanned out over two directory levels"""
+    return os.path.join(UPLOAD_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def file_sha256(path: str) -> str:
+    """Digest of a stored file, for documents uploaded before digests were recorded"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_and_hash(source: BinaryIO, max_size: int) -> StoredFile:
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                buffer.write(chunk)
+
+        sha256 = digest.hexdigest()
+        final_path = blob_path(sha256)
+        if os.path.exists(final_path):
+            # Same bytes already stored; keep the existing blob
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return StoredFile(sha256=sha256, size=size, path=final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+async def store_upload(file: UploadFile, max_size: int = MAX_FILE_SIZE) -> StoredFile:
+    """Stream an upload into content-addressed storage without blocking the event loop.
+
+    Reading, hashing and writing all happen in one worker thread, one chunk at a time.
+    """
+    await file.seek(0)
+    start = time.perf_counter()
+    try:
+        stored = await run_in_threadpool(_copy_and_hash, file.file, max_size)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {max_size} bytes")
+    UPLOAD_STORE_SECONDS.observe(time.perf_counter() - start)
+    return stored
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized document uploads before the multipart body is spooled.
+
+    Checks Content-Length up front and counts body bytes for chunked requests.
+    """
+
+    def __init__(self, app, max_body_size: int = MAX_FILE_SIZE + MULTIPART_OVERHEAD):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not UPLOAD_PATH_PATTERN.match(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse(
+                {"detail": f"File exceeds maximum size of {MAX_FILE_SIZE} bytes"},
+                status_code=413,
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum size of {MAX_FILE_SIZE} bytes",
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,30 @@
+"""Fixtures for the API tests: one scratch SQLite database and ASGI client per session.
+
+Run from the backend directory with ``python -m pytest``.
+"""
+import pytest
+
+from benchmarks.common import benchmark_app
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def client(anyio_backend):
+    async with benchmark_app() as client:
+        yield client
+
+
+@pytest.fixture
+def auth_headers():
+    """Bearer headers for a user, with a cold user cache so query counts include the user lookup"""
+    from auth import create_access_token, user_cache
+
+    def headers(user) -> dict:
+        user_cache.clear()
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+    return headers
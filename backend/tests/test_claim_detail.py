@@ -0,0 +1,34 @@
+import pytest
+
+from generate_data import GeneratorConfig, generate
+from query_capture import query_budget
+
+pytestmark = pytest.mark.anyio
+
+# claim (policy and adjuster joined), notes page and count, documents page and count, plus the user lookup
+FULL_CLAIM_QUERIES = 6
+
+
+@pytest.mark.parametrize("per_claim", [1, 40])
+async def test_full_claim_query_count_does_not_grow_with_notes_and_documents(client, auth_headers, per_claim):
+    from models import User, Claim, ClaimNote, ClaimDocument, UserRole
+
+    config = GeneratorConfig(
+        users_per_role=1, customers=1, policies=1, claims=1,
+        notes_per_claim=per_claim, documents_per_claim=per_claim,
+    )
+    await generate(config)
+    tag = config.prefix.lower()
+    admin = await User.get(email=f"{UserRole.ADMIN.value}0.{tag}@gen.test")
+    claim = await Claim.get(claim_number__startswith=f"CLM-{config.prefix}")
+    assert await ClaimNote.filter(claim_id=claim.id).count() == per_claim
+    assert await ClaimDocument.filter(claim_id=claim.id).count() == per_claim
+
+    headers = auth_headers(admin)
+    with query_budget(FULL_CLAIM_QUERIES, f"GET /claims/{{id}}/full with {per_claim} notes and documents"):
+        response = await client.get(f"/claims/{claim.id}/full?notes_limit=100&documents_limit=100", headers=headers)
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["notes"]["total"] == len(body["notes"]["items"]) == per_claim
+    assert body["documents"]["total"] == len(body["documents"]["items"]) == per_claim
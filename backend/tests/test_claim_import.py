@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from generate_data import GeneratorConfig, generate
+
+pytestmark = pytest.mark.anyio
+
+
+async def _admin_and_policy():
+    from models import User, Policy, UserRole
+
+    config = GeneratorConfig(users_per_role=1, customers=1, policies=1, claims=0)
+    await generate(config)
+    tag = config.prefix.lower()
+    admin = await User.get(email=f"{UserRole.ADMIN.value}0.{tag}@gen.test")
+    policy = await Policy.get(policy_number__startswith=f"POL-{config.prefix}")
+    return admin, policy
+
+
+def _feed(rows) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def _row(policy_id: int, description: str = "Rear-ended at a red light") -> dict:
+    return {"policy_id": policy_id, "incident_date": "2025-03-01T08:30:00",
+            "incident_description": description, "incident_location": "Elm Street"}
+
+
+async def test_import_returns_rejected_rows(client, auth_headers):
+    admin, policy = await _admin_and_policy()
+    feed = _feed([_row(policy.id), {"policy_id": policy.id}, _row(999999999)])
+
+    response = await client.post(
+        "/admin/claims/import", files={"file": ("feed.ndjson", feed, "application/x-ndjson")}, headers=auth_headers(admin)
+    )
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["total"], report["imported"], report["rejected"]) == (3, 1, 2)
+    assert [reject["line"] for reject in report["rejects"]] == [2, 3]
+    assert report["rejects"][1]["errors"] == ["policy_id: Policy not found"]
+    assert report["rejects_truncated"] is False
+    assert report["reject_file"] is None
+
+
+async def test_imported_claims_reach_live_streams(client, auth_headers):
+    from live_updates import hub
+
+    admin, policy = await _admin_and_policy()
+    await hub.start()  # app startup does this; the test client does not run it
+    stream = hub.stream(admin)
+    assert await stream.__anext__() == "retry: 3000\n\n"  # subscribed
+    try:
+        response = await client.post(
+            "/admin/claims/import",
+            files={"file": ("feed.ndjson", _feed([_row(policy.id), _row(policy.id, "Hail dented the roof")]), "application/x-ndjson")},
+            headers=auth_headers(admin),
+        )
+        assert response.status_code == 200, response.text
+
+        events = [await stream.__anext__() for _ in range(2)]
+    finally:
+        await stream.aclose()
+        await hub.stop()
+    assert all(event.startswith("event: claim_created\n") for event in events)
+    assert {json.loads(event.split("data: ", 1)[1])["customer_id"] for event in events} == {policy.customer_id}
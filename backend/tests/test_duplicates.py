@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+from tortoise import timezone
+
+from generate_data import GeneratorConfig, generate
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_restored_claim_is_matched_as_a_duplicate_again(client, auth_headers):
+    from archive import archive_batch, restore_claim
+    from duplicates import find_duplicates
+    from models import User, Claim, ClaimFingerprintBand, Policy, ClaimStatus, UserRole
+
+    config = GeneratorConfig(users_per_role=1, customers=1, policies=1, claims=0)
+    await generate(config)
+    customer = await User.get(email=f"{UserRole.CUSTOMER.value}0.{config.prefix.lower()}@gen.test")
+    policy = await Policy.get(policy_number__startswith=f"POL-{config.prefix}")
+    report = {"policy_id": policy.id, "incident_date": "2025-04-02T17:45:00",
+              "incident_description": "Backed into a lamp post in the parking lot, rear bumper cracked",
+              "incident_location": "12 Harbor Ave"}
+
+    created = []
+    for _ in range(2):
+        response = await client.post("/claims", json=report, headers=auth_headers(customer))
+        assert response.status_code == 200, response.text
+        created.append(response.json())
+    first, second = created
+    assert [d["claim_id"] for d in second["possible_duplicates"]] == [first["id"]]
+
+    await Claim.filter(id=first["id"]).update(status=ClaimStatus.SETTLED)
+    assert first["id"] in await archive_batch(timezone.now() + timedelta(days=1))
+    assert not await ClaimFingerprintBand.filter(claim_id=first["id"]).exists()
+    assert await restore_claim(first["id"])
+
+    restored = await Claim.get(id=first["id"])
+    assert restored.incident_fingerprint is not None
+    assert await ClaimFingerprintBand.filter(claim_id=first["id"]).exists()
+    duplicates = await find_duplicates(await Claim.get(id=second["id"]))
+    assert [d["claim_id"] for d in duplicates] == [first["id"]]
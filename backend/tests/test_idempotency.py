@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from generate_data import GeneratorConfig, generate
+from idempotency import BufferedBody
+
+pytestmark = pytest.mark.anyio
+
+
+def _multipart(boundary: bytes, content: bytes) -> bytes:
+    return (
+        b"--" + boundary + b'\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n" + content + b"\r\n--" + boundary + b"--\r\n"
+    )
+
+
+def _digest(data: bytes, boundary: bytes, rng: random.Random) -> str:
+    body = BufferedBody(boundary)
+    position = 0
+    while position < len(data):
+        size = rng.randint(1, 40)
+        body.write(data[position:position + size])
+        position += size
+    try:
+        return body.rewind()
+    finally:
+        body.close()
+
+
+def test_multipart_digest_ignores_the_boundary_however_the_body_is_chunked():
+    rng = random.Random(7)
+    content = b"x" * 500
+    first = _digest(_multipart(b"1f0e9a7c2b", content), b"1f0e9a7c2b", rng)
+    assert _digest(_multipart(b"d4c3b2a190", content), b"d4c3b2a190", rng) == first
+    assert _digest(_multipart(b"d4c3b2a190", content + b"y"), b"d4c3b2a190", rng) != first
+
+
+async def test_keyed_retries_replay_and_reused_keys_with_other_bodies_are_refused(client, auth_headers):
+    from models import User, Claim, UserRole
+
+    config = GeneratorConfig(users_per_role=1, customers=1, policies=1, claims=1)
+    await generate(config)
+    agent = await User.get(email=f"{UserRole.AGENT.value}0.{config.prefix.lower()}@gen.test")
+    claim = await Claim.get(claim_number__startswith=f"CLM-{config.prefix}")
+
+    def keyed(key: str) -> dict:
+        return {**auth_headers(agent), "Idempotency-Key": key}
+
+    notes = f"/claims/{claim.id}/notes"
+    first = await client.post(notes, json={"content": "Called"}, headers=keyed("note"))
+    retry = await client.post(notes, json={"content": "Called"}, headers=keyed("note"))
+    other = await client.post(notes, json={"content": "Emailed"}, headers=keyed("note"))
+    assert (first.status_code, retry.status_code, other.status_code) == (200, 200, 422)
+    assert retry.headers["Idempotent-Replayed"] == "true" and retry.json() == first.json()
+
+    # httpx picks a fresh multipart boundary per request, as retrying clients do
+    documents = f"/claims/{claim.id}/documents"
+    photo = b"\xff" * (2 * 1024 * 1024)  # spills the spool to disk
+    first = await client.post(documents, files={"file": ("a.bin", photo)}, headers=keyed("upload"))
+    retry = await client.post(documents, files={"file": ("a.bin", photo)}, headers=keyed("upload"))
+    other = await client.post(documents, files={"file": ("a.bin", photo[1:])}, headers=keyed("upload"))
+    assert (first.status_code, retry.status_code, other.status_code) == (200, 200, 422)
+    assert retry.json()["document_id"] == first.json()["document_id"]
@@ -0,0 +1,74 @@
+"""Query budgets: fail when an endpoint issues more SQL than it is allowed.
+
+Seeds several notes and documents per claim, so a per-row lookup shows up as an
+overrun rather than hiding behind a single row. Budgets count a cold identity
+cache, i.e. they include the user lookup get_current_user does once per
+USER_CACHE_TTL. Run with -s to print each endpoint's statements.
+"""
+import pytest
+
+from generate_data import GeneratorConfig, generate
+from query_capture import query_budget
+
+pytestmark = pytest.mark.anyio
+
+# (method, path, role, max queries); {claim} is a claim the role can see,
+# {assigned} a claim in ASSIGNED status. Claim writes include one counter upsert
+# per changed claimcounter key (see claim_summary.record_claim_changes).
+BUDGETS = [
+    ("GET", "/auth/me", "customer", 1),
+    ("GET", "/policies", "customer", 2),
+    ("GET", "/claims", "customer", 2),
+    ("GET", "/claims", "agent", 2),
+    ("GET", "/claims", "adjuster", 2),
+    ("GET", "/claims", "manager", 2),
+    ("GET", "/claims", "admin", 2),
+    ("GET", "/claims/summary", "manager", 2),
+    ("GET", "/claims?include_archived=true", "customer", 3),
+    ("GET", "/claims/export?format=ndjson", "admin", 3),
+    ("GET", "/claims/search?q=hail", "agent", 3),
+    ("GET", "/claims/changes", "customer", 3),
+    ("GET", "/claims/{claim}", "admin", 2),
+    ("GET", "/claims/{claim}/full", "admin", 6),
+    ("GET", "/users/adjusters", "manager", 3),
+    ("POST", "/claims", "customer", 9),
+    ("PUT", "/claims/{assigned}/status?new_status=investigating", "manager", 8),
+    ("POST", "/claims/{claim}/notes", "agent", 4),
+]
+
+
+@pytest.fixture(scope="module")
+async def seeded(client):
+    from models import User, Claim, Policy, UserRole, ClaimStatus
+
+    config = GeneratorConfig(
+        users_per_role=2, customers=20, policies=40, claims=400,
+        notes_per_claim=5, documents_per_claim=3,
+    )
+    await generate(config)
+    tag = config.prefix.lower()
+    users = {role.value: await User.get(email=f"{role.value}0.{tag}@gen.test") for role in UserRole}
+    customer = users[UserRole.CUSTOMER.value]
+    policy = await Policy.filter(customer_id=customer.id).first()
+    return {
+        "users": users,
+        "claim": await Claim.filter(customer_id=customer.id).first(),
+        "assigned": await Claim.filter(status=ClaimStatus.ASSIGNED).first(),
+        "bodies": {
+            "/claims": {"policy_id": policy.id, "incident_date": "2025-01-01T00:00:00",
+                        "incident_description": "Hail damage", "incident_location": "Oak Street"},
+            "/claims/{claim}/notes": {"content": "Called the customer"},
+        },
+    }
+
+
+@pytest.mark.parametrize(
+    "method, path, role, budget", BUDGETS, ids=[f"{method} {path} as {role}" for method, path, role, _ in BUDGETS]
+)
+async def test_query_budget(client, seeded, auth_headers, method, path, role, budget):
+    url = path.format(claim=seeded["claim"].id, assigned=seeded["assigned"].id)
+    headers = auth_headers(seeded["users"][role])
+    with query_budget(budget, f"{method} {path} as {role}") as captured:
+        response = await client.request(method, url, json=seeded["bodies"].get(path), headers=headers)
+    print(f"{method} {path} as {role}: {captured.count} / {budget}\n{captured.report()}")
+    assert response.status_code < 400, response.text
@@ -0,0 +1,94 @@
+from tortoise.expressions import Q
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+from typing import Optional, Type
+
+from models import User, Claim, ClaimCounter, ClaimEvent, UserRole, ClaimStatus, CounterScope
+
+# Statuses each staff role works on; customers and admins are not status-scoped
+AGENT_STATUSES = [ClaimStatus.SUBMITTED, ClaimStatus.UNDER_REVIEW]
+ADJUSTER_STATUSES = [ClaimStatus.ASSIGNED, ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED]
+MANAGER_STATUSES = [ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED, ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED]
+
+
+def visible_claims(user: User, model: Type[Model] = Claim) -> QuerySet:
+    """Base queryset of claims a user may list, matching the composite indexes on Claim.
+
+    model is Claim or ArchivedClaim, which share these columns.
+    """
+    if user.role == UserRole.CUSTOMER:
+        # Customers see only their own claims
+        return model.filter(customer_id=user.id)
+    elif user.role == UserRole.AGENT:
+        # Agents see submitted and under_review claims
+        return model.filter(status__in=AGENT_STATUSES)
+    elif user.role == UserRole.ADJUSTER:
+        # Adjusters see claims assigned to them + all unassigned. Written as an OR with
+        # IS NULL because `IN (id, NULL)` never matches NULL rows.
+        return model.filter(status__in=ADJUSTER_STATUSES).filter(
+            Q(assigned_adjuster_id=user.id) | Q(assigned_adjuster_id__isnull=True)
+        )
+    elif user.role == UserRole.MANAGER:
+        # Managers see claims that need assignment or are in progress
+        return model.filter(status__in=MANAGER_STATUSES)
+    # Admins see all claims
+    return model.all()
+
+
+def sees_closed_claims(user: User) -> bool:
+    """Whether visible_claims can return settled or rejected, and so archived, claims for user"""
+    return user.role in (UserRole.CUSTOMER, UserRole.ADMIN)
+
+
+def claim_visible_to(user: User, status: ClaimStatus, customer_id: int, assigned_adjuster_id: Optional[int]) -> bool:
+    """In-memory twin of visible_claims for a single claim's attributes"""
+    if user.role == UserRole.CUSTOMER:
+        return customer_id == user.id
+    elif user.role == UserRole.AGENT:
+        return status in AGENT_STATUSES
+    elif user.role == UserRole.ADJUSTER:
+        return status in ADJUSTER_STATUSES and assigned_adjuster_id in (user.id, None)
+    elif user.role == UserRole.MANAGER:
+        return status in MANAGER_STATUSES
+    return True
+
+
+def can_view_claim(user: User, claim: Claim) -> bool:
+    """Access rule for a single claim's detail, documents and updates"""
+    if user.role == UserRole.CUSTOMER and claim.customer_id != user.id:
+        return False
+    elif user.role == UserRole.ADJUSTER and claim.assigned_adjuster_id != user.id:
+        return False
+    return True
+
+
+def visible_events(user: User) -> QuerySet:
+    """ClaimEvent rows a user may read: the claim was in their list before or after the change,
+    the same rule claim_visible_to applies to live updates"""
+    if user.role == UserRole.CUSTOMER:
+        return ClaimEvent.filter(customer_id=user.id)
+    elif user.role == UserRole.AGENT:
+        return ClaimEvent.filter(Q(status__in=AGENT_STATUSES) | Q(previous_status__in=AGENT_STATUSES))
+    elif user.role == UserRole.ADJUSTER:
+        return ClaimEvent.filter(
+            Q(status__in=ADJUSTER_STATUSES) | Q(previous_status__in=ADJUSTER_STATUSES)
+        ).filter(Q(assigned_adjuster_id=user.id) | Q(assigned_adjuster_id__isnull=True))
+    elif user.role == UserRole.MANAGER:
+        return ClaimEvent.filter(Q(status__in=MANAGER_STATUSES) | Q(previous_status__in=MANAGER_STATUSES))
+    return ClaimEvent.all()
+
+
+def visible_counters(user: User) -> QuerySet:
+    """ClaimCounter rows covering exactly the claims visible_claims(user) returns"""
+    if user.role == UserRole.CUSTOMER:
+        return ClaimCounter.filter(scope=CounterScope.CUSTOMER, scope_id=user.id)
+    counters = ClaimCounter.filter(scope=CounterScope.ADJUSTER)
+    if user.role == UserRole.AGENT:
+        return counters.filter(status__in=AGENT_STATUSES)
+    elif user.role == UserRole.ADJUSTER:
+        # scope_id 0 holds unassigned claims
+        return counters.filter(status__in=ADJUSTER_STATUSES, scope_id__in=[user.id, 0])
+    elif user.role == UserRole.MANAGER:
+        return counters.filter(status__in=MANAGER_STATUSES)
+    return counters
@@ -0,0 +1,68 @@
+import uuid
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from models import Claim, UserRole, ClaimStatus
+
+_TRANSITIONS = {
+    ClaimStatus.SUBMITTED: {
+        UserRole.AGENT: [ClaimStatus.UNDER_REVIEW, ClaimStatus.REJECTED],
+        UserRole.MANAGER: [ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED],
+        UserRole.ADMIN: [ClaimStatus.UNDER_REVIEW, ClaimStatus.ASSIGNED, ClaimStatus.REJECTED]
+    },
+    ClaimStatus.UNDER_REVIEW: {
+        UserRole.AGENT: [ClaimStatus.REJECTED],
+        UserRole.MANAGER: [ClaimStatus.ASSIGNED, ClaimStatus.REJECTED],
+        UserRole.ADMIN: [ClaimStatus.ASSIGNED, ClaimStatus.REJECTED]
+    },
+    ClaimStatus.ASSIGNED: {
+        UserRole.ADJUSTER: [ClaimStatus.INVESTIGATING, ClaimStatus.REJECTED],
+        UserRole.MANAGER: [ClaimStatus.INVESTIGATING, ClaimStatus.REJECTED],
+        UserRole.ADMIN: [ClaimStatus.INVESTIGATING, ClaimStatus.APPROVED, ClaimStatus.REJECTED]
+    },
+    ClaimStatus.INVESTIGATING: {
+        UserRole.ADJUSTER: [ClaimStatus.APPROVED, ClaimStatus.REJECTED],
+        UserRole.MANAGER: [ClaimStatus.APPROVED, ClaimStatus.REJECTED],
+        UserRole.ADMIN: [ClaimStatus.APPROVED, ClaimStatus.REJECTED, ClaimStatus.SETTLED]
+    },
+    ClaimStatus.APPROVED: {
+        UserRole.ADMIN: [ClaimStatus.SETTLED],
+        UserRole.MANAGER: [ClaimStatus.SETTLED]
+    },
+    ClaimStatus.REJECTED: {},
+    ClaimStatus.SETTLED: {}
+}
+
+# (current status, role) -> allowed next statuses, flattened once at import
+ALLOWED_TRANSITIONS: Dict[Tuple[ClaimStatus, UserRole], FrozenSet[ClaimStatus]] = {
+    (current_status, role): frozenset(targets)
+    for current_status, by_role in _TRANSITIONS.items()
+    for role, targets in by_role.items()
+}
+
+_NO_TRANSITIONS: FrozenSet[ClaimStatus] = frozenset()
+
+
+def new_claim_number() -> str:
+    return f"CLM-{uuid.uuid4().hex[:8].upper()}"
+
+
+def can_transition_status(current_status: ClaimStatus, new_status: ClaimStatus, user_role: UserRole) -> bool:
+    """Validate workflow transitions based on user role"""
+    return new_status in ALLOWED_TRANSITIONS.get((current_status, user_role), _NO_TRANSITIONS)
+
+
+async def compare_and_set_status(
+    claim_id: int,
+    expected_status: ClaimStatus,
+    new_status: ClaimStatus,
+    changes: dict,
+    using_db: Optional[BaseDBAsyncClient] = None,
+) -> bool:
+    """UPDATE claim ... WHERE id = ? AND status = <expected>; False if someone got there first"""
+    updated = await Claim.filter(id=claim_id, status=expected_status).using_db(using_db).update(
+        status=new_status, updated_at=timezone.now(), **changes
+    )
+    return updated == 1
@@ -125,7 +125,8 @@ export default function ClaimDetailPage() {
 
   const handleActionClick = (action: any) => {
     if (action.needsAdjuster) {
-      const adjusterId = prompt('Select adjuster ID:')
+      const options = adjusters.map(a => `${a.id}: ${a.name} (${a.open_claims} open)`).join('\n')
+      const adjusterId = prompt(`Select adjuster ID:\n${options}`)
       if (adjusterId) {
         updateStatus(action.status, { assigned_adjuster_id: parseInt(adjusterId) })
       }
@@ -8,6 +8,8 @@ export default function ClaimsPage() {
   const [user, setUser] = useState<any>(null)
   const [claims, setClaims] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const router = useRouter()
 
   useEffect(() => {
@@ -23,6 +25,7 @@ export default function ClaimsPage() {
         
         const claimsData = await auth.api.get('/claims')
         setClaims(claimsData.data)
+        setNextCursor(claimsData.headers['x-next-cursor'] || null)
       } catch (error) {
         router.push('/login')
       } finally {
@@ -33,6 +36,20 @@ export default function ClaimsPage() {
     loadData()
   }, [router])
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const claimsData = await auth.api.get('/claims', { params: { cursor: nextCursor } })
+      setClaims((loaded) => [...loaded, ...claimsData.data])
+      setNextCursor(claimsData.headers['x-next-cursor'] || null)
+    } catch (error) {
+      console.error('Failed to load more claims:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const getStatusColor = (status: string) => {
     switch (status) {
       case 'submitted': return 'bg-blue-100 text-blue-800'
@@ -164,6 +181,17 @@ export default function ClaimsPage() {
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <div className="text-center pt-2">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="btn-secondary"
+                >
+                  {loadingMore ? 'Loading...' : 'Load More'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </main>
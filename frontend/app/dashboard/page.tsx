@@ -6,7 +6,7 @@ import { useRouter } from 'next/navigation'
 
 export default function DashboardPage() {
   const [user, setUser] = useState<any>(null)
-  const [userClaims, setUserClaims] = useState<any[]>([])
+  const [summary, setSummary] = useState<any>({ total: 0, by_status: [] })
   const [loading, setLoading] = useState(true)
   const router = useRouter()
 
@@ -21,9 +21,9 @@ export default function DashboardPage() {
         const userData = await auth.getCurrentUser()
         setUser(userData)
         
-        // Fetch user claims
-        const claimsData = await auth.api.get('/claims')
-        setUserClaims(claimsData.data)
+        // Fetch per-status claim counts
+        const summaryData = await auth.api.get('/claims/summary')
+        setSummary(summaryData.data)
       } catch (error) {
         router.push('/login')
       } finally {
@@ -34,6 +34,11 @@ export default function DashboardPage() {
     checkAuth()
   }, [router])
 
+  const countFor = (statuses: string[]) =>
+    summary.by_status
+      .filter((s: any) => statuses.includes(s.status))
+      .reduce((total: number, s: any) => total + s.count, 0)
+
   const handleLogout = () => {
     auth.logout()
     router.push('/')
@@ -79,14 +84,14 @@ export default function DashboardPage() {
         <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
           <div className="card">
             <h3 className="text-lg font-semibold text-gray-900 mb-2">My Claims</h3>
-            <p className="text-3xl font-bold text-blue-600">{userClaims.length}</p>
+            <p className="text-3xl font-bold text-blue-600">{summary.total}</p>
             <p className="text-sm text-gray-500">Total claims</p>
           </div>
           
           <div className="card">
             <h3 className="text-lg font-semibold text-gray-900 mb-2">Pending Review</h3>
             <p className="text-3xl font-bold text-yellow-600">
-              {userClaims.filter(c => ['submitted', 'under_review', 'assigned', 'investigating'].includes(c.status)).length}
+              {countFor(['submitted', 'under_review', 'assigned', 'investigating'])}
             </p>
             <p className="text-sm text-gray-500">Awaiting review</p>
           </div>
@@ -94,7 +99,7 @@ export default function DashboardPage() {
           <div className="card">
             <h3 className="text-lg font-semibold text-gray-900 mb-2">Completed</h3>
             <p className="text-3xl font-bold text-green-600">
-              {userClaims.filter(c => ['approved', 'settled'].includes(c.status)).length}
+              {countFor(['approved', 'settled'])}
             </p>
             <p className="text-sm text-gray-500">Settled claims</p>
           </div>